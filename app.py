@@ -1,151 +1,530 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, stream_with_context
 from flask_cors import CORS
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import sessionmaker
-from models import Base, ClinicalTrial, TrialDetails, TargetedSearch, TrialArms, TrialLocation, TrialSponsor
+from models import ClinicalTrial, TrialDetails, TrialArms
+from config import settings
+from services.database import get_engine, init_db, session
+from services.queries import (
+    filter_trials, paginate_trials, valid_cursor, load_trial_bundles, trials_by_ids,
+    TRIAL_INCLUDES, TRIAL_COLUMNS, LOCATION_COLUMNS, SPONSOR_COLUMNS
+)
+from services.search import search_trials, fts_query
+from services.query_cache import QueryCache, normalize_key, current_generation
+from services.geo import nearby_trials
+from services.facets import facet_counts
+from services.export import EXPORT_FORMATS, EXPORT_TRIAL_COLUMNS, MIMETYPES, export_chunks, parquet_available
+from services.eligibility import AGE_UNITS, keyword_terms, match_trials, matched_keywords, sex_label
+from services.cache import LRUCache, ResponseCache, make_backend
+from services.details import details_document, parse_fields
+from services.metrics import init_metrics
+from services.serialization import FastJSONProvider, compact_dumps
+from services.utils import parse_bool
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Flask app
-app = Flask(__name__)
-CORS(app)
+# Routes de l'API, enregistrées sur l'application par create_app()
+api = Blueprint("api", __name__)
 
-# DB setup
-engine = create_engine("sqlite:///clinical_trials.db", echo=False)
-Session = sessionmaker(bind=engine)
-session = Session()
+def create_app():
+    """
+    Construit l'application : schéma vérifié une fois (init_db), caches et
+    métriques rangés dans app.extensions. Avec `gunicorn --preload
+    "app:create_app()"`, ce travail est fait une fois dans le maître avant
+    le fork des workers.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    # jsonify encodé par orjson quand il est installé (sortie identique à l'encodeur standard)
+    if settings.JSON_FAST:
+        app.json = FastJSONProvider(app)
+
+    # DB setup : `session` est une scoped_session (une session par thread de requête)
+    init_db()
+    # Connexions ouvertes par init_db fermées : un worker forké ne doit pas hériter de celles du maître
+    get_engine().dispose()
+
+    # Cache des réponses de détail d'un essai, invalidé par clinical_trials.updated_at
+    app.extensions["response_cache"] = ResponseCache(
+        LRUCache(max_bytes=settings.RESPONSE_CACHE_MAX_BYTES, ttl=settings.RESPONSE_CACHE_TTL),
+        make_backend(settings.RESPONSE_CACHE_SHARED_URL),
+        revalidate_after=settings.RESPONSE_CACHE_REVALIDATE
+    )
+
+    # Cache des résultats d'inventaire / recherche (NCT IDs), invalidé par la génération des essais
+    app.extensions["query_cache"] = QueryCache(
+        ttl=settings.QUERY_CACHE_TTL, max_entries=settings.QUERY_CACHE_MAX_ENTRIES
+    ) if settings.QUERY_CACHE_ENABLED else None
+
+    # Métriques par route (/metrics) et requêtes SQL lentes journalisées avec leur plan
+    app.extensions["metrics"] = init_metrics(
+        app, get_engine(), slow_query_ms=settings.SLOW_QUERY_MS, sql_timing=settings.METRICS_SQL_TIMING
+    ) if settings.METRICS_ENABLED else None
+
+    app.teardown_appcontext(remove_session)
+    app.register_blueprint(api)
+    return app
+
+def remove_session(exception=None):
+    # Rend la connexion au pool et annule une transaction laissée ouverte
+    session.remove()
+
+def trial_to_dict(t):
+    return {
+        "NCTId": t.nct_id,
+        "Title": t.title,
+        "Condition": t.conditions[0] if t.conditions else "N/A",
+        "Interventions": t.interventions,
+        "Status": t.status,
+        "StartDate": str(t.start_date),
+        "CompletionDate": str(t.completion_date),
+        "Locations": t.locations
+    }
+
+def arms_to_data(trial_arms):
+    return trial_arms.arms if trial_arms else [{"ArmGroupDescription": "N/A", "InterventionName": "N/A"}]
+
+def locations_to_data(locations):
+    return [{
+        "Facility": l.facility or "N/A",
+        "City": l.city or "N/A",
+        "Country": l.country or "N/A",
+        "Zip": l.zip_code or "N/A",
+        "Latitude": l.latitude or "N/A",
+        "Longitude": l.longitude or "N/A"
+    } for l in locations] or [{"Facility": "N/A", "City": "N/A", "Country": "N/A"}]
+
+def sponsors_to_data(sponsors):
+    return [{
+        "LeadSponsor": s.lead_sponsor or "N/A",
+        "Collaborators": s.collaborators or [],
+        "Contacts": s.contacts or []
+    } for s in sponsors] or [{"LeadSponsor": "N/A", "Collaborators": [], "Contacts": []}]
+
+def bundle_to_dict(bundle, include, fields=None):
+    """Sections demandées d'un essai, au même format que les endpoints dédiés."""
+    data = {}
+    if "details" in include:
+        details = bundle["details"]
+        data["Details"] = details_document(details.packed_data, details.full_data, fields) if details else None
+    if "arms" in include:
+        data["Arms"] = arms_to_data(bundle["arms"])
+    if "locations" in include:
+        data["Locations"] = locations_to_data(bundle["locations"])
+    if "sponsors" in include:
+        data["Sponsors"] = sponsors_to_data(bundle["sponsors"])
+    return data
+
+def parse_include(value, default=()):
+    """'arms, locations' -> ('arms', 'locations') ; None si une section est inconnue."""
+    if not value:
+        return tuple(default)
+    include = tuple(dict.fromkeys(v.strip() for v in value.split(",") if v.strip()))
+    return include if all(v in TRIAL_INCLUDES for v in include) else None
+
+def stream_trials(query, fmt):
+    """
+    Réponse HTTP chunked : les essais sont lus par lots (yield_per) et
+    sérialisés au fil de l'eau, la mémoire reste constante quel que soit le
+    nombre de lignes. fmt = "ndjson" (un objet par ligne) ou "json" (tableau).
+    Chaque ligne est encodée comme par jsonify (mêmes octets que les pages).
+    """
+    provider = current_app.json
+
+    def generate():
+        try:
+            if fmt == "json":
+                yield '{"status":"success","data":['
+            for i, t in enumerate(query.yield_per(settings.STREAM_BATCH_SIZE)):
+                row = compact_dumps(provider, trial_to_dict(t))
+                if fmt == "json":
+                    yield row if i == 0 else "," + row
+                else:
+                    yield row + "\n"
+            if fmt == "json":
+                yield "]}"
+        except Exception as e:
+            # Le statut HTTP est déjà parti : on journalise et on coupe le flux
+            logger.error(f"[Inventory Stream] Erreur: {e}")
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def trial_version(nct_id):
+    """Version d'un essai pour le cache : son updated_at (recherche sur l'index nct_id)."""
+    updated_at = session.query(ClinicalTrial.updated_at).filter_by(nct_id=nct_id).scalar()
+    return updated_at.isoformat() if updated_at else ""
+
+def cached_trial_response(route, nct_id, build):
+    """
+    Sert la réponse JSON de `route` pour `nct_id` depuis le cache, sinon
+    l'obtient via build() -> (payload, status) et la met en cache si 200.
+    Répond 304 si If-None-Match correspond à l'ETag. Un essai sans ligne
+    dans clinical_trials n'a pas de version (touch_trials ne peut pas
+    l'avancer) : sa réponse n'est pas mise en cache.
+    """
+    response_cache = current_app.extensions["response_cache"]
+    entry, version = response_cache.lookup(route, nct_id, lambda: trial_version(nct_id))
+    if entry is None:
+        payload, status = build()
+        if status != 200 or not version:
+            return jsonify(payload), status
+        # Mêmes octets que jsonify(payload)
+        body = current_app.json.response(payload).get_data()
+        entry = response_cache.put(route, nct_id, version, body)
+    response = current_app.response_class(entry.body, mimetype="application/json")
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
+
+def cached_trials(key, run):
+    """
+    Essais (Row de TRIAL_COLUMNS) renvoyés par run(), via le cache de
+    résultats : lecture de la clé puis IN (...) si `key` y est déjà.
+    """
+    query_cache = current_app.extensions["query_cache"]
+    if query_cache is None:
+        return run()
+    nct_ids = query_cache.get(session, key)
+    if nct_ids is not None:
+        return trials_by_ids(session, nct_ids)
+    # Génération lue avant la requête : une écriture pendant son exécution périme le résultat
+    generation = current_generation(session)
+    trials = run()
+    query_cache.put(session, key, [t.nct_id for t in trials], generation)
+    return trials
 
 # ------------------- Mission A : Inventaire -------------------
-@app.route("/api/inventory", methods=["GET"])
+@api.route("/api/inventory", methods=["GET"])
 def get_inventory():
-    limit = max(1, request.args.get("limit", 50, type=int))
+    limit = request.args.get("limit", type=int)
     country = request.args.get("country", "").strip()
     condition = request.args.get("condition", "").strip()
     status_filter = request.args.get("status", "").strip()
+    cursor = request.args.get("cursor", "").strip()
+    stream = request.args.get("stream", "").strip()
 
     if not country and not condition:
         return jsonify({"status": "error", "message": "Au moins un filtre 'country' ou 'condition' est requis"}), 400
+    if cursor and not valid_cursor(cursor):
+        return jsonify({"status": "error", "message": "Le paramètre 'cursor' doit être un NCT ID (next_cursor)"}), 400
+    if stream and stream not in ("ndjson", "json"):
+        return jsonify({"status": "error", "message": "Le paramètre 'stream' doit valoir 'ndjson' ou 'json'"}), 400
 
     try:
-        query = session.query(ClinicalTrial)
-
-        if condition:
-            query = query.filter(func.json_extract(ClinicalTrial.conditions, '$[0]') == condition)
+        # Colonnes de la réponse seulement : Row au lieu d'entités ORM
+        query = filter_trials(session.query(*TRIAL_COLUMNS), condition, country, status_filter)
+        query = paginate_trials(query, condition, country, after=cursor)
 
-        if country:
-            query = query.filter(func.json_extract(ClinicalTrial.locations, '$[0].country') == country)
+        if stream:
+            # Mode streaming : pas de plafond, 'limit' reste optionnel
+            return stream_trials(query.limit(max(1, limit)) if limit else query, stream)
 
-        if status_filter:
-            query = query.filter(ClinicalTrial.status == status_filter)
+        limit = min(max(1, limit or 50), settings.INVENTORY_MAX_LIMIT)
+        key = normalize_key("inventory", condition=condition, country=country, status=status_filter,
+                            after=cursor, limit=limit)
+        trials = cached_trials(key, lambda: query.limit(limit).all())
 
-        trials = query.limit(limit).all()
+        data = [trial_to_dict(t) for t in trials]
+        # Curseur de la page suivante : dernier NCT ID renvoyé (absent en fin de résultats)
+        next_cursor = trials[-1].nct_id if len(trials) == limit else None
 
-        data = []
-        for t in trials:
-            data.append({
-                "NCTId": t.nct_id,
-                "Title": t.title,
-                "Condition": t.conditions[0] if t.conditions else "N/A",
-                "Interventions": t.interventions,
-                "Status": t.status,
-                "StartDate": str(t.start_date),
-                "CompletionDate": str(t.completion_date),
-                "Locations": t.locations
-            })
-
-        return jsonify({"status": "success", "data": data})
+        return jsonify({"status": "success", "data": data, "next_cursor": next_cursor})
     except Exception as e:
         logger.error(f"[Inventory] Erreur: {e}")
         return jsonify({"status": "error", "data": []})
 
+# ------------------- Export de l'inventaire -------------------
+@api.route("/api/export", methods=["GET"])
+def export_inventory():
+    fmt = request.args.get("format", "csv").strip()
+    country = request.args.get("country", "").strip()
+    condition = request.args.get("condition", "").strip()
+    status_filter = request.args.get("status", "").strip()
+    limit = request.args.get("limit", type=int)
+
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": "Le paramètre 'format' doit valoir 'csv' ou 'parquet'"}), 400
+    if fmt == "parquet" and not parquet_available():
+        return jsonify({"status": "error", "message": "Export Parquet indisponible (paquet pyarrow absent)"}), 400
+
+    # Mêmes filtres et même ordre (keyset) que l'inventaire ; sans filtre, tout l'inventaire
+    query = filter_trials(session.query(*EXPORT_TRIAL_COLUMNS), condition, country, status_filter)
+    query = paginate_trials(query, condition, country)
+    if limit:
+        query = query.limit(max(1, limit))
+
+    def generate():
+        try:
+            yield from export_chunks(query, fmt, settings.EXPORT_CHUNK_SIZE)
+        except Exception as e:
+            # Le statut HTTP est déjà parti : on journalise et on coupe le flux (fichier incomplet)
+            logger.error(f"[Export] Erreur pour condition='{condition}', country='{country}': {e}")
+
+    response = Response(stream_with_context(generate()), mimetype=MIMETYPES[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="inventory.{fmt}"'
+    return response
+
 # ------------------- Mission B : Détails d'un essai -------------------
-@app.route("/api/trial/<string:nct_id>", methods=["GET"])
+@api.route("/api/trial/<string:nct_id>", methods=["GET"])
 def get_trial_details(nct_id):
+    include = parse_include(request.args.get("include", "").strip())
+    if include is None:
+        return jsonify({"status": "error", "message": f"'include' accepte : {', '.join(TRIAL_INCLUDES)}"}), 400
+    include = tuple(i for i in include if i != "details")
     try:
-        trial = session.query(TrialDetails).filter_by(nct_id=nct_id).first()
+        # ?fields=ProtocolSection.StatusModule,... : seules ces sections sont décompressées
+        fields = parse_fields(request.args.get("fields", "").strip())
+    except ValueError:
+        return jsonify({"status": "error", "message": "'fields' attend des chemins séparés par des virgules"}), 400
+
+    def build():
+        trial = session.query(TrialDetails.packed_data, TrialDetails.full_data).filter_by(nct_id=nct_id).first()
         if not trial:
-            return jsonify({"status": "error", "message": f"Essai {nct_id} introuvable"}), 404
+            return {"status": "error", "message": f"Essai {nct_id} introuvable"}, 404
+        if not include:
+            return {"status": "success", "data": details_document(trial.packed_data, trial.full_data, fields)}, 200
+        # Réponse composite : détails + sections demandées, une requête par table
+        bundle = load_trial_bundles(session, [nct_id], include)[nct_id]
+        bundle["details"] = trial
+        return {"status": "success", "data": bundle_to_dict(bundle, ("details",) + include, fields)}, 200
 
-        return jsonify({"status": "success", "data": trial.full_data})
+    try:
+        route = "trial" if not include else "trial+" + ",".join(sorted(include))
+        if fields:
+            route += "?fields=" + ",".join(fields)
+        return cached_trial_response(route, nct_id, build)
     except Exception as e:
         logger.error(f"[Trial Details] Erreur pour {nct_id}: {e}")
         return jsonify({"status": "error", "data": {}})
 
 # ------------------- Mission C : Recherche ciblée -------------------
-@app.route("/api/search", methods=["GET"])
+@api.route("/api/search", methods=["GET"])
 def targeted_search():
+    mode = request.args.get("mode", "exact").strip()
     condition = request.args.get("condition", "").strip()
+    terms = request.args.get("q", condition).strip()
     limit = max(1, request.args.get("limit", 50, type=int))
-    if not condition:
+    offset = max(0, request.args.get("offset", 0, type=int))
+    if mode not in ("exact", "fulltext"):
+        return jsonify({"status": "error", "message": "Le paramètre 'mode' doit valoir 'exact' ou 'fulltext'"}), 400
+    if mode == "exact" and not condition:
         return jsonify({"status": "error", "message": "Le paramètre 'condition' est requis"}), 400
+    if mode == "fulltext" and not terms:
+        return jsonify({"status": "error", "message": "Le paramètre 'q' (ou 'condition') est requis"}), 400
     try:
-        trials = session.query(ClinicalTrial).filter(
-            func.json_extract(ClinicalTrial.conditions, '$[0]') == condition
-        ).limit(limit).all()
+        if mode == "fulltext":
+            # Recherche plein texte FTS5 classée par BM25
+            key = normalize_key("search", mode=mode, q=fts_query(terms), limit=limit, offset=offset)
+            trials = cached_trials(
+                key, lambda: search_trials(session, terms, limit=limit, offset=offset, columns=TRIAL_COLUMNS)
+            )
+        else:
+            key = normalize_key("search", mode=mode, condition=condition, limit=limit, offset=offset)
+            trials = cached_trials(key, lambda: filter_trials(
+                session.query(*TRIAL_COLUMNS), condition=condition
+            ).offset(offset).limit(limit).all())
 
-        data = [{
-            "NCTId": t.nct_id,
-            "Title": t.title,
-            "Condition": t.conditions[0] if t.conditions else "N/A",
-            "Interventions": t.interventions,
-            "Status": t.status,
-            "StartDate": str(t.start_date),
-            "CompletionDate": str(t.completion_date),
-            "Locations": t.locations
-        } for t in trials]
+        data = [trial_to_dict(t) for t in trials]
 
         return jsonify({"status": "success", "data": data})
     except Exception as e:
-        logger.error(f"[Targeted Search] Erreur pour '{condition}': {e}")
+        logger.error(f"[Targeted Search] Erreur pour '{terms}': {e}")
         return jsonify({"status": "error", "data": []})
 
 # ------------------- Mission D : Bras / Interventions -------------------
-@app.route("/api/trial/<string:nct_id>/arms", methods=["GET"])
+@api.route("/api/trial/<string:nct_id>/arms", methods=["GET"])
 def get_trial_arms(nct_id):
+    def build():
+        trial_arms = session.query(TrialArms.arms).filter_by(nct_id=nct_id).first()
+        return {"status": "success", "data": arms_to_data(trial_arms)}, 200
+
     try:
-        trial_arms = session.query(TrialArms).filter_by(nct_id=nct_id).first()
-        data = trial_arms.arms if trial_arms else [{"ArmGroupDescription": "N/A", "InterventionName": "N/A"}]
-        return jsonify({"status": "success", "data": data})
+        return cached_trial_response("arms", nct_id, build)
     except Exception as e:
         logger.error(f"[Trial Arms] Erreur pour {nct_id}: {e}")
         return jsonify({"status": "error", "data": []})
 
 # ------------------- Mission E : Localisations -------------------
-@app.route("/api/trial/<string:nct_id>/locations", methods=["GET"])
+@api.route("/api/trial/<string:nct_id>/locations", methods=["GET"])
 def get_trial_locations(nct_id):
-    try:
-        locations = session.query(TrialLocation).filter_by(nct_id=nct_id).all()
-        data = [{
-            "Facility": l.facility or "N/A",
-            "City": l.city or "N/A",
-            "Country": l.country or "N/A",
-            "Zip": l.zip_code or "N/A",
-            "Latitude": l.latitude or "N/A",
-            "Longitude": l.longitude or "N/A"
-        } for l in locations] or [{"Facility": "N/A", "City": "N/A", "Country": "N/A"}]
+    def build():
+        locations = session.query(*LOCATION_COLUMNS).filter_by(nct_id=nct_id).all()
+        return {"status": "success", "data": locations_to_data(locations)}, 200
 
-        return jsonify({"status": "success", "data": data})
+    try:
+        return cached_trial_response("locations", nct_id, build)
     except Exception as e:
         logger.error(f"[Trial Locations] Erreur pour {nct_id}: {e}")
         return jsonify({"status": "error", "data": []})
 
 # ------------------- Mission F : Sponsors -------------------
-@app.route("/api/trial/<string:nct_id>/sponsors", methods=["GET"])
+@api.route("/api/trial/<string:nct_id>/sponsors", methods=["GET"])
 def get_trial_sponsors(nct_id):
+    def build():
+        sponsors = session.query(*SPONSOR_COLUMNS).filter_by(nct_id=nct_id).all()
+        return {"status": "success", "data": sponsors_to_data(sponsors)}, 200
+
+    try:
+        return cached_trial_response("sponsors", nct_id, build)
+    except Exception as e:
+        logger.error(f"[Trial Sponsors] Erreur pour {nct_id}: {e}")
+        return jsonify({"status": "error", "data": []})
+
+# ------------------- Lot d'essais -------------------
+@api.route("/api/trials", methods=["GET"])
+def get_trials_batch():
+    ids = list(dict.fromkeys(i.strip() for i in request.args.get("ids", "").split(",") if i.strip()))
+    include = parse_include(request.args.get("include", "").strip(), default=TRIAL_INCLUDES)
+    if not ids:
+        return jsonify({"status": "error", "message": "Le paramètre 'ids' est requis"}), 400
+    if len(ids) > settings.TRIALS_BATCH_MAX:
+        return jsonify({"status": "error", "message": f"Au plus {settings.TRIALS_BATCH_MAX} NCT IDs par requête"}), 400
+    if include is None:
+        return jsonify({"status": "error", "message": f"'include' accepte : {', '.join(TRIAL_INCLUDES)}"}), 400
+    try:
+        fields = parse_fields(request.args.get("fields", "").strip())
+    except ValueError:
+        return jsonify({"status": "error", "message": "'fields' attend des chemins séparés par des virgules"}), 400
+
+    try:
+        # Essais connus : une seule requête IN sur clinical_trials / trial_details
+        known = {nct for (nct,) in session.query(ClinicalTrial.nct_id).filter(ClinicalTrial.nct_id.in_(ids))}
+        known |= {nct for (nct,) in session.query(TrialDetails.nct_id).filter(TrialDetails.nct_id.in_(ids))}
+        found = [i for i in ids if i in known]
+        bundles = load_trial_bundles(session, found, include)
+        data = [{"NCTId": nct_id, **bundle_to_dict(bundles[nct_id], include, fields)} for nct_id in found]
+        missing = [i for i in ids if i not in known]
+        return jsonify({"status": "success", "data": data, "missing": missing})
+    except Exception as e:
+        logger.error(f"[Trials Batch] Erreur: {e}")
+        return jsonify({"status": "error", "data": []})
+
+# ------------------- Proximité géographique -------------------
+@api.route("/api/locations/near", methods=["GET"])
+def get_trials_near():
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    radius_km = request.args.get("radius_km", 50.0, type=float)
+    condition = request.args.get("condition", "").strip()
+    limit = min(max(1, request.args.get("limit", 50, type=int)), settings.GEO_MAX_LIMIT)
+
+    if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return jsonify({"status": "error", "message": "Les paramètres 'lat' (-90..90) et 'lon' (-180..180) sont requis"}), 400
+    if not 0 < radius_km <= settings.GEO_MAX_RADIUS_KM:
+        return jsonify({"status": "error", "message": f"'radius_km' doit être compris entre 0 et {settings.GEO_MAX_RADIUS_KM:g}"}), 400
+
     try:
-        sponsors = session.query(TrialSponsor).filter_by(nct_id=nct_id).all()
+        # Essais triés par distance de leur site le plus proche
+        results = nearby_trials(session, lat, lon, radius_km, condition=condition or None, limit=limit)
         data = [{
-            "LeadSponsor": s.lead_sponsor or "N/A",
-            "Collaborators": s.collaborators or [],
-            "Contacts": s.contacts or []
-        } for s in sponsors] or [{"LeadSponsor": "N/A", "Collaborators": [], "Contacts": []}]
+            "NCTId": trial.nct_id,
+            "Title": trial.title,
+            "Status": trial.status,
+            "DistanceKm": round(distance, 2),
+            "Facility": site.facility,
+            "City": site.city,
+            "Country": site.country,
+            "Latitude": site.latitude,
+            "Longitude": site.longitude,
+        } for trial, site, distance in results]
         return jsonify({"status": "success", "data": data})
     except Exception as e:
-        logger.error(f"[Trial Sponsors] Erreur pour {nct_id}: {e}")
+        logger.error(f"[Locations Near] Erreur pour ({lat}, {lon}): {e}")
+        return jsonify({"status": "error", "data": []})
+
+# ------------------- Facettes -------------------
+@api.route("/api/facets", methods=["GET"])
+def get_facets():
+    condition = request.args.get("condition", "").strip()
+    country = request.args.get("country", "").strip()
+    limit = min(max(1, request.args.get("limit", 20, type=int)), settings.FACETS_MAX_LIMIT)
+
+    try:
+        # Comptages précalculés (trial_facet_counts) : pas de parcours de clinical_trials
+        data = facet_counts(session, condition=condition or None, country=country or None, limit=limit)
+        return jsonify({"status": "success", "data": data})
+    except Exception as e:
+        logger.error(f"[Facets] Erreur pour condition='{condition}', country='{country}': {e}")
+        return jsonify({"status": "error", "data": {}})
+
+# ------------------- Appariement de patients -------------------
+@api.route("/api/match", methods=["GET"])
+def match_patient():
+    condition = request.args.get("condition", "").strip()
+    age = request.args.get("age", type=float)
+    sex = request.args.get("sex", "").strip()
+    healthy = request.args.get("healthy_volunteer", "").strip()
+    keywords = [k.strip() for k in request.args.get("keywords", "").split(",") if k.strip()]
+    recruiting = request.args.get("recruiting", "").strip()
+    limit = min(max(1, request.args.get("limit", 20, type=int)), settings.MATCH_MAX_LIMIT)
+
+    if not condition:
+        return jsonify({"status": "error", "message": "Le paramètre 'condition' est requis"}), 400
+    if "age" in request.args and (age is None or not 0 <= age <= 150):
+        return jsonify({"status": "error", "message": "'age' doit être un nombre d'années entre 0 et 150"}), 400
+    if sex and sex_label(sex) is None:
+        return jsonify({"status": "error", "message": "'sex' doit valoir 'female', 'male' ou 'all'"}), 400
+    if healthy and parse_bool(healthy) is None:
+        return jsonify({"status": "error", "message": "'healthy_volunteer' doit valoir 'true' ou 'false'"}), 400
+    if recruiting and parse_bool(recruiting) is None:
+        return jsonify({"status": "error", "message": "'recruiting' doit valoir 'true' ou 'false'"}), 400
+    if len(keywords) > settings.MATCH_MAX_KEYWORDS:
+        return jsonify({"status": "error", "message": f"Au plus {settings.MATCH_MAX_KEYWORDS} mots-clés"}), 400
+
+    try:
+        # Âge en jours comme les colonnes min_age_days / max_age_days ; sexe "All" = pas de filtre
+        terms = keyword_terms(keywords)
+        matches = match_trials(
+            session, condition, age=int(age * AGE_UNITS["year"]) if age is not None else None,
+            sex=sex_label(sex) if sex_label(sex) != "All" else None, healthy=parse_bool(healthy) if healthy else None,
+            terms=terms, recruiting_only=bool(recruiting and parse_bool(recruiting)), limit=limit
+        )
+        # Titre, statut et conditions des seuls essais renvoyés, dans l'ordre du classement
+        rows = {t.nct_id: t for t in trials_by_ids(session, [m.nct_id for m in matches])}
+        data = [{
+            "NCTId": m.nct_id,
+            "Title": rows[m.nct_id].title,
+            "Status": rows[m.nct_id].status,
+            "Conditions": rows[m.nct_id].conditions,
+            "Sex": m.sex,
+            "MinimumAgeDays": m.min_age_days,
+            "MaximumAgeDays": m.max_age_days,
+            "HealthyVolunteers": m.healthy_volunteers,
+            "Score": m.score,
+            "MatchedKeywords": matched_keywords(m, terms),
+        } for m in matches if m.nct_id in rows]
+        return jsonify({"status": "success", "data": data})
+    except Exception as e:
+        logger.error(f"[Match] Erreur pour condition='{condition}': {e}")
         return jsonify({"status": "error", "data": []})
 
+# ------------------- Cache -------------------
+@api.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    data = current_app.extensions["response_cache"].stats()
+    query_cache = current_app.extensions["query_cache"]
+    if query_cache is not None:
+        data["query_cache"] = query_cache.stats(session)
+    return jsonify({"status": "success", "data": data})
+
+# ------------------- Santé -------------------
+@api.route("/healthz", methods=["GET"])
+def healthz():
+    # Processus vivant : aucune requête SQL
+    return jsonify({"status": "ok"})
+
+@api.route("/readyz", methods=["GET"])
+def readyz():
+    # Prêt à servir : une connexion du pool répond à SELECT 1
+    try:
+        with get_engine().connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+        return jsonify({"status": "ok"})
+    except Exception as e:
+        logger.error(f"[Readyz] Erreur: {e}")
+        return jsonify({"status": "error", "message": "Base de données indisponible"}), 503
+
 # ------------------- Run Flask -------------------
+# Sous gunicorn : `gunicorn wsgi:app` (wsgi.py) ou `gunicorn --preload "app:create_app()"`
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    create_app().run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,154 @@
+# benchmarks/bench_backends.py
+"""
+Chemins de requête par type de base, sur la même base synthétique en
+SQLite (workdir/clinical_trials.db) ou sur --database-url (PostgreSQL local) :
+  - filtres de l'inventaire (condition, condition + pays) : tables de
+    correspondance (services/queries.py) contre un filtre sur le JSON de
+    clinical_trials (json_each sous SQLite, JSONB @> avec index GIN sous
+    PostgreSQL, index créé puis supprimé par ce banc) ;
+  - recherche plein texte (FTS5 / tsvector GIN) et proximité (R*Tree / index lat-lon).
+Latences p50 / p95 par chemin sur des paramètres tirés au hasard, plan
+d'exécution d'un exemple.
+Usage :
+  python -m benchmarks.bench_backends --trials 1000000 --workdir /tmp/b1m
+  python -m benchmarks.bench_backends --trials 1000000 --database-url postgresql+psycopg2://postgres@127.0.0.1:5432/b1m
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from benchmarks.harness import prepare_database, percentile
+
+GIN_INDEXES = {
+    "ix_bench_clinical_trials_conditions": "clinical_trials USING gin (conditions jsonb_path_ops)",
+    "ix_bench_clinical_trials_locations": "clinical_trials USING gin (locations jsonb_path_ops)",
+}
+
+
+def json_filter(query, dialect, condition, country=None):
+    """Filtre sur le JSON de clinical_trials, sans tables de correspondance."""
+    from sqlalchemy import text
+    from models import ClinicalTrial
+    if dialect == "postgresql":
+        from sqlalchemy import type_coerce
+        query = query.filter(ClinicalTrial.conditions.op("@>")(type_coerce([condition], ClinicalTrial.conditions.type)))
+        if country:
+            query = query.filter(ClinicalTrial.locations.op("@>")(
+                type_coerce([{"country": country}], ClinicalTrial.locations.type)))
+        return query
+    query = query.filter(text(
+        "EXISTS (SELECT 1 FROM json_each(clinical_trials.conditions) WHERE value = :condition)"
+    ).bindparams(condition=condition))
+    if country:
+        query = query.filter(text(
+            "EXISTS (SELECT 1 FROM json_each(clinical_trials.locations) WHERE json_extract(value, '$.country') = :country)"
+        ).bindparams(country=country))
+    return query
+
+def paths(db_session, dialect):
+    """Chemins mesurés : nom -> fonction(paramètres) renvoyant une requête exécutable."""
+    from models import ClinicalTrial
+    from services.queries import TRIAL_COLUMNS, filter_trials, paginate_trials
+
+    def lookup(p):
+        query = filter_trials(db_session.query(*TRIAL_COLUMNS), p["condition"], p.get("country"))
+        return paginate_trials(query, p["condition"], p.get("country")).limit(50)
+
+    def on_json(p):
+        return json_filter(db_session.query(*TRIAL_COLUMNS), dialect, p["condition"], p.get("country")).order_by(
+            ClinicalTrial.nct_id).limit(50)
+    return {"tables de correspondance": lookup, "JSON (" + ("JSONB @>" if dialect == "postgresql" else "json_each") + ")": on_json}
+
+def timed(run, samples):
+    timings = []
+    for params in samples:
+        started = time.perf_counter()
+        run(params)
+        timings.append((time.perf_counter() - started) * 1000)
+    ordered = sorted(timings)
+    return percentile(ordered, 50), percentile(ordered, 95)
+
+def plan(db_session, run):
+    """Plan de la dernière requête SQL exécutée par run()."""
+    from sqlalchemy import event
+    bind = db_session.get_bind()
+    captured = []
+    listener = lambda conn, cursor, statement, parameters, *rest: captured.append((statement, parameters))
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        run()
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+    statement, parameters = captured[-1]
+    prefix = "EXPLAIN QUERY PLAN " if bind.dialect.name == "sqlite" else "EXPLAIN "
+    with bind.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+    return [row[-1] if bind.dialect.name == "sqlite" else row[0] for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=1000000)
+    parser.add_argument("--workdir", help="Répertoire de la base SQLite (réutilisée si elle existe)")
+    parser.add_argument("--database-url", help="Base à utiliser à la place de workdir/clinical_trials.db")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par chemin indexé")
+    parser.add_argument("--scan-requests", type=int, default=5, help="Requêtes par chemin sans index (json_each)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp()
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    os.environ.setdefault("FLASK_DEBUG", "false")
+    trials = prepare_database(workdir, args.trials, seed=42, url=args.database_url)
+    import app as api
+    api.create_app()  # schéma mis à niveau (init_db)
+    from benchmarks.synthetic import CITY_COORDS, CONDITIONS, COUNTRIES
+    from services.database import get_engine, session
+    from services.geo import nearby_trials
+    from services.search import search_trials
+    from services.queries import TRIAL_COLUMNS
+
+    engine = get_engine()
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        with engine.begin() as conn:
+            for name, target in GIN_INDEXES.items():
+                conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+            conn.exec_driver_sql("ANALYZE clinical_trials")
+
+    rnd = random.Random(0)
+    selections = {
+        "condition": [{"condition": rnd.choice(CONDITIONS)} for _ in range(args.requests)],
+        "condition + pays": [{"condition": rnd.choice(CONDITIONS), "country": rnd.choice(COUNTRIES)}
+                             for _ in range(args.requests)],
+    }
+    print(f"{trials} essais, {dialect}")
+    print(f"{'filtre':<18} | {'chemin':<26} | {'p50 (ms)':>9} | {'p95 (ms)':>9}")
+    try:
+        for label, samples in selections.items():
+            for name, build in paths(session, dialect).items():
+                scan = name.endswith("(json_each)")
+                run = lambda p: build(p).all()
+                for params in samples[:5]:
+                    run(params)  # préchauffage
+                p50, p95 = timed(run, samples[:args.scan_requests] if scan else samples)
+                print(f"{label:<18} | {name:<26} | {p50:>9.2f} | {p95:>9.2f}")
+                if label == "condition + pays":
+                    print("    " + "\n    ".join(plan(session, lambda: run(samples[0]))))
+            session.remove()
+
+        searches = [rnd.choice(CONDITIONS) for _ in range(args.requests)]
+        p50, p95 = timed(lambda q: search_trials(session, q, limit=20, columns=TRIAL_COLUMNS), searches)
+        print(f"{'plein texte':<18} | {'FTS5' if dialect == 'sqlite' else 'tsvector GIN':<26} | {p50:>9.2f} | {p95:>9.2f}")
+        cities = [rnd.choice(list(CITY_COORDS.values())) for _ in range(args.requests)]
+        p50, p95 = timed(lambda c: nearby_trials(session, c[0], c[1], 50, limit=50), cities)
+        print(f"{'proximité 50 km':<18} | {'R*Tree' if dialect == 'sqlite' else 'index (lat, lon)':<26} | {p50:>9.2f} | {p95:>9.2f}")
+        session.remove()
+    finally:
+        session.remove()
+        if dialect == "postgresql":
+            with engine.begin() as conn:
+                for name in GIN_INDEXES:
+                    conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        os.chdir("/")
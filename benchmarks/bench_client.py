@@ -0,0 +1,61 @@
+# benchmarks/bench_client.py
+"""
+Rafraîchissement des bras / localisations / sponsors de N essais contre le
+serveur local services/ctgov_stub.py (latence simulée) : un requests.get par
+essai et par ressource (ancien comportement) vs ClinicalTrialsClient
+(keep-alive, lots de NCT IDs, requêtes parallèles).
+Usage : python -m benchmarks.bench_client --trials 2000 --latency 0.02
+"""
+import argparse
+import random
+import time
+import requests
+from services.clinical_trials import (
+    ClinicalTrialsClient, FIELDS_ARMS, FIELDS_LOCATIONS, FIELDS_SPONSORS
+)
+from services.ctgov_stub import start_stub_server
+from benchmarks.synthetic import generate_full_study, nct_id
+
+
+def legacy_refresh(base_url, nct_ids):
+    count = 0
+    for nct in nct_ids:
+        for fields in (FIELDS_ARMS, FIELDS_LOCATIONS, FIELDS_SPONSORS):
+            params = {"expr": nct, "fields": ",".join(fields), "fmt": "json"}
+            res = requests.get(f"{base_url}/study_fields", params=params, timeout=10)
+            res.raise_for_status()
+            count += len(res.json()["StudyFieldsResponse"]["StudyFields"])
+    return count
+
+
+def batched_refresh(client, nct_ids):
+    return sum(len(client.study_fields_by_ids(nct_ids, fields))
+               for fields in (FIELDS_ARMS, FIELDS_LOCATIONS, FIELDS_SPONSORS))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--legacy-sample", type=int, default=200,
+                        help="essais rafraîchis en séquentiel (extrapolé à --trials)")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    studies = [generate_full_study(i, rnd) for i in range(args.trials)]
+    ids = [nct_id(i) for i in range(args.trials)]
+    server, base_url = start_stub_server(studies, latency=args.latency)
+
+    started = time.perf_counter()
+    legacy_refresh(base_url, ids[:args.legacy_sample])
+    legacy = (time.perf_counter() - started) * args.trials / args.legacy_sample
+
+    client = ClinicalTrialsClient(base_url=base_url, rate_limit=0)
+    started = time.perf_counter()
+    found = batched_refresh(client, ids)
+    batched = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"{args.trials} essais x 3 ressources, latence simulée {args.latency * 1000:.0f} ms")
+    print(f"  requests.get par essai : {legacy:8.2f} s (extrapolé depuis {args.legacy_sample} essais)")
+    print(f"  client par lots        : {batched:8.2f} s ({found} résultats)")
@@ -0,0 +1,122 @@
+# benchmarks/bench_details.py
+"""
+Stockage de trial_details : document JSON complet dans full_data vs blob
+compressé par sections (packed_data). Taille de la base après VACUUM, puis
+latence et pic mémoire (tracemalloc) de la lecture d'un document complet et
+d'une projection ?fields=ProtocolSection.StatusModule.
+Les études synthétiques ont une longue description et une section de
+résultats volumineuse, comme les vraies études terminées.
+Usage : python -m benchmarks.bench_details --studies 2000 --reads 500
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy.orm import sessionmaker
+from models import Base, TrialDetails
+from services.database import make_engine
+from services.details import storage_columns, details_document, parse_fields
+from benchmarks.synthetic import generate_full_study, CONDITIONS
+
+WORDS = "patients treatment dose primary outcome randomized placebo arm baseline week adverse events".split()
+
+
+def large_study(i, rnd):
+    study = generate_full_study(i, rnd)
+    text = lambda n: " ".join(rnd.choice(WORDS) for _ in range(n))
+    study["Study"]["ProtocolSection"]["DescriptionModule"] = {
+        "BriefSummary": text(80), "DetailedDescription": text(rnd.randint(800, 2000)),
+    }
+    study["Study"]["ResultsSection"] = {
+        "BaselineCharacteristicsModule": {"BaselineMeasureList": {"BaselineMeasure": [{
+            "BaselineMeasureTitle": f"Measure {m}", "BaselineMeasureUnitOfMeasure": "participants",
+            "BaselineClassList": {"BaselineClass": [{"BaselineCategoryList": {"BaselineCategory": [{
+                "BaselineMeasurementList": {"BaselineMeasurement": [
+                    {"BaselineMeasurementGroupId": f"BG{g}", "BaselineMeasurementValue": str(rnd.randint(1, 500))}
+                    for g in range(4)]}
+            }]}}]},
+        } for m in range(rnd.randint(10, 30))]}},
+        "OutcomeMeasuresModule": {"OutcomeMeasureList": {"OutcomeMeasure": [{
+            "OutcomeMeasureType": "Primary", "OutcomeMeasureTitle": text(12),
+            "OutcomeMeasureDescription": text(60), "OutcomeMeasureTimeFrame": f"{rnd.randint(1, 52)} weeks",
+        } for _ in range(rnd.randint(5, 20))]}},
+        "AdverseEventsModule": {"EventGroupList": {"EventGroup": [{
+            "EventGroupId": f"EG{g}", "EventGroupTitle": rnd.choice(CONDITIONS), "EventGroupDescription": text(30),
+        } for g in range(4)]}},
+    }
+    return study
+
+
+def build(path, studies, codec):
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(TrialDetails.__table__.insert(), [
+            {"nct_id": study_id(s), **storage_columns(s, codec)} for s in studies
+        ])
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    return engine
+
+
+def study_id(study):
+    return study["Study"]["ProtocolSection"]["IdentificationModule"]["NCTId"]
+
+
+def read(session, nct_id, fields):
+    """Chemin de /api/trial/<id> : lecture de la ligne, document (projeté), sérialisation."""
+    row = session.query(TrialDetails.packed_data, TrialDetails.full_data).filter_by(nct_id=nct_id).first()
+    return json.dumps(details_document(row.packed_data, row.full_data, fields))
+
+
+def measure(engine, ids, fields):
+    session = sessionmaker(bind=engine)()
+    timings = []
+    for nct_id in ids:
+        started = time.perf_counter()
+        read(session, nct_id, fields)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    for nct_id in ids[:50]:
+        read(session, nct_id, fields)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    session.close()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1], peak / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--studies", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=500)
+    args = parser.parse_args()
+
+    rnd = random.Random(3)
+    studies = [large_study(i, rnd) for i in range(args.studies)]
+    ids = [study_id(s) for s in rnd.choices(studies, k=args.reads)]
+    projection = parse_fields("ProtocolSection.StatusModule")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = {}
+        for label, codec in (("full_data JSON", b""), ("packed_data zlib", b"z")):
+            path = os.path.join(tmp, f"{codec.decode() or 'json'}.db")
+            engines[label] = build(path, studies, codec)
+            print(f"{label:<18} | base après VACUUM : {os.path.getsize(path) / 1024 / 1024:>7.1f} Mo")
+
+        # Les deux formats doivent rendre exactement le même document
+        session = sessionmaker(bind=engines["packed_data zlib"])()
+        mismatches = sum(read(session, study_id(s), None) != json.dumps(s) for s in studies[:200])
+        session.close()
+        print(f"documents différents après compression : {mismatches}")
+
+        print(f"{'format':<18} | {'lecture':<22} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | {'pic (Ko)':>8}")
+        for label, engine in engines.items():
+            for name, fields in (("document complet", None), ("?fields=StatusModule", projection)):
+                p50, p99, peak = measure(engine, ids, fields)
+                print(f"{label:<18} | {name:<22} | {p50:>8.2f} | {p99:>8.2f} | {peak:>8.0f}")
+            engine.dispose()
@@ -0,0 +1,107 @@
+# benchmarks/bench_export.py
+"""
+Export de l'inventaire (/api/export, services/export.py) sur une base
+synthétique, via le client de test Flask, réponse lue morceau par morceau
+sans être conservée : débit (lignes/s, Mo/s) en CSV et en Parquet (si
+pyarrow est installé) pour tout l'inventaire et pour une condition, puis
+pic mémoire (tracemalloc, et pool mémoire d'Arrow pour Parquet) à deux
+tailles d'export, qui doit rester le même. Référence : les pages
+JSON successives de /api/inventory (limit=1000, curseur) pour les mêmes lignes.
+Usage : python -m benchmarks.bench_export --trials 1000000 --workdir /tmp/export
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlencode
+from benchmarks.harness import prepare_database
+
+
+def consume(client, path):
+    """Octets de la réponse, lue morceau par morceau ; renvoie (octets, secondes)."""
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return size, time.perf_counter() - started
+
+def peak_memory(client, path):
+    """
+    Pic mémoire (Mo) d'un export : allocations Python (tracemalloc) et plus
+    haut niveau du pool d'Arrow depuis le début du process (non remis à zéro).
+    """
+    from services.export import parquet_available
+    tracemalloc.start()
+    consume(client, path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    arrow = 0
+    if parquet_available():
+        import pyarrow
+        arrow = pyarrow.default_memory_pool().max_memory()
+    return peak / 1024 / 1024, arrow / 1024 / 1024
+
+def inventory_pages(client, query):
+    """Référence : pages JSON de /api/inventory jusqu'à la fin ; renvoie (lignes, secondes)."""
+    rows, cursor = 0, ""
+    started = time.perf_counter()
+    while True:
+        body = client.get(f"/api/inventory?{query}&limit=1000&cursor={cursor}").get_json()
+        rows += len(body["data"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return rows, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=1000000)
+    parser.add_argument("--workdir", help="Répertoire de la base (réutilisée si elle existe)")
+    parser.add_argument("--database-url", help="Base à utiliser à la place de workdir/clinical_trials.db")
+    parser.add_argument("--memory-rows", type=int, nargs=2, default=[100000, 1000000],
+                        help="Tailles d'export (limit) des mesures de pic mémoire")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp()
+    os.makedirs(workdir, exist_ok=True)
+    # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant
+    os.chdir(workdir)
+    trials = prepare_database(workdir, args.trials, seed=42, url=args.database_url)
+    import app as api
+    application = api.create_app()
+    from config import settings
+    from models import ClinicalTrial
+    from services.export import parquet_available
+    from services.queries import filter_trials
+
+    client = application.test_client()
+    # Référence sans cache de résultats : chaque page est lue en base
+    application.extensions["query_cache"] = None
+    formats = ["csv"] + (["parquet"] if parquet_available() else [])
+    selections = {"tout l'inventaire": {}, "une condition": {"condition": "Asthma"}}
+    print(f"{trials} essais, lots de {settings.EXPORT_CHUNK_SIZE} lignes"
+          + ("" if parquet_available() else " (pyarrow absent : CSV seulement)"))
+
+    print(f"{'sélection':<18} | {'format':<8} | {'lignes':>8} | {'s':>7} | {'lignes/s':>9} | {'Mo':>7} | {'Mo/s':>6}")
+    for label, filters in selections.items():
+        query = urlencode(filters)
+        count = filter_trials(api.session.query(ClinicalTrial.nct_id), **filters).count()
+        api.session.remove()
+        for fmt in formats:
+            size, elapsed = consume(client, f"/api/export?format={fmt}&{query}")
+            print(f"{label:<18} | {fmt:<8} | {count:>8} | {elapsed:>7.2f} | {count / elapsed:>9.0f} | "
+                  f"{size / 1024 / 1024:>7.1f} | {size / 1024 / 1024 / elapsed:>6.1f}")
+        if filters:
+            # /api/inventory exige un filtre : référence sur la sélection filtrée seulement
+            rows, elapsed = inventory_pages(client, query)
+            print(f"{label:<18} | {'json':<8} | {rows:>8} | {elapsed:>7.2f} | {rows / elapsed:>9.0f} | "
+                  f"{'':>7} | {'':>6}  (/api/inventory, pages de 1000)")
+    api.session.remove()
+
+    print(f"\n{'format':<8} | {'lignes':>8} | {'pic Python (Mo)':>15} | {'pic Arrow (Mo)':>14}")
+    for fmt in formats:
+        for rows in args.memory_rows:
+            python_peak, arrow_peak = peak_memory(client, f"/api/export?format={fmt}&limit={rows}")
+            print(f"{fmt:<8} | {min(rows, trials):>8} | {python_peak:>15.1f} | {arrow_peak:>14.1f}")
+    os.chdir("/")
@@ -0,0 +1,107 @@
+# benchmarks/bench_facets.py
+"""
+Comptages de /api/facets : lecture de la table précalculée trial_facet_counts
+vs GROUP BY sur clinical_trials et les tables de correspondance (ce que
+ferait un comptage sans table de résumé). Les deux doivent donner les mêmes
+résultats, y compris après une ingestion incrémentale qui modifie statut,
+conditions et pays d'une partie des essais.
+Usage : python -m benchmarks.bench_facets --trials 1000000 --queries 100
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from services.database import bulk_upsert_trial_rows
+from services.facets import facet_counts, facet_rows
+from benchmarks.synthetic import build_database, generate_trial, CONDITIONS, COUNTRIES, STATUSES
+from benchmarks.bench_lookup import percentiles
+
+SCAN_FILTER = """FROM clinical_trials t
+    WHERE (:condition IS NULL OR EXISTS (SELECT 1 FROM trial_conditions c WHERE c.nct_id = t.nct_id AND c.condition = :condition))
+    AND (:country IS NULL OR EXISTS (SELECT 1 FROM trial_countries k WHERE k.nct_id = t.nct_id AND k.country = :country))"""
+
+
+def scan_facets(session, condition=None, country=None, limit=20):
+    """Mêmes comptages que facet_counts, calculés à la volée."""
+    params = {"condition": condition, "country": country}
+    statuses, years, total = Counter(), Counter(), 0
+    for status, year, n in session.execute(text(
+        f"SELECT t.status, CAST(strftime('%Y', t.start_date) AS INTEGER), count(*) {SCAN_FILTER} GROUP BY 1, 2"
+    ), params):
+        statuses[status or None] += n
+        years[year] += n
+        total += n
+    countries = session.execute(text(
+        f"""SELECT k.country, count(*) FROM trial_countries k JOIN clinical_trials t ON t.nct_id = k.nct_id
+        WHERE (:condition IS NULL OR EXISTS (SELECT 1 FROM trial_conditions c WHERE c.nct_id = t.nct_id AND c.condition = :condition))
+        GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT :limit"""
+    ), {**params, "limit": limit}).all()
+    conditions = session.execute(text(
+        f"""SELECT c.condition, count(*) FROM trial_conditions c JOIN clinical_trials t ON t.nct_id = c.nct_id
+        WHERE (:country IS NULL OR EXISTS (SELECT 1 FROM trial_countries k WHERE k.nct_id = t.nct_id AND k.country = :country))
+        GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT :limit"""
+    ), {**params, "limit": limit}).all()
+    as_values = lambda rows: [{"value": v, "count": n} for v, n in rows]
+    return {
+        "total": total,
+        "status": as_values(sorted(statuses.items(), key=lambda kv: (-kv[1], kv[0] or ""))),
+        "start_year": as_values(sorted(years.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))),
+        "country": as_values(countries),
+        "condition": as_values(conditions),
+    }
+
+
+def run(session, compute, cases):
+    timings, results = [], []
+    for condition, country in cases:
+        started = time.perf_counter()
+        results.append(compute(session, condition, country))
+        timings.append((time.perf_counter() - started) * 1000)
+    return percentiles(timings), results
+
+
+def modified_rows(trials, count, rnd):
+    """Lignes clinical_trials réécrites : statut, conditions et pays tirés à nouveau."""
+    return [generate_trial(i, random.Random(rnd.random())) for i in rnd.sample(range(trials), count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--modified", type=int, default=5000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    # Sans filtre, par condition, par pays, et les deux
+    cases = [(None, None)] + [
+        (rnd.choice(CONDITIONS) if i % 3 != 1 else None, rnd.choice(COUNTRIES) if i % 3 != 0 else None)
+        for i in range(args.queries - 1)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        engine = build_database(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.trials, details=False)
+        session = sessionmaker(bind=engine)()
+        print(f"{args.trials} essais générés en {time.perf_counter() - started:.1f} s,"
+              f" {facet_rows(session)} lignes de comptage")
+
+        print(f"{'étape':<26} | {'GROUP BY p50/p99 (ms)':>22} | {'précalculé p50/p99 (ms)':>24} | écarts")
+        for label in ("après chargement", "après ingestion delta"):
+            new, new_results = run(session, facet_counts, cases)
+            old, old_results = run(session, scan_facets, cases[:20])
+            mismatches = sum(a != b for a, b in zip(old_results, new_results))
+            print(f"{label:<26} | {old[0]:>10.1f} / {old[1]:>9.1f} | {new[0]:>11.2f} / {new[1]:>10.2f} | {mismatches}")
+            if label == "après chargement":
+                rows = modified_rows(args.trials, args.modified, rnd)
+                for row in rows:
+                    row["status"] = rnd.choice(STATUSES + [None])
+                started = time.perf_counter()
+                bulk_upsert_trial_rows(rows, db_session=session)
+                print(f"ingestion de {len(rows)} essais modifiés : {time.perf_counter() - started:.2f} s")
+        session.close()
+        engine.dispose()
@@ -0,0 +1,87 @@
+# benchmarks/bench_geo.py
+"""
+Latence p50/p99 de la recherche de proximité (R*Tree + distance approchée en
+SQL) comparée au calcul haversine sur toutes les localisations en Python.
+Usage : python -m benchmarks.bench_geo --sizes 100000 1000000 --radius 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import ClinicalTrial, TrialLocation, TrialCondition
+from services.geo import init_geo_index, nearby_trials, haversine_km
+from benchmarks.synthetic import build_database, CITY_COORDS, CONDITIONS
+from benchmarks.bench_lookup import percentiles
+
+
+def brute_force(session, lat, lon, radius_km, condition, limit):
+    """Ancienne approche : toutes les localisations chargées, distance calculée en Python."""
+    query = session.query(TrialLocation.nct_id, TrialLocation.latitude, TrialLocation.longitude)
+    if condition:
+        query = query.join(TrialCondition, TrialCondition.nct_id == TrialLocation.nct_id) \
+                     .filter(TrialCondition.condition == condition)
+    best = {}
+    for nct, site_lat, site_lon in query:
+        if site_lat is None or site_lon is None:
+            continue
+        distance = haversine_km(lat, lon, site_lat, site_lon)
+        if distance <= radius_km and distance < best.get(nct, radius_km + 1):
+            best[nct] = distance
+    nearest = sorted(best, key=best.get)[:limit]
+    return session.query(ClinicalTrial).filter(ClinicalTrial.nct_id.in_(nearest)).all()
+
+
+def run(session, search, cases, radius_km, limit):
+    timings, found = [], []
+    for lat, lon, condition in cases:
+        started = time.perf_counter()
+        results = search(session, lat, lon, radius_km, condition, limit)
+        timings.append((time.perf_counter() - started) * 1000)
+        found.append(len(results))
+        session.expunge_all()
+    return percentiles(timings), sum(found) / len(found)
+
+
+def bench(engine, cases, radius_km, limit, with_brute_force):
+    session = sessionmaker(bind=engine)()
+    new = run(session, lambda s, *a: nearby_trials(s, *a[:3], condition=a[3], limit=a[4]), cases, radius_km, limit)
+    old = run(session, brute_force, cases[:10], radius_km, limit) if with_brute_force else None
+    session.close()
+    return old, new
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000])
+    parser.add_argument("--db", help="Base existante (générée par benchmarks.synthetic) à la place de --sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=50.0)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--skip-brute-force", action="store_true")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    # Points proches d'une ville (zone dense), avec ou sans filtre de condition
+    cities = list(CITY_COORDS.values())
+    cases = []
+    for i in range(args.queries):
+        lat, lon = rnd.choice(cities)
+        cases.append((lat + rnd.uniform(-0.2, 0.2), lon + rnd.uniform(-0.2, 0.2),
+                       rnd.choice(CONDITIONS) if i % 2 else None))
+
+    print(f"{'essais':>10} | {'haversine p50/p99 (ms)':>23} | {'R*Tree p50/p99 (ms)':>20} | {'essais/requête':>14}")
+    targets = [(args.db, f"sqlite:///{args.db}")] if args.db else [(size, None) for size in args.sizes]
+    for label, url in targets:
+        with tempfile.TemporaryDirectory() as tmp:
+            if url:
+                engine = create_engine(url)
+                init_geo_index(engine)
+            else:
+                engine = build_database(f"sqlite:///{os.path.join(tmp, 'bench.db')}", label, details=False)
+            old, new = bench(engine, cases, args.radius, args.limit, not args.skip_brute_force)
+            engine.dispose()
+        old_text = f"{old[0][0]:>10.2f} / {old[0][1]:>10.2f}" if old else f"{'-':>23}"
+        print(f"{label:>10} | {old_text} | {new[0][0]:>9.2f} / {new[0][1]:>8.2f} | {new[1]:>14.1f}")
@@ -0,0 +1,66 @@
+# benchmarks/bench_geocoding.py
+"""
+Étape de géocodage sur des localisations synthétiques sans coordonnées, avec
+un géocodeur local qui simule la latence d'un service distant : appels un par
+un pour chaque localisation, puis deux runs de geocode_locations (cache
+froid, puis cache chaud).
+Usage : python -m benchmarks.bench_geocoding --trials 2000 --latency 0.02
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base
+from services.geocoding import LocalGeocoder, geocode_locations, normalize_address
+from benchmarks.synthetic import generate_trial, CITY_COORDS
+
+
+def synthetic_locations(trials, seed=42):
+    """Localisations au format de Preprocessor.process_locations, sans coordonnées."""
+    rnd = random.Random(seed)
+    return [{
+        "nct_id": trial["nct_id"], "Facility": loc["facility"], "City": loc["city"],
+        "Country": loc["country"], "Zip": "N/A", "Latitude": None, "Longitude": None,
+    } for trial in (generate_trial(i, rnd) for i in range(trials)) for loc in trial["locations"]]
+
+
+def local_table():
+    return {f"{city}|{city.rsplit(' City ', 1)[0]}": coords for city, coords in CITY_COORDS.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    locations = synthetic_locations(args.trials)
+    print(f"{len(locations)} localisations, latence simulée {args.latency * 1000:.0f} ms")
+
+    # Sans étape dédiée : un appel par localisation, en série
+    geocoder = LocalGeocoder(local_table(), latency=args.latency)
+    sample = locations[:200]
+    started = time.perf_counter()
+    for loc in sample:
+        geocoder.geocode(normalize_address(loc["Facility"], loc["City"], loc["Zip"], loc["Country"]))
+    naive = (time.perf_counter() - started) / len(sample) * len(locations)
+    print(f"{'un appel par localisation (extrapolé)':<40} | {naive:>8.2f} s | {len(locations):>6} appels")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'geocode.db')}")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        for label in ("geocode_locations (cache froid)", "geocode_locations (cache chaud)"):
+            batch = [dict(loc) for loc in locations]
+            geocoder = LocalGeocoder(local_table(), latency=args.latency)
+            started = time.perf_counter()
+            # Pas de limite de débit : seule la latence simulée borne le géocodeur local
+            report = geocode_locations(batch, geocoder, session, max_workers=args.workers, rate_limit=0)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<40} | {elapsed:>8.2f} s | {geocoder.calls:>6} appels | {report}")
+        session.close()
+        engine.dispose()
@@ -0,0 +1,76 @@
+# benchmarks/bench_ingest.py
+"""
+Débit d'écriture (essais/s) de clinical_trials : ancienne boucle
+SELECT + COMMIT par essai vs bulk_upsert_trials (une transaction par lot).
+Chaque mode charge d'abord les essais (insertions) puis les recharge (mises à jour).
+Usage : python -m benchmarks.bench_ingest --sizes 1000 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy.orm import sessionmaker
+from models import Base, ClinicalTrial
+from services.database import make_engine, bulk_upsert_trials, refresh_trial_lookups, _trial_columns
+from services.search import init_search_index
+from benchmarks.synthetic import generate_trial
+
+
+def preprocessed_trials(count, seed=0):
+    """Essais au format de sortie du Preprocessor."""
+    rnd = random.Random(seed)
+    trials = []
+    for i in range(count):
+        t = generate_trial(i, rnd)
+        trials.append({
+            "NCTId": t["nct_id"], "Title": t["title"], "Conditions": t["conditions"],
+            "Interventions": t["interventions"], "Status": t["status"],
+            "StartDate": t["start_date"].isoformat(), "CompletionDate": t["completion_date"].isoformat(),
+            "Locations": [{"city": l["city"], "country": l["country"]} for l in t["locations"]],
+        })
+    return trials
+
+
+def legacy_save(session, trials):
+    """Ancien save_clinical_trial : une requête et un COMMIT par essai."""
+    for trial in trials:
+        existing = session.query(ClinicalTrial).filter_by(nct_id=trial["NCTId"]).first()
+        columns = _trial_columns(trial)
+        if existing:
+            for key, value in columns.items():
+                setattr(existing, key, value)
+        else:
+            session.add(ClinicalTrial(nct_id=trial["NCTId"], **columns))
+        refresh_trial_lookups(session, [{"nct_id": trial["NCTId"], **columns}])
+        session.commit()
+
+
+def measure(load, trials):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        init_search_index(engine)
+        session = sessionmaker(bind=engine)()
+        rates = []
+        for _ in ("insert", "update"):
+            started = time.perf_counter()
+            load(session, trials)
+            rates.append(len(trials) / (time.perf_counter() - started))
+        session.close()
+        engine.dispose()
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'essais':>8} | {'ancien ins/maj (essais/s)':>26} | {'bulk ins/maj (essais/s)':>24}")
+    for size in args.sizes:
+        trials = preprocessed_trials(size)
+        old = measure(legacy_save, trials)
+        new = measure(lambda s, t: bulk_upsert_trials(t, batch_size=args.batch_size, db_session=s), trials)
+        print(f"{size:>8} | {old[0]:>12.0f} / {old[1]:>11.0f} | {new[0]:>11.0f} / {new[1]:>10.0f}")
@@ -0,0 +1,65 @@
+# benchmarks/bench_lookup.py
+"""
+Latence p50/p99 des filtres condition/pays de /api/inventory et /api/search :
+ancien filtre json_extract('$[0]') (scan complet) vs tables trial_conditions /
+trial_countries (recherche indexée).
+Usage : python -m benchmarks.bench_lookup --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from models import ClinicalTrial
+from services.queries import filter_trials
+from benchmarks.synthetic import build_database, CONDITIONS, COUNTRIES
+
+
+def legacy_filter(query, condition=None, country=None):
+    if condition:
+        query = query.filter(func.json_extract(ClinicalTrial.conditions, '$[0]') == condition)
+    if country:
+        query = query.filter(func.json_extract(ClinicalTrial.locations, '$[0].country') == country)
+    return query
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def run(session, apply_filter, cases, limit):
+    timings = []
+    for condition, country in cases:
+        started = time.perf_counter()
+        apply_filter(session.query(ClinicalTrial), condition=condition, country=country).limit(limit).all()
+        timings.append((time.perf_counter() - started) * 1000)
+        session.expunge_all()
+    return percentiles(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    cases = [
+        rnd.choice([(rnd.choice(CONDITIONS), None), (None, rnd.choice(COUNTRIES)),
+                    (rnd.choice(CONDITIONS), rnd.choice(COUNTRIES))])
+        for _ in range(args.queries)
+    ]
+    print(f"{'essais':>10} | {'json_extract p50/p99 (ms)':>26} | {'index p50/p99 (ms)':>20}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = build_database(f"sqlite:///{os.path.join(tmp, 'bench.db')}", size, details=False)
+            session = sessionmaker(bind=engine)()
+            old = run(session, legacy_filter, cases, args.limit)
+            new = run(session, filter_trials, cases, args.limit)
+            session.close()
+            engine.dispose()
+        print(f"{size:>10} | {old[0]:>12.2f} / {old[1]:>10.2f} | {new[0]:>9.2f} / {new[1]:>8.2f}")
@@ -0,0 +1,119 @@
+# benchmarks/bench_match.py
+"""
+Appariement de patients (/api/match, services/eligibility.py) sur une base
+synthétique : latences p50 / p95 / p99 de profils tirés au hasard (condition,
+âge, sexe, volontaire sain, mots-clés), via le client de test Flask, plan de
+la requête SQLite, puis comparaison avec l'approche précédente : lire le
+document de chaque essai de la condition et filtrer en Python.
+Usage : python -m benchmarks.bench_match --trials 1000000 --workdir /tmp/match --requests 500
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from urllib.parse import urlencode
+from benchmarks.harness import prepare_database, percentile
+
+KEYWORDS = ["pregnancy", "adults", "diabetes", "heart failure", "asthma", "kidney", "lung cancer"]
+
+
+def profiles(count, rnd):
+    from benchmarks.synthetic import CONDITIONS
+    result = []
+    for _ in range(count):
+        params = {"condition": rnd.choice(CONDITIONS), "age": rnd.randint(1, 90), "limit": 20}
+        if rnd.random() < 0.7:
+            params["sex"] = rnd.choice(["female", "male"])
+        if rnd.random() < 0.1:
+            params["healthy_volunteer"] = "true"
+        if rnd.random() < 0.8:
+            params["keywords"] = ",".join(rnd.sample(KEYWORDS, rnd.randint(1, 3)))
+        result.append(params)
+    return result
+
+
+def client_side(db_session, params):
+    """Approche précédente : document de chaque essai de la condition, filtré en Python."""
+    from models import TrialCondition, TrialDetails
+    from services.details import details_document
+    from services.eligibility import age_days, eligibility_module, sex_label
+    age = params["age"] * 365.25
+    ids = [nct for (nct,) in db_session.query(TrialCondition.nct_id).filter_by(condition=params["condition"])]
+    kept = []
+    for row in db_session.query(TrialDetails.nct_id, TrialDetails.packed_data, TrialDetails.full_data).filter(
+        TrialDetails.nct_id.in_(ids)
+    ):
+        module = eligibility_module(details_document(row.packed_data, row.full_data))
+        low, high = age_days(module.get("MinimumAge")), age_days(module.get("MaximumAge"))
+        sex = sex_label(module.get("Gender"))
+        if (low is None or low <= age) and (high is None or high >= age) and \
+                (not params.get("sex") or sex in (None, "All", sex_label(params["sex"]))):
+            kept.append(row.nct_id)
+    return kept[:params["limit"]]
+
+
+def quantiles(values):
+    ordered = sorted(values)
+    return [percentile(ordered, q) for q in (50, 95, 99)] + [ordered[-1]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=1000000)
+    parser.add_argument("--workdir", help="Répertoire de la base (réutilisée si elle existe)")
+    parser.add_argument("--database-url", help="Base à utiliser à la place de workdir/clinical_trials.db")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--baseline-requests", type=int, default=20, help="Profils rejoués avec l'approche précédente")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp()
+    os.makedirs(workdir, exist_ok=True)
+    # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant
+    os.chdir(workdir)
+    trials = prepare_database(workdir, args.trials, seed=42, url=args.database_url)
+    import app as api
+    application = api.create_app()
+    from sqlalchemy import event
+    from services.database import get_engine, session
+    from services.eligibility import keyword_terms, match_trials
+
+    rnd = random.Random(0)
+    paths = [f"/api/match?{urlencode(p)}" for p in profiles(args.requests, rnd)]
+    client = application.test_client()
+    for path in paths[:50]:
+        client.get(path)  # préchauffage (pages SQLite en cache)
+    timings, returned = [], []
+    for path in paths:
+        started = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - started) * 1000)
+        returned.append(len(response.get_json()["data"]))
+
+    print(f"{trials} essais, {len(paths)} profils")
+    print(f"/api/match : p50 {quantiles(timings)[0]:.2f} ms | p95 {quantiles(timings)[1]:.2f} ms | "
+          f"p99 {quantiles(timings)[2]:.2f} ms | max {quantiles(timings)[3]:.2f} ms | "
+          f"essais renvoyés (moyenne) {statistics.mean(returned):.1f}")
+
+    # Plan de la requête SQL d'un profil
+    sample = profiles(1, random.Random(1))[0]
+    captured = []
+    listener = lambda conn, cursor, statement, parameters, *rest: captured.append((statement, parameters))
+    event.listen(get_engine(), "before_cursor_execute", listener)
+    match_trials(session, sample["condition"], age=int(sample["age"] * 365.25),
+                 terms=keyword_terms(sample.get("keywords", "").split(",")))
+    event.remove(get_engine(), "before_cursor_execute", listener)
+    print(f"plan ({sample}) :")
+    with get_engine().connect() as conn:
+        for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {captured[-1][0]}", captured[-1][1]):
+            print(f"  {row[-1]}")
+
+    baseline = []
+    for params in profiles(args.baseline_requests, random.Random(2)):
+        started = time.perf_counter()
+        client_side(session, params)
+        baseline.append((time.perf_counter() - started) * 1000)
+    session.remove()
+    print(f"filtrage côté client ({len(baseline)} profils) : p50 {quantiles(baseline)[0]:.1f} ms | "
+          f"max {quantiles(baseline)[3]:.1f} ms")
@@ -0,0 +1,64 @@
+# benchmarks/bench_metrics.py
+"""
+Surcoût des métriques (services/metrics.py) sur les chemins chauds de l'API,
+appelée en process via le client de test Flask : détail d'un essai servi
+par le cache, inventaire filtré de 50 lignes, facettes. Chaque requête est
+jouée deux fois de suite, métriques désactivées puis activées, pour que la
+dérive de la machine touche les deux mesures de la même façon.
+Usage : python -m benchmarks.bench_metrics --trials 20000 --requests 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def urls(trials, count, rnd):
+    from benchmarks.synthetic import nct_id, CONDITIONS, COUNTRIES
+    hot = [nct_id(rnd.randrange(trials)) for _ in range(50)]
+    return {
+        "/api/trial/<id> (cache)": [f"/api/trial/{rnd.choice(hot)}" for _ in range(count)],
+        "/api/inventory limit=50": [f"/api/inventory?condition={rnd.choice(CONDITIONS)}&limit=50"
+                                    for _ in range(count)],
+        "/api/facets": [f"/api/facets?condition={rnd.choice(CONDITIONS)}&country={rnd.choice(COUNTRIES)}"
+                        for _ in range(count)],
+    }
+
+
+def play(client, metrics, paths):
+    timings = {False: [], True: []}
+    for path in paths:
+        for enabled in (False, True):
+            metrics.enabled = enabled
+            started = time.perf_counter()
+            client.get(path)
+            timings[enabled].append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant :
+        # on se place dans le répertoire de la base synthétique avant tout import
+        os.chdir(tmp)
+        from benchmarks.synthetic import build_database
+        build_database("sqlite:///clinical_trials.db", args.trials).dispose()
+        import app as api
+        application = api.create_app()
+        client = application.test_client()
+        rnd = random.Random(0)
+
+        print(f"{'endpoint':<26} | {'sans (µs p50)':>13} | {'avec (µs p50)':>13} | {'surcoût':>8}")
+        for label, paths in urls(args.trials, args.requests, rnd).items():
+            play(client, application.extensions["metrics"], paths[:200])  # préchauffage (cache de réponses, pages SQLite)
+            results = play(client, application.extensions["metrics"], paths)
+            off, on = statistics.median(results[False]), statistics.median(results[True])
+            print(f"{label:<26} | {off:>13.0f} | {on:>13.0f} | {(on - off) / off * 100:>7.1f} %")
+        os.chdir("/")
@@ -0,0 +1,118 @@
+# benchmarks/bench_pipeline.py
+"""
+Débit de services/ingest.py (études/s, toutes tables) sur des études
+synthétiques FullStudies, chaque mode dans une base neuve :
+  - étude par étude : write_studies([étude]), comme les scripts ad hoc ;
+  - séquentiel par pages : lecture, prétraitement et écriture d'une page à la fois ;
+  - pipeline sans pool (parse_workers=0) puis avec un pool de process ;
+  - API (serveur local services/ctgov_stub.py avec latence) : pages une à
+    une vs pipeline avec fetch concurrent.
+Usage : python -m benchmarks.bench_pipeline --studies 20000 --api-studies 5000 --latency 0.2
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from sqlalchemy.orm import sessionmaker
+from models import Base
+from services.clinical_trials import ClinicalTrialsClient
+from services.ctgov_stub import start_stub_server
+from services.database import make_engine
+from services.geo import init_geo_index
+from services.ingest import DirectorySource, ExprSource, ingest
+from services.search import init_search_index
+from services.sync import write_studies
+from benchmarks.synthetic import generate_full_study
+
+
+def fresh_session(path):
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    init_search_index(engine)
+    init_geo_index(engine)
+    return sessionmaker(bind=engine)()
+
+
+def write_pages(directory, studies, page_size=100):
+    for start in range(0, len(studies), page_size):
+        with open(os.path.join(directory, f"page{start:07d}.json"), "w", encoding="utf-8") as f:
+            json.dump({"FullStudiesResponse": {"FullStudies": studies[start:start + page_size]}}, f)
+
+
+def one_by_one(directory, session, limit):
+    studies = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            studies.extend(json.load(f)["FullStudiesResponse"]["FullStudies"])
+        if len(studies) >= limit:
+            break
+    for study in studies[:limit]:
+        write_studies([study], session)
+    return limit
+
+def sequential_pages(directory, session):
+    count = 0
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            count += write_studies(json.load(f)["FullStudiesResponse"]["FullStudies"], session)
+    return count
+
+def sequential_api(client, session, page_size):
+    count, start = 0, 1
+    while True:
+        page = client.full_studies("", min_rnk=start, max_rnk=start + page_size - 1)
+        count += write_studies(page, session)
+        if len(page) < page_size:
+            return count
+        start += page_size
+
+
+def measure(label, tmp, run):
+    session = fresh_session(os.path.join(tmp, f"{label.replace(' ', '_')}.db"))
+    started = time.perf_counter()
+    count = run(session)
+    elapsed = time.perf_counter() - started
+    session.close()
+    print(f"{label:<38} | {count:>7} | {elapsed:>8.2f} s | {count / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--studies", type=int, default=20000)
+    parser.add_argument("--one-by-one", type=int, default=2000, help="Études du mode étude par étude")
+    parser.add_argument("--api-studies", type=int, default=5000, help="Études servies par le serveur local")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latence (s) du serveur local")
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    rnd = random.Random(3)
+    studies = [generate_full_study(i, rnd) for i in range(args.studies)]
+    workers = os.cpu_count()
+    print(f"{args.studies} études, {workers} CPU")
+    print(f"{'mode':<38} | {'études':>7} | {'durée':>10} | {'études/s':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        dumps = os.path.join(tmp, "dumps")
+        os.makedirs(dumps)
+        write_pages(dumps, studies)
+
+        measure("fichiers : étude par étude", tmp, lambda s: one_by_one(dumps, s, args.one_by_one))
+        measure("fichiers : séquentiel par pages", tmp, lambda s: sequential_pages(dumps, s))
+        measure("fichiers : pipeline sans pool", tmp, lambda s: ingest(
+            DirectorySource(dumps), parse_workers=0, db_session=s, progress_every=60).stages["write"].count)
+        measure(f"fichiers : pipeline, pool de {workers}", tmp, lambda s: ingest(
+            DirectorySource(dumps), parse_workers=workers, db_session=s, progress_every=60).stages["write"].count)
+
+        # Le serveur local filtre toutes ses études à chaque requête : base plus petite pour le mode API
+        server, base_url = start_stub_server(studies[:args.api_studies], latency=args.latency)
+        client = ClinicalTrialsClient(base_url=base_url, max_workers=args.fetch_workers, rate_limit=0, retries=0)
+        try:
+            measure(f"API {args.latency * 1000:.0f} ms : pages une à une", tmp,
+                    lambda s: sequential_api(client, s, 100))
+            measure(f"API {args.latency * 1000:.0f} ms : pipeline, {args.fetch_workers} fetch", tmp, lambda s: ingest(
+                ExprSource(client, "", 100), fetch_workers=args.fetch_workers, parse_workers=workers,
+                db_session=s, progress_every=60).stages["write"].count)
+        finally:
+            client.close()
+            server.shutdown()
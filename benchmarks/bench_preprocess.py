@@ -0,0 +1,65 @@
+# benchmarks/bench_preprocess.py
+"""
+Prétraitement de pages StudyFields jusqu'aux lignes du bulk loader :
+boucle dictionnaire par dictionnaire (process_inventory + _trial_columns)
+vs traitement par lots pandas (inventory_frame + trial_rows).
+Débit (lignes/s) et pic mémoire (tracemalloc), par pages de 1000
+enregistrements (maximum de l'API) puis en un seul lot.
+Usage : python -m benchmarks.bench_preprocess --records 100000 --page-size 1000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from services.ctgov_stub import study_fields
+from services.database import _trial_columns
+from services.preprocessor import Preprocessor, INVENTORY_FIELDS
+from benchmarks.synthetic import generate_full_study
+
+
+def study_field_records(count, seed=0):
+    """Réponses StudyFields synthétiques (champs de l'inventaire, valeurs en listes)."""
+    rnd = random.Random(seed)
+    return [{f: fields.get(f, []) for f in INVENTORY_FIELDS}
+            for fields in (study_fields(generate_full_study(i, rnd)) for i in range(count))]
+
+
+def per_dict(page):
+    return [{"nct_id": t["NCTId"], **_trial_columns(t)} for t in Preprocessor.process_inventory(page)]
+
+
+def columnar(page):
+    return Preprocessor.trial_rows(Preprocessor.inventory_frame(page))
+
+
+def run(process, records, page_size):
+    rows = 0
+    for offset in range(0, len(records), page_size):
+        rows += len(process(records[offset:offset + page_size]))
+    return rows
+
+
+def measure(process, records, page_size):
+    """Débit mesuré sans tracemalloc (qui ralentit les allocations), pic mémoire dans un second passage."""
+    started = time.perf_counter()
+    rows = run(process, records, page_size)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    run(process, records, page_size)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows / elapsed, peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, nargs="+", default=[1000, 100000])
+    args = parser.parse_args()
+
+    records = study_field_records(args.records)
+    print(f"{'page':>8} | {'boucle (lignes/s)':>18} | {'pic (Mo)':>8} | {'pandas (lignes/s)':>18} | {'pic (Mo)':>8}")
+    for page_size in args.page_size:
+        old = measure(per_dict, records, page_size)
+        new = measure(columnar, records, page_size)
+        print(f"{page_size:>8} | {old[0]:>18.0f} | {old[1]:>8.1f} | {new[0]:>18.0f} | {new[1]:>8.1f}")
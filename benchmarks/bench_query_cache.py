@@ -0,0 +1,114 @@
+# benchmarks/bench_query_cache.py
+"""
+Cache des résultats d'inventaire / recherche (services/query_cache.py) :
+quelques centaines de combinaisons de filtres rejouées en boucle, cache
+désactivé puis activé, en process via le client de test Flask. Vérifie que
+les réponses sont identiques, compte les requêtes SQL d'un accès en cache,
+puis qu'une écriture d'essais invalide bien les résultats concernés.
+Usage : python -m benchmarks.bench_query_cache --trials 100000 --combos 300 --requests 3000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def combinations(count, rnd):
+    from benchmarks.synthetic import CONDITIONS, COUNTRIES, STATUSES
+    paths = set()
+    while len(paths) < count:
+        kind = rnd.random()
+        if kind < 0.5:
+            paths.add(f"/api/inventory?condition={rnd.choice(CONDITIONS)}&country={rnd.choice(COUNTRIES)}"
+                      f"&status={rnd.choice(STATUSES)}&limit={rnd.choice([20, 50])}")
+        elif kind < 0.7:
+            paths.add(f"/api/inventory?country={rnd.choice(COUNTRIES)}&limit=50")
+        elif kind < 0.9:
+            paths.add(f"/api/search?condition={rnd.choice(CONDITIONS)}&limit={rnd.choice([20, 50])}")
+        else:
+            paths.add(f"/api/search?mode=fulltext&q={rnd.choice(CONDITIONS)}&limit=20")
+    return sorted(paths)
+
+
+def play(client, paths):
+    timings = {"inventory": [], "search": []}
+    bodies = {}
+    for path in paths:
+        started = time.perf_counter()
+        bodies[path] = client.get(path).get_data()
+        timings["inventory" if "inventory" in path else "search"].append((time.perf_counter() - started) * 1000)
+    return timings, bodies
+
+
+def quantiles(samples):
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.95)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=100000)
+    parser.add_argument("--combos", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant :
+        # on se place dans le répertoire de la base synthétique avant tout import
+        os.chdir(tmp)
+        from benchmarks.synthetic import build_database
+        build_database("sqlite:///clinical_trials.db", args.trials).dispose()
+        import app as api
+        application = api.create_app()
+        from sqlalchemy import event
+        from services.database import bulk_upsert_trial_rows, engine
+        from models import ClinicalTrial
+
+        rnd = random.Random(0)
+        combos = combinations(args.combos, rnd)
+        paths = [rnd.choice(combos) for _ in range(args.requests)]
+        client = application.test_client()
+        cache = application.extensions["query_cache"]
+
+        application.extensions["query_cache"] = None
+        play(client, combos)
+        off, off_bodies = play(client, paths)
+        application.extensions["query_cache"] = cache
+        play(client, combos)  # remplissage du cache
+        on, on_bodies = play(client, paths)
+
+        print(f"{args.trials} essais, {len(combos)} combinaisons, {args.requests} requêtes")
+        print(f"{'route':<10} | {'sans p50':>9} | {'sans p95':>9} | {'avec p50':>9} | {'avec p95':>9} (ms)")
+        for route in ("inventory", "search"):
+            (a50, a95), (b50, b95) = quantiles(off[route]), quantiles(on[route])
+            print(f"{route:<10} | {a50:>9.2f} | {a95:>9.2f} | {b50:>9.2f} | {b95:>9.2f}")
+        mismatches = sum(off_bodies[p] != on_bodies[p] for p in off_bodies)
+        print(f"réponses différentes : {mismatches}/{len(off_bodies)}")
+
+        statements = []
+        listener = lambda conn, cursor, statement, *rest: statements.append(statement.split()[0])
+        event.listen(engine, "before_cursor_execute", listener)
+        client.get(combos[0])
+        event.remove(engine, "before_cursor_execute", listener)
+        print(f"requêtes SQL d'un accès en cache : {len(statements)} ({', '.join(statements)})")
+
+        # Écriture : le premier essai prend la condition d'une combinaison en cache, qui doit le voir apparaître
+        target = next(p for p in combos if p.startswith("/api/search?condition="))
+        condition = target.split("condition=")[1].split("&")[0]
+        trial = api.session.query(ClinicalTrial).filter_by(nct_id="NCT00000000").one()
+        row = {c: getattr(trial, c) for c in ("nct_id", "title", "interventions", "status", "start_date",
+                                              "completion_date", "locations")}
+        api.session.remove()
+        bulk_upsert_trial_rows([{**row, "conditions": [condition]}])
+        cached = client.get(target).get_data()
+        application.extensions["query_cache"] = None
+        fresh = client.get(target).get_data()
+        print(f"après écriture : réponse en cache identique à la requête directe : {'oui' if cached == fresh else 'non'}"
+              f", essai modifié présent : {'oui' if b'NCT00000000' in cached else 'non'}")
+        application.extensions["query_cache"] = cache
+        with application.app_context():
+            print(f"statistiques : {cache.stats(api.session)}")
+        api.session.remove()
+        os.chdir("/")
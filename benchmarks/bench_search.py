@@ -0,0 +1,59 @@
+# benchmarks/bench_search.py
+"""
+Latence p50/p99 de /api/search?mode=fulltext (FTS5 + BM25) comparée à un
+balayage LIKE sur le titre et les conditions.
+Usage : python -m benchmarks.bench_search --sizes 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import or_, cast, String
+from sqlalchemy.orm import sessionmaker
+from models import ClinicalTrial
+from services.search import search_trials
+from benchmarks.synthetic import build_database, CONDITIONS
+from benchmarks.bench_lookup import percentiles
+
+
+def like_scan(session, terms, limit):
+    query = session.query(ClinicalTrial)
+    for word in terms.split():
+        pattern = f"%{word}%"
+        query = query.filter(or_(ClinicalTrial.title.ilike(pattern),
+                                 cast(ClinicalTrial.conditions, String).ilike(pattern)))
+    return query.limit(limit).all()
+
+
+def run(session, search, cases, limit):
+    timings = []
+    for terms in cases:
+        started = time.perf_counter()
+        search(session, terms, limit)
+        timings.append((time.perf_counter() - started) * 1000)
+        session.expunge_all()
+    return percentiles(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    # Termes fréquents (conditions) et termes rares (numéro d'étude dans le titre)
+    cases = [rnd.choice(CONDITIONS).lower() for _ in range(args.queries)]
+    cases += [f"study {rnd.randrange(min(args.sizes))}" for _ in range(args.queries // 4)]
+    print(f"{'essais':>10} | {'LIKE p50/p99 (ms)':>20} | {'FTS5 p50/p99 (ms)':>20}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = build_database(f"sqlite:///{os.path.join(tmp, 'bench.db')}", size)
+            session = sessionmaker(bind=engine)()
+            old = run(session, like_scan, cases, args.limit)
+            new = run(session, lambda s, t, l: search_trials(s, t, limit=l), cases, args.limit)
+            session.close()
+            engine.dispose()
+        print(f"{size:>10} | {old[0]:>9.2f} / {old[1]:>8.2f} | {new[0]:>9.2f} / {new[1]:>8.2f}")
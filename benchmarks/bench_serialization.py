@@ -0,0 +1,111 @@
+# benchmarks/bench_serialization.py
+"""
+Sérialisation des réponses, endpoint par endpoint : jsonify avec l'encodeur
+standard vs FastJSONProvider (orjson), en process via le client de test
+Flask, cache de réponses désactivé. Vérifie que les deux encodeurs rendent
+exactement les mêmes octets (réponses de l'API et cas limites : non ASCII,
+flottants en notation exponentielle), puis compare pour l'inventaire les
+entités ORM aux projections colonne par colonne.
+Usage : python -m benchmarks.bench_serialization --trials 20000 --requests 300
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from flask.json.provider import DefaultJSONProvider
+
+EDGE_CASES = [
+    {"Title": "Étude de phase II — 😀", "Control": "\x7f\x00\n", "Zip": "N/A"},
+    {"Latitude": 1e-05, "Longitude": -2.5e-07, "Big": 1e16, "Huge": 1.2345678901234568e+17},
+    {"Nested": [{"b": 1, "a": [0.1, -0.0, 1.0, 48.436630907180756]}], "None": None, "Bool": True},
+    {"Int": 2 ** 70, "Date": __import__("datetime").date(2020, 1, 2)},
+]
+
+
+def endpoint_paths(trials, count, rnd):
+    from benchmarks.synthetic import nct_id, CONDITIONS, COUNTRIES
+    ids = lambda: nct_id(rnd.randrange(trials))
+    return {
+        "/api/inventory limit=50": [f"/api/inventory?condition={rnd.choice(CONDITIONS)}&limit=50" for _ in range(count)],
+        "/api/inventory limit=1000": [f"/api/inventory?country={rnd.choice(COUNTRIES)}&limit=1000"
+                                      for _ in range(count // 10)],
+        "/api/trial/<id>?include=…": [f"/api/trial/{ids()}?include=arms,locations,sponsors" for _ in range(count)],
+        "/api/search limit=50": [f"/api/search?condition={rnd.choice(CONDITIONS)}&limit=50" for _ in range(count)],
+        "/api/trial/<id>/arms": [f"/api/trial/{ids()}/arms" for _ in range(count)],
+        "/api/trial/<id>/locations": [f"/api/trial/{ids()}/locations" for _ in range(count)],
+        "/api/trial/<id>/sponsors": [f"/api/trial/{ids()}/sponsors" for _ in range(count)],
+    }
+
+
+def play(client, paths):
+    timings, bodies = [], []
+    for path in paths:
+        started = time.perf_counter()
+        bodies.append(client.get(path).get_data())
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings), bodies
+
+
+def inventory_projection(session, ClinicalTrial, TRIAL_COLUMNS, trial_to_dict, filter_trials, rnd, rounds=20):
+    """Inventaire de 1000 lignes : entités ORM vs Row des colonnes de la réponse (ms, médiane)."""
+    from benchmarks.synthetic import COUNTRIES
+    timings = {"entités": [], "colonnes": []}
+    identical = True
+    for _ in range(rounds):
+        country = rnd.choice(COUNTRIES)
+        results = {}
+        for label, query in (("entités", session.query(ClinicalTrial)), ("colonnes", session.query(*TRIAL_COLUMNS))):
+            started = time.perf_counter()
+            rows = filter_trials(query, country=country).order_by(ClinicalTrial.nct_id).limit(1000).all()
+            results[label] = [trial_to_dict(t) for t in rows]
+            timings[label].append((time.perf_counter() - started) * 1000)
+            session.expunge_all()
+        identical &= results["entités"] == results["colonnes"]
+    return {label: statistics.median(t) for label, t in timings.items()}, identical
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant :
+        # on se place dans le répertoire de la base synthétique avant tout import
+        os.chdir(tmp)
+        from benchmarks.synthetic import build_database
+        build_database("sqlite:///clinical_trials.db", args.trials).dispose()
+        import app as api
+        application = api.create_app()
+        from models import ClinicalTrial
+        from services.queries import TRIAL_COLUMNS, filter_trials
+        from services.serialization import FastJSONProvider, orjson
+        print(f"orjson : {'oui' if orjson else 'non (encodeur standard)'}")
+        application.extensions["response_cache"].local.max_bytes = 0  # chaque requête construit et sérialise sa réponse
+        client = application.test_client()
+        standard, fast = DefaultJSONProvider(application), FastJSONProvider(application)
+
+        with application.app_context():
+            edge_diff = sum(standard.response(case).get_data() != fast.response(case).get_data() for case in EDGE_CASES)
+        print(f"cas limites différents : {edge_diff}/{len(EDGE_CASES)}")
+
+        rnd = random.Random(0)
+        print(f"{'endpoint':<28} | {'json (µs p50)':>13} | {'orjson (µs p50)':>15} | {'gain':>6} | écarts")
+        for label, paths in endpoint_paths(args.trials, args.requests, rnd).items():
+            application.json = standard
+            play(client, paths[:20])
+            old, old_bodies = play(client, paths)
+            application.json = fast
+            new, new_bodies = play(client, paths)
+            mismatches = sum(a != b for a, b in zip(old_bodies, new_bodies))
+            print(f"{label:<28} | {old:>13.0f} | {new:>15.0f} | {(old - new) / old * 100:>5.1f}% | {mismatches}")
+
+        medians, identical = inventory_projection(api.session, ClinicalTrial, TRIAL_COLUMNS, api.trial_to_dict,
+                                                  filter_trials, rnd)
+        print(f"inventaire 1000 lignes : entités {medians['entités']:.1f} ms, colonnes {medians['colonnes']:.1f} ms,"
+              f" données identiques : {'oui' if identical else 'non'}")
+        api.session.remove()
+        os.chdir("/")
@@ -0,0 +1,133 @@
+# benchmarks/bench_startup.py
+"""
+Démarrage de l'application, chaque mesure dans un process Python neuf :
+  - en process : import des bibliothèques (flask, sqlalchemy...), `import wsgi`
+    (dont create_app et init_db) et première réponse du client de test, sur
+    une base existante puis sur un répertoire vide (schéma créé) ;
+  - gunicorn : du lancement à la première réponse 200, avec et sans --preload.
+Signale aussi les modules lourds (pandas, numpy, pyarrow, requests, geopy) chargés par `import wsgi`.
+--source mesure un autre arbre (ex: `git worktree add /tmp/avant <commit>`),
+pour comparer avant / après ; --path doit alors exister dans les deux.
+Usage : python -m benchmarks.bench_startup --trials 100000 --runs 7 --path /api/trial/NCT00000001/arms
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+from benchmarks.synthetic import build_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "requests", "geopy")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import flask, flask_cors, sqlalchemy, pydantic_settings
+libraries = time.perf_counter()
+try:
+    from wsgi import app
+except ImportError:  # arbre antérieur à wsgi.py : application créée à l'import de app.py
+    from app import app
+imported = time.perf_counter()
+status = app.test_client().get({path!r}).status_code
+answered = time.perf_counter()
+print(json.dumps({{
+    "libraries": (libraries - started) * 1000, "import": (imported - started) * 1000,
+    "first_response": (answered - started) * 1000, "status": status,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def environment(source):
+    return dict(os.environ, PYTHONPATH=source, FLASK_DEBUG="false")
+
+def probe(source, workdir, path):
+    """Une mesure en process ; `total` inclut le démarrage de l'interpréteur."""
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(path=path, heavy=HEAVY_MODULES)],
+        cwd=workdir, env=environment(source), capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["total"] = (time.perf_counter() - started) * 1000
+    return result
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def gunicorn_start(source, workdir, path, workers, preload):
+    """Millisecondes entre le lancement de gunicorn et la première réponse 200 sur `path`."""
+    port = free_port()
+    target = "wsgi:app" if os.path.exists(os.path.join(source, "wsgi.py")) else "app:app"
+    command = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+               "--log-level", "warning", target]
+    if preload:
+        command.insert(-1, "--preload")
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, env=environment(source),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 30:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}{path}", timeout=1).status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("Le serveur gunicorn n'a pas démarré")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def report(label, results):
+    line = f"{label:<30}"
+    for name in ("libraries", "import", "first_response", "total"):
+        line += f" | {statistics.median(r[name] for r in results):>9.0f}"
+    # Part de l'application seule : import de app et première réponse, hors bibliothèques
+    line += f" | {statistics.median(r['first_response'] - r['libraries'] for r in results):>9.0f}"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--path", default="/readyz", help="Route de la première réponse")
+    parser.add_argument("--source", default=ROOT, help="Arbre du dépôt à mesurer")
+    parser.add_argument("--workers", type=int, default=2, help="Workers gunicorn")
+    args = parser.parse_args()
+    source = os.path.abspath(args.source)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        existing = os.path.join(tmp, "existing")
+        os.makedirs(existing)
+        build_database(f"sqlite:///{os.path.join(existing, 'clinical_trials.db')}", args.trials).dispose()
+        probe(source, existing, args.path)  # premier démarrage : mise à niveau du schéma
+
+        print(f"{source}, {args.trials} essais, médiane de {args.runs} démarrages (ms)")
+        print(f"{'scénario':<30} | {'biblioth.':>9} | {'import':>9} | {'1re rép.':>9} | {'total':>9} | {'app':>9}")
+        warm = [probe(source, existing, args.path) for _ in range(args.runs)]
+        report("base existante", warm)
+        fresh = []
+        for i in range(args.runs):
+            empty = os.path.join(tmp, f"empty{i}")
+            os.makedirs(empty)
+            fresh.append(probe(source, empty, args.path))
+        report("répertoire vide (création)", fresh)
+        print(f"statuts : {sorted({r['status'] for r in warm + fresh})}, "
+              f"modules lourds importés : {warm[0]['heavy'] or 'aucun'}")
+
+        for preload in (False, True):
+            timings = [gunicorn_start(source, existing, args.path, args.workers, preload) for _ in range(args.runs)]
+            label = f"gunicorn -w {args.workers}" + (" --preload" if preload else "")
+            print(f"{label:<30} | première réponse 200 : {statistics.median(timings):.0f} ms")
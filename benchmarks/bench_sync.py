@@ -0,0 +1,98 @@
+# benchmarks/bench_sync.py
+"""
+Synchronisation incrémentale contre le serveur local services/ctgov_stub.py :
+chargement initial, run delta après modification de quelques études, run
+sans changement, puis panne en cours de run et reprise. Le chargement initial
+sert de référence (c'est le coût d'un rechargement complet) ; l'état final
+de la base est vérifié contre les fixtures du serveur.
+Usage : python -m benchmarks.bench_sync --studies 5000 --modified 100
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from sqlalchemy.orm import sessionmaker
+from models import Base, ClinicalTrial, TrialSync
+from services.clinical_trials import ClinicalTrialsClient
+from services.ctgov_stub import start_stub_server
+from services.database import make_engine
+from services.sync import sync_query, content_hash
+from benchmarks.synthetic import generate_full_study, STATUSES
+
+
+def fixtures(count, seed=0):
+    """Études dont la dernière mise à jour s'étale sur les trois dernières années."""
+    rnd = random.Random(seed)
+    today = date.today()
+    return [generate_full_study(i, rnd, last_update=today - timedelta(days=rnd.randrange(30, 1100)))
+            for i in range(count)]
+
+
+def modify(studies, count, rnd, today):
+    """Change le statut de `count` études et avance leur date de mise à jour."""
+    changed = []
+    for study in rnd.sample(studies, count):
+        module = study["Study"]["ProtocolSection"]["StatusModule"]
+        module["OverallStatus"] = rnd.choice([s for s in STATUSES if s != module["OverallStatus"]])
+        module["LastUpdatePostDateStruct"]["LastUpdatePostDate"] = today.strftime("%B %d, %Y")
+        changed.append(study)
+    return changed
+
+
+def step(label, run):
+    started = time.perf_counter()
+    report = run()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} | {report.fetched:>7} | {report.changed:>7} | {report.unchanged:>8} | {elapsed:>7.2f} s"
+          f" | {'oui' if report.resumed else 'non'}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--studies", type=int, default=5000)
+    parser.add_argument("--modified", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    studies = fixtures(args.studies)
+    server, base_url = start_stub_server(studies)
+    state = server.RequestHandlerClass.state
+    client = ClinicalTrialsClient(base_url=base_url, rate_limit=0, retries=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'sync.db')}")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        sync = lambda: sync_query("", client=client, db_session=session, page_size=args.page_size)
+
+        print(f"{'étape':<34} | {'lues':>7} | {'écrites':>7} | {'inchangées':>8} | {'durée':>9} | reprise")
+        step("chargement initial", sync)
+        today = date.today()
+        state.upsert(modify(studies, args.modified, rnd, today))
+        step(f"delta ({args.modified} études modifiées)", sync)
+        step("delta sans changement", sync)
+
+        # Panne : le serveur échoue après quelques pages, puis le run reprend
+        state.upsert(modify(studies, args.modified * 5, rnd, today))
+        state.fail_after = state.requests + 2
+        try:
+            sync()
+        except Exception as e:
+            print(f"{'run interrompu':<34} | {type(e).__name__}")
+        state.fail_after = None
+        step("reprise après panne", sync)
+
+        # La base doit refléter exactement les fixtures du serveur
+        hashes = dict(session.query(TrialSync.nct_id, TrialSync.content_hash))
+        stale = [nct for nct, study in state.studies.items() if hashes.get(nct) != content_hash(study)]
+        statuses = dict(session.query(ClinicalTrial.nct_id, ClinicalTrial.status))
+        wrong = [nct for nct, study in state.studies.items()
+                 if statuses.get(nct) != study["Study"]["ProtocolSection"]["StatusModule"]["OverallStatus"]]
+        print(f"empreintes divergentes : {len(stale)}, statuts divergents : {len(wrong)}")
+        session.close()
+        engine.dispose()
+    server.shutdown()
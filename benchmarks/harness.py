@@ -0,0 +1,313 @@
+# benchmarks/harness.py
+"""
+Banc de charge reproductible de l'API (remplace test.py).
+
+Génère une base synthétique (essais, localisations, bras, sponsors) de la
+taille demandée, sert l'application en process (client de test Flask, sans
+réseau) ou sous gunicorn (HTTP), puis joue pour chaque scénario un mélange
+pondéré d'endpoints avec N clients concurrents pendant une durée fixe.
+Les URLs sont tirées d'un générateur à graine : deux runs jouent la même
+suite de requêtes.
+
+Résultats (débit, latences p50/p95/p99 par scénario et par endpoint) écrits
+en JSON ; avec --baseline, comparaison à un run de référence et code de
+sortie 1 si un scénario régresse au-delà de --tolerance.
+
+Usage :
+  python -m benchmarks.harness --trials 100000 --workdir /tmp/bench100k --out results.json
+  python -m benchmarks.harness --mode gunicorn --workers 2 --threads 4 --baseline baseline.json
+  python -m benchmarks.harness --scenarios trial inventory --clients 16 --duration 30
+  python -m benchmarks.harness --database-url postgresql+psycopg2://postgres@127.0.0.1:5432/bench
+La base de --workdir (ou de --database-url) est réutilisée d'un run à
+l'autre (la construire à 1M d'essais prend plusieurs minutes).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_FILE = "clinical_trials.db"
+
+
+# ------------------- Endpoints et scénarios -------------------
+def endpoint_paths(trials, rnd):
+    """Générateurs d'URL par endpoint (NCT IDs et filtres tirés de la base synthétique)."""
+    from benchmarks.synthetic import nct_id, CONDITIONS, COUNTRIES, STATUSES, CITY_COORDS
+    nct = lambda: nct_id(rnd.randrange(trials))
+    cities = list(CITY_COORDS.values())
+    return {
+        "inventory": lambda: f"/api/inventory?condition={rnd.choice(CONDITIONS)}&limit=50",
+        "inventory_country": lambda: (f"/api/inventory?country={rnd.choice(COUNTRIES)}"
+                                      f"&status={rnd.choice(STATUSES)}&limit=50"),
+        "trial": lambda: f"/api/trial/{nct()}",
+        "trial_include": lambda: f"/api/trial/{nct()}?include=arms,locations,sponsors",
+        "trials_batch": lambda: f"/api/trials?ids={','.join(nct() for _ in range(20))}",
+        "search": lambda: f"/api/search?condition={rnd.choice(CONDITIONS)}&limit=20",
+        "search_fulltext": lambda: f"/api/search?mode=fulltext&q={rnd.choice(CONDITIONS)}&limit=20",
+        "arms": lambda: f"/api/trial/{nct()}/arms",
+        "locations": lambda: f"/api/trial/{nct()}/locations",
+        "sponsors": lambda: f"/api/trial/{nct()}/sponsors",
+        "near": lambda: "/api/locations/near?lat={:.4f}&lon={:.4f}&radius_km=50&limit=50".format(*rnd.choice(cities)),
+        "facets": lambda: f"/api/facets?condition={rnd.choice(CONDITIONS)}&country={rnd.choice(COUNTRIES)}",
+    }
+
+
+# Un scénario par endpoint, plus un trafic mixte proche de celui du front (pondérations)
+MIXED = {
+    "inventory": 25, "inventory_country": 10, "trial": 20, "trial_include": 5, "search": 10,
+    "search_fulltext": 5, "arms": 5, "locations": 5, "sponsors": 5, "near": 5, "facets": 5,
+}
+SCENARIOS = {name: {name: 1} for name in MIXED} | {"trials_batch": {"trials_batch": 1}, "mixed": MIXED}
+
+
+# ------------------- Base synthétique -------------------
+def trial_count(url):
+    """Nombre d'essais de la base `url` ; None si elle n'a pas encore de schéma."""
+    from sqlalchemy import create_engine, inspect, text
+    engine = create_engine(url)
+    try:
+        if not inspect(engine).has_table("clinical_trials"):
+            return None
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM clinical_trials")).scalar()
+    finally:
+        engine.dispose()
+
+def prepare_database(workdir, trials, seed, url=None):
+    """
+    Construit la base synthétique si elle est vide : workdir/clinical_trials.db,
+    ou la base `url` (serveur PostgreSQL...), qui devient alors le
+    DATABASE_URL de l'application. Renvoie le nombre d'essais de la base.
+    """
+    if url:
+        os.environ["DATABASE_URL"] = url
+    url = url or f"sqlite:///{os.path.join(workdir, DB_FILE)}"
+    from sqlalchemy.engine import make_url
+    label = make_url(url).render_as_string(hide_password=True)
+    count = trial_count(url)
+    if not count:
+        from benchmarks.synthetic import build_database
+        print(f"Génération de {trials} essais dans {label}...")
+        started = time.perf_counter()
+        build_database(url, trials, seed=seed).dispose()
+        print(f"  base prête en {time.perf_counter() - started:.1f}s")
+        count = trial_count(url)
+    if count != trials:
+        print(f"Attention : {label} contient {count} essais (--trials {trials}), base réutilisée telle quelle")
+    return count
+
+
+# ------------------- Cibles : en process ou gunicorn -------------------
+class InProcessTarget:
+    """Application importée dans ce process ; chaque client a son client de test Flask."""
+
+    def __init__(self):
+        # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant (déjà workdir)
+        import app as api
+        self.app = api.create_app()
+
+    def client(self):
+        client = self.app.test_client()
+        return lambda path: client.get(path).status_code
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    """Serveur gunicorn (workers gthread) lancé dans workdir ; clients HTTP keep-alive."""
+
+    def __init__(self, workdir, port, workers, threads):
+        from benchmarks.load_test import start_server
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.process = start_server(workdir, port, threads, workers)
+
+    def client(self):
+        import requests
+        http = requests.Session()
+
+        def get(path):
+            try:
+                return http.get(self.base_url + path, timeout=30).status_code
+            except requests.RequestException:
+                return 599
+        return get
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+# ------------------- Charge -------------------
+def percentile(ordered, q):
+    """Percentile par rang le plus proche d'une liste triée."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def summarize(samples, duration):
+    """Débit et latences (ms) d'une liste de (endpoint, ms, statut)."""
+    ordered = sorted(ms for _, ms, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(status >= 500 for _, _, status in samples),
+        "rps": round(len(samples) / duration, 1),
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else None,
+        **{f"p{q}_ms": round(percentile(ordered, q), 3) if ordered else None for q in (50, 95, 99)},
+    }
+
+
+def run_scenario(target, mix, trials, clients, duration, warmup, seed):
+    """Joue `mix` avec `clients` threads : préchauffage, puis `duration` secondes mesurées."""
+    samples, lock = [], threading.Lock()
+    start = threading.Barrier(clients + 1)
+    window = {}
+
+    def worker(index):
+        rnd = random.Random(seed * 1000 + index)
+        paths = endpoint_paths(trials, rnd)
+        names, weights = list(mix), list(mix.values())
+        get = target.client()
+        local = []
+        start.wait()
+        while True:
+            now = time.perf_counter()
+            if now >= window["end"]:
+                break
+            name = rnd.choices(names, weights)[0]
+            status = get(paths[name]())
+            elapsed = time.perf_counter()
+            if elapsed >= window["begin"]:
+                local.append((name, (elapsed - now) * 1000, status))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    window["begin"] = time.perf_counter() + warmup
+    window["end"] = window["begin"] + duration
+    start.wait()
+    for t in threads:
+        t.join()
+
+    result = summarize(samples, duration)
+    if len(mix) > 1:
+        result["endpoints"] = {
+            name: summarize([s for s in samples if s[0] == name], duration) for name in mix
+        }
+    return result
+
+
+# ------------------- Comparaison -------------------
+def compare(results, baseline, tolerance):
+    """Régressions par scénario commun : p95 au-dessus ou débit en dessous de la référence."""
+    regressions = []
+    print(f"\n{'scénario':<18} | {'p95 réf (ms)':>12} | {'p95 (ms)':>9} | {'écart':>7} | "
+          f"{'req/s réf':>9} | {'req/s':>8} | {'écart':>7}")
+    for name, current in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if not reference or not reference.get("p95_ms") or not current.get("p95_ms"):
+            continue
+        latency = current["p95_ms"] / reference["p95_ms"] - 1
+        throughput = current["rps"] / reference["rps"] - 1 if reference["rps"] else 0.0
+        flagged = latency > tolerance or throughput < -tolerance
+        if flagged:
+            regressions.append(name)
+        print(f"{name:<18} | {reference['p95_ms']:>12.2f} | {current['p95_ms']:>9.2f} | {latency * 100:>+6.1f}% | "
+              f"{reference['rps']:>9.1f} | {current['rps']:>8.1f} | {throughput * 100:>+6.1f}%"
+              f"{'  <- régression' if flagged else ''}")
+    mismatched = [k for k in ("trials", "mode", "clients", "workers", "threads")
+                  if baseline.get("meta", {}).get(k) != results["meta"].get(k)]
+    if mismatched:
+        print(f"Attention : paramètres différents de la référence ({', '.join(mismatched)})")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de charge de l'API sur une base synthétique")
+    parser.add_argument("--trials", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default="", help="Répertoire de la base (réutilisée si présente)")
+    parser.add_argument("--database-url", default="",
+                        help="Base à utiliser à la place de workdir/clinical_trials.db (ex: PostgreSQL local)")
+    parser.add_argument("--mode", choices=("inprocess", "gunicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="Workers gunicorn")
+    parser.add_argument("--threads", type=int, default=4, help="Threads par worker gunicorn")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Secondes mesurées par scénario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Secondes de préchauffage par scénario")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", default="", help="Résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Écart toléré (0.10 = 10 %%)")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    temporary = None if args.workdir else tempfile.TemporaryDirectory()
+    workdir = os.path.abspath(args.workdir or temporary.name)
+    os.makedirs(workdir, exist_ok=True)
+    # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant :
+    # on se place dans workdir avant tout import de l'application
+    os.chdir(workdir)
+    os.environ.setdefault("FLASK_DEBUG", "false")
+    trials = prepare_database(workdir, args.trials, args.seed, args.database_url)
+
+    target = (InProcessTarget() if args.mode == "inprocess"
+              else GunicornTarget(workdir, args.port, args.workers, args.threads))
+    results = {
+        "meta": {
+            "trials": trials, "mode": args.mode, "clients": args.clients,
+            "workers": args.workers if args.mode == "gunicorn" else None,
+            "threads": args.threads if args.mode == "gunicorn" else None,
+            "duration": args.duration, "warmup": args.warmup, "seed": args.seed,
+            "revision": git_revision(), "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "database": args.database_url.split(":")[0].split("+")[0] if args.database_url else "sqlite",
+            "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scenarios": {},
+    }
+    print(f"{'scénario':<18} | {'req/s':>8} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'p99 (ms)':>9} | {'erreurs':>7}")
+    try:
+        for name in args.scenarios:
+            result = run_scenario(target, SCENARIOS[name], trials, args.clients, args.duration, args.warmup, args.seed)
+            results["scenarios"][name] = result
+            print(f"{name:<18} | {result['rps']:>8.1f} | {result['p50_ms']:>9.2f} | {result['p95_ms']:>9.2f} | "
+                  f"{result['p99_ms']:>9.2f} | {result['errors']:>7}")
+    finally:
+        target.close()
+        os.chdir(ROOT)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Résultats écrits dans {out}")
+
+    regressions = compare(results, baseline, args.tolerance) if baseline else []
+    if temporary is not None:
+        temporary.cleanup()
+    if regressions:
+        print(f"Régressions (> {args.tolerance:.0%}) : {', '.join(regressions)}")
+        sys.exit(1)
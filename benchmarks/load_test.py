@@ -0,0 +1,105 @@
+# benchmarks/load_test.py
+"""
+Test de charge : N clients concurrents sur les six endpoints de l'API servie
+par gunicorn (worker gthread), pour plusieurs nombres de threads par worker.
+Usage : python -m benchmarks.load_test --trials 20000 --clients 16 --threads 1 2 4 8
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+from benchmarks.synthetic import build_database, nct_id, CONDITIONS, COUNTRIES
+from benchmarks.bench_lookup import percentiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def endpoint_urls(base_url, trials, rnd):
+    """Une URL tirée au hasard pour chacun des six endpoints."""
+    nct = nct_id(rnd.randrange(trials))
+    return [
+        f"{base_url}/api/inventory?condition={rnd.choice(CONDITIONS)}&country={rnd.choice(COUNTRIES)}&limit=20",
+        f"{base_url}/api/trial/{nct}",
+        f"{base_url}/api/search?condition={rnd.choice(CONDITIONS)}&limit=20",
+        f"{base_url}/api/trial/{nct}/arms",
+        f"{base_url}/api/trial/{nct}/locations",
+        f"{base_url}/api/trial/{nct}/sponsors",
+    ]
+
+
+def start_server(workdir, port, threads, workers=1):
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_DEBUG="false")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "gthread", "--threads", str(threads),
+         "-b", f"127.0.0.1:{port}", "--log-level", "warning", "wsgi:app"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/trial/{nct_id(0)}/arms", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Le serveur gunicorn n'a pas démarré")
+
+
+def drive(base_url, trials, clients, duration):
+    """Lance `clients` threads pendant `duration` secondes ; renvoie (req/s, latences ms, erreurs)."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        rnd = random.Random(seed)
+        http = requests.Session()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            url = rnd.choice(endpoint_urls(base_url, trials, rnd))
+            started = time.perf_counter()
+            try:
+                if http.get(url, timeout=30).status_code >= 500:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return len(latencies) / duration, latencies, errors[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DATABASE_URL par défaut (sqlite:///clinical_trials.db) est relatif au répertoire courant
+        build_database(f"sqlite:///{os.path.join(tmp, 'clinical_trials.db')}", args.trials).dispose()
+        print(f"{'threads':>8} | {'req/s':>8} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'erreurs':>7}")
+        for threads in args.threads:
+            server = start_server(tmp, args.port, threads, args.workers)
+            try:
+                rps, latencies, errors = drive(f"http://127.0.0.1:{args.port}", args.trials, args.clients, args.duration)
+            finally:
+                server.terminate()
+                server.wait()
+            p50, p99 = percentiles(latencies)
+            print(f"{threads:>8} | {rps:>8.1f} | {p50:>9.2f} | {p99:>9.2f} | {errors:>7}")
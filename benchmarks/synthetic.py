@@ -0,0 +1,179 @@
+# benchmarks/synthetic.py
+"""
+Génération d'une base SQLite synthétique (essais, localisations, bras, sponsors)
+pour les benchmarks. Usage : python -m benchmarks.synthetic --trials 100000 --out /tmp/bench.db
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from models import Base, ClinicalTrial, TrialDetails, TrialArms, TrialLocation, TrialSponsor
+from services.database import rebuild_trial_lookups
+from services.details import storage_columns
+from services.eligibility import eligibility_columns
+from services.facets import rebuild_facet_counts
+from services.search import init_search_index, optimize_search_index
+from services.geo import init_geo_index
+
+ORGANS = [
+    "Breast", "Lung", "Kidney", "Liver", "Heart", "Skin", "Bone", "Brain", "Colon", "Prostate",
+    "Pancreas", "Thyroid", "Bladder", "Ovarian", "Gastric", "Retinal", "Spinal", "Cervical",
+    "Pulmonary", "Renal"
+]
+DISEASES = [
+    "Cancer", "Failure", "Disease", "Infection", "Fibrosis", "Inflammation", "Neoplasm",
+    "Insufficiency", "Injury", "Syndrome"
+]
+CONDITIONS = [f"{o} {d}" for o in ORGANS for d in DISEASES] + [
+    "Diabetes", "Asthma", "Hypertension", "COVID-19", "Alzheimer"
+]
+COUNTRIES = [
+    "France", "UK", "USA", "Germany", "Japan", "Australia", "Canada", "Italy", "Spain", "Brazil",
+    "China", "India", "Mexico", "Netherlands", "Belgium", "Switzerland", "Sweden", "Norway",
+    "Denmark", "Poland", "Austria", "Ireland", "Portugal", "Greece", "Israel", "Korea",
+    "Argentina", "Chile", "South Africa", "Egypt"
+]
+CITIES = {c: [f"{c} City {i}" for i in range(20)] for c in COUNTRIES}
+# Centre de chaque ville : les sites d'essai se regroupent autour, comme dans les données réelles
+_coords = random.Random(7)
+CITY_COORDS = {city: (_coords.uniform(-45, 65), _coords.uniform(-170, 170))
+               for cities in CITIES.values() for city in cities}
+STATUSES = ["Recruiting", "Active, not recruiting", "Completed", "Terminated", "Active"]
+SPONSORS = ["Health Inc", "BioTech Ltd", "MediLife", "PharmaCorp", "Inserm", "NIH"]
+
+
+def nct_id(i):
+    return f"NCT{i:08d}"
+
+
+def generate_trial(i, rnd):
+    start = date(2000, 1, 1) + timedelta(days=rnd.randrange(9000))
+    locations = []
+    for _ in range(rnd.randint(1, 4)):
+        country = rnd.choice(COUNTRIES)
+        city = rnd.choice(CITIES[country])
+        lat, lon = CITY_COORDS[city]
+        locations.append({
+            "city": city,
+            "country": country,
+            "facility": f"{country} Medical Center {rnd.randrange(50)}",
+            "zip": f"{rnd.randrange(100000):05d}",
+            "lat": lat + rnd.gauss(0, 0.3),
+            "lon": lon + rnd.gauss(0, 0.3),
+        })
+    return {
+        "nct_id": nct_id(i),
+        "title": f"Study {i} of {rnd.choice(CONDITIONS)}",
+        "conditions": rnd.sample(CONDITIONS, rnd.randint(1, 3)),
+        "interventions": [f"Drug {rnd.choice('ABCDEFGH')}" for _ in range(rnd.randint(1, 2))],
+        "status": rnd.choice(STATUSES),
+        "start_date": start,
+        "completion_date": start + timedelta(days=rnd.randrange(200, 3000)),
+        "locations": locations,
+    }
+
+
+def generate_full_study(i, rnd, last_update=None):
+    """Étude au format FullStudies de l'API ClinicalTrials.gov (sous-ensemble des modules)."""
+    trial = generate_trial(i, rnd)
+    return {"Study": {"ProtocolSection": {
+        "IdentificationModule": {
+            "NCTId": trial["nct_id"], "BriefTitle": trial["title"], "OfficialTitle": f"Official {trial['title']}"
+        },
+        "StatusModule": {
+            "OverallStatus": trial["status"],
+            "StartDateStruct": {"StartDate": trial["start_date"].strftime("%B %d, %Y")},
+            "CompletionDateStruct": {"CompletionDate": trial["completion_date"].strftime("%B %Y")},
+            "LastUpdatePostDateStruct": {"LastUpdatePostDate": (last_update or trial["start_date"]).strftime("%B %d, %Y")},
+        },
+        "SponsorCollaboratorsModule": {
+            "LeadSponsor": {"LeadSponsorName": rnd.choice(SPONSORS)},
+            "CollaboratorList": {"Collaborator": [{"CollaboratorName": c} for c in rnd.sample(SPONSORS, 2)]},
+            "ResponsibleParty": {"ResponsiblePartyType": "Sponsor"},
+        },
+        "ConditionsModule": {"ConditionList": {"Condition": trial["conditions"]}},
+        "ArmsInterventionsModule": {
+            "ArmGroupList": {"ArmGroup": [
+                {"ArmGroupLabel": f"Arm {a}", "ArmGroupDescription": f"Arm {a} of study {i}"} for a in "AB"
+            ]},
+            "InterventionList": {"Intervention": [{"InterventionName": n} for n in trial["interventions"]]},
+        },
+        "EligibilityModule": {
+            "EligibilityCriteria": f"Inclusion Criteria: adults with {trial['conditions'][0]}. "
+                                   f"Exclusion Criteria: {rnd.choice(CONDITIONS)}, pregnancy.",
+            "HealthyVolunteers": rnd.choice(["Yes", "No"]),
+            "Gender": rnd.choice(["All", "Female", "Male"]),
+            "MinimumAge": f"{rnd.randint(0, 40)} Years",
+            "MaximumAge": f"{rnd.randint(41, 99)} Years",
+        },
+        "ContactsLocationsModule": {"LocationList": {"Location": [{
+            "LocationFacility": loc["facility"], "LocationCity": loc["city"],
+            "LocationCountry": loc["country"], "LocationZip": loc["zip"],
+        } for loc in trial["locations"]]}},
+    }}}
+
+
+def build_database(url, trials, seed=42, chunk_size=5000, details=True):
+    """Crée (ou complète) la base `url` avec `trials` essais synthétiques."""
+    rnd = random.Random(seed)
+    eligibility_rnd = random.Random(seed + 1)
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    init_search_index(engine)
+    init_geo_index(engine)
+    with engine.begin() as conn:
+        for offset in range(0, trials, chunk_size):
+            rows = [generate_trial(i, rnd) for i in range(offset, min(trials, offset + chunk_size))]
+            conn.execute(insert(ClinicalTrial), rows)
+            conn.execute(insert(TrialLocation), [{
+                "nct_id": r["nct_id"], "facility": loc["facility"], "city": loc["city"],
+                "country": loc["country"], "zip_code": loc["zip"],
+                "latitude": loc["lat"], "longitude": loc["lon"],
+            } for r in rows for loc in r["locations"]])
+            conn.execute(insert(TrialArms), [{
+                "nct_id": r["nct_id"],
+                "arms": [{"ArmGroupDescription": f"Arm {a}", "InterventionName": r["interventions"]} for a in "AB"],
+            } for r in rows])
+            conn.execute(insert(TrialSponsor), [{
+                "nct_id": r["nct_id"], "lead_sponsor": rnd.choice(SPONSORS),
+                "collaborators": rnd.sample(SPONSORS, 2),
+                "contacts": [{"name": f"Dr. Smith {r['nct_id']}"}],
+            } for r in rows])
+            if details:
+                detail_rows = []
+                for r in rows:
+                    document = {
+                        "NCTId": r["nct_id"], "Title": r["title"], "Condition": r["conditions"],
+                        "EligibilityCriteria": f"Inclusion Criteria: adults with {r['conditions'][0]}. "
+                                               f"Exclusion Criteria: {rnd.choice(CONDITIONS)}, pregnancy.",
+                    }
+                    criteria = {"min_age": rnd.randint(0, 40), "max_age": rnd.randint(41, 99)}
+                    # Générateur à part : les tirages de `rnd` (et donc les autres tables) ne changent pas
+                    document.update({
+                        "Gender": eligibility_rnd.choice(["All", "All", "Female", "Male"]),
+                        "HealthyVolunteers": eligibility_rnd.choice(["Yes", "No", "No"]),
+                        "MinimumAge": f"{criteria['min_age']} Years",
+                        "MaximumAge": f"{criteria['max_age']} Years" if eligibility_rnd.random() < 0.8 else "N/A",
+                    })
+                    detail_rows.append({"nct_id": r["nct_id"], **storage_columns(document),
+                                        **eligibility_columns(document, criteria), "eligibility_criteria": criteria})
+                conn.execute(insert(TrialDetails), detail_rows)
+    session = sessionmaker(bind=engine)()
+    rebuild_trial_lookups(session)
+    rebuild_facet_counts(session)
+    session.close()
+    optimize_search_index(engine)
+    return engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère une base synthétique d'essais cliniques")
+    parser.add_argument("--trials", type=int, default=10000)
+    parser.add_argument("--out", default="bench_clinical_trials.db")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    build_database(f"sqlite:///{args.out}", args.trials, seed=args.seed)
+    print(f"{args.trials} essais générés dans {args.out} en {time.perf_counter() - started:.1f}s")
@@ -1,21 +1,37 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Date, Float
+from sqlalchemy import Boolean, Column, Integer, String, JSON, DateTime, Date, Float, Index, LargeBinary, Text
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
 
 Base = declarative_base()
 
+class JSONDocument(TypeDecorator):
+    """
+    JSON, stocké en JSONB sous PostgreSQL (opérateur @> et index GIN, cf.
+    services/migrations.py). Le dialecte PostgreSQL n'est importé qu'au
+    premier usage sur ce type de base.
+    """
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import JSONB
+            return dialect.type_descriptor(JSONB(none_as_null=self.impl.none_as_null))
+        return dialect.type_descriptor(self.impl)
+
 # Modèle pour l'inventaire global (Mission A)
 class ClinicalTrial(Base):
     __tablename__ = "clinical_trials"
     id = Column(Integer, primary_key=True, index=True)
     nct_id = Column(String(20), unique=True, index=True)
     title = Column(String(500))
-    conditions = Column(JSON)  # Liste de conditions
-    interventions = Column(JSON)  # Liste d'interventions
+    conditions = Column(JSONDocument)  # Liste de conditions
+    interventions = Column(JSONDocument)  # Liste d'interventions
     status = Column(String(50))
     start_date = Column(Date)
     completion_date = Column(Date)
-    locations = Column(JSON)  # Liste de localisations
+    locations = Column(JSONDocument)  # Liste de localisations
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -24,18 +40,31 @@ class TrialDetails(Base):
     __tablename__ = "trial_details"
     id = Column(Integer, primary_key=True, index=True)
     nct_id = Column(String(20), unique=True, index=True)
-    full_data = Column(JSON)  # Toutes les données détaillées
+    full_data = Column(JSON(none_as_null=True))  # Toutes les données détaillées (lignes non compressées)
+    packed_data = Column(LargeBinary)  # Même document compressé par sections (services/details.py)
+    eligibility_text = Column(Text)  # Texte des critères, indexé en plein texte
     eligibility_criteria = Column(JSON)  # Critères d'éligibilité
     arms = Column(JSON)  # Bras d'essai
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Éligibilité extraite à l'ingestion (services/eligibility.py) pour /api/match
+    min_age_days = Column(Integer)  # None = pas d'âge minimum
+    max_age_days = Column(Integer)  # None = pas d'âge maximum
+    sex = Column(String(10))  # "All", "Female" ou "Male"
+    healthy_volunteers = Column(Boolean)
+    inclusion_keywords = Column(Text)  # Mots des critères d'inclusion : " adults breast cancer "
+    exclusion_keywords = Column(Text)  # Idem pour les critères d'exclusion
 
-# Modèle pour les recherches ciblées (Mission C)
+# Modèle pour les recherches ciblées (Mission C) : cache des résultats de
+# /api/inventory et /api/search (services/query_cache.py)
 class TargetedSearch(Base):
     __tablename__ = "targeted_searches"
     id = Column(Integer, primary_key=True, index=True)
-    query = Column(String(255))  # Mot-clé de recherche (ex: "diabetes")
-    results = Column(JSON)  # Résultats de la recherche
+    query = Column(String(255))  # Clé normalisée des filtres (ex: "search|condition=Diabetes|limit=50")
+    query_key = Column(String(40), unique=True, index=True)  # sha1 de la clé complète
+    results = Column(JSON)  # NCT IDs de la réponse, dans l'ordre
+    generation = Column(Integer)  # Génération des essais au moment du calcul (cf. CacheGeneration)
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_used = Column(DateTime, default=datetime.utcnow, index=True)
 
 # Modèle pour les bras/interventions (Mission D)
 class TrialArms(Base):
@@ -57,6 +86,8 @@ class TrialLocation(Base):
     latitude = Column(Float)
     longitude = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Recherche par rayon hors SQLite (sous SQLite : R*Tree, cf. services/geo.py)
+    __table_args__ = (Index("ix_trial_locations_lat_lon", "latitude", "longitude"),)
 
 # Modèle pour les sponsors (Mission F)
 class TrialSponsor(Base):
@@ -67,3 +98,110 @@ class TrialSponsor(Base):
     collaborators = Column(JSON)  # Liste de collaborateurs
     contacts = Column(JSON)  # Liste de contacts
     created_at = Column(DateTime, default=datetime.utcnow)
+
+# Tables de correspondance dénormalisées : une ligne par (essai, condition) et
+# par (essai, pays), maintenues par services/database.py à l'ingestion.
+# Les index composites permettent à /api/inventory et /api/search de faire
+# des recherches indexées au lieu de parser le JSON de chaque ligne.
+class TrialCondition(Base):
+    __tablename__ = "trial_conditions"
+    id = Column(Integer, primary_key=True, index=True)
+    nct_id = Column(String(20), index=True)
+    condition = Column(String(255))
+    __table_args__ = (Index("ix_trial_conditions_condition_nct_id", "condition", "nct_id"),)
+
+class TrialCountry(Base):
+    __tablename__ = "trial_countries"
+    id = Column(Integer, primary_key=True, index=True)
+    nct_id = Column(String(20), index=True)
+    country = Column(String(100))
+    __table_args__ = (Index("ix_trial_countries_country_nct_id", "country", "nct_id"),)
+
+# Index d'appariement de /api/match : une ligne par (condition, essai) avec
+# l'éligibilité de trial_details et le statut de recrutement, dérivée des
+# autres tables par services/eligibility.py. Sous SQLite, table WITHOUT ROWID :
+# les lignes d'une condition sont contiguës et lues en un seul parcours.
+class TrialEligibility(Base):
+    __tablename__ = "trial_eligibility"
+    condition = Column(String(255), primary_key=True)
+    recruiting = Column(Integer, primary_key=True)  # 1 si l'essai recrute (RECRUITING_STATUSES)
+    nct_id = Column(String(20), primary_key=True, index=True)
+    sex = Column(String(10))
+    min_age_days = Column(Integer)
+    max_age_days = Column(Integer)
+    healthy_volunteers = Column(Boolean)
+    inclusion_keywords = Column(Text)
+    exclusion_keywords = Column(Text)
+    __table_args__ = {"sqlite_with_rowid": False}
+
+# Comptages précalculés pour /api/facets (services/facets.py), tenus à jour à
+# l'ingestion. "*" = toutes les valeurs de la dimension ; pour chaque couple
+# (condition, pays), une ligne par (statut, année de début) et une ligne de
+# total (statut "*", année -1).
+class FacetCount(Base):
+    __tablename__ = "trial_facet_counts"
+    id = Column(Integer, primary_key=True, index=True)
+    condition = Column(String(255), nullable=False)
+    country = Column(String(100), nullable=False)
+    status = Column(String(50), nullable=False)
+    start_year = Column(Integer, nullable=False)  # 0 = date de début inconnue
+    trial_count = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        Index("ux_trial_facet_counts_key", "condition", "country", "status", "start_year", unique=True),
+        Index("ix_trial_facet_counts_country", "country", "status", "condition", "trial_count"),
+    )
+
+# Cache persistant du géocodage : une ligne par adresse normalisée
+# (établissement, ville, code postal, pays), géocodée une seule fois.
+# Coordonnées NULL = adresse introuvable (on ne la redemande pas).
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    address_key = Column(String(40), unique=True, index=True)
+    facility = Column(String(255))
+    city = Column(String(100))
+    zip_code = Column(String(20))
+    country = Column(String(100))
+    latitude = Column(Float)
+    longitude = Column(Float)
+    provider = Column(String(50))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Synchronisation incrémentale (services/sync.py) : empreinte du dernier
+# document reçu pour chaque essai, et point de reprise par requête.
+class TrialSync(Base):
+    __tablename__ = "trial_sync"
+    id = Column(Integer, primary_key=True, index=True)
+    nct_id = Column(String(20), unique=True, index=True)
+    content_hash = Column(String(40))
+    last_update_posted = Column(Date)
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+class SyncCheckpoint(Base):
+    __tablename__ = "sync_checkpoints"
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String(500), unique=True, index=True)
+    high_water = Column(Date)        # LastUpdatePostDate max des runs terminés
+    status = Column(String(20))      # 'running' tant qu'un run n'est pas terminé
+    run_since = Column(Date)         # borne basse du run en cours
+    run_started = Column(Date)       # jour de démarrage du run en cours
+    run_high_water = Column(Date)    # LastUpdatePostDate max vu par le run en cours
+    next_rank = Column(Integer, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Compteurs de génération : chaque écriture d'essais incrémente "trials",
+# ce qui invalide d'un coup les résultats en cache de targeted_searches
+class CacheGeneration(Base):
+    __tablename__ = "cache_generations"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), unique=True, index=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+# État du schéma appliqué par init_db (ex: key="fingerprint") : au démarrage,
+# une seule lecture suffit quand models.py n'a pas changé depuis
+class SchemaState(Base):
+    __tablename__ = "schema_state"
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(50), unique=True, index=True)
+    value = Column(String(255))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,225 @@
+# services/cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Cache de réponses JSON pré-sérialisées pour les endpoints de détail d'un
+# essai. Niveau 1 : LRU en mémoire du process (TTL + plafond en octets).
+# Niveau 2 optionnel : backend partagé entre workers (Redis, ou
+# MemoryCacheBackend en local / pour les tests).
+
+
+class CacheEntry:
+    def __init__(self, body, etag, version, stored_at):
+        self.body = body
+        self.etag = etag
+        self.version = version
+        self.stored_at = stored_at
+        self.checked_at = stored_at
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.etag) + len(self.version)
+
+    def dump(self):
+        header = f"{self.version}\n{self.etag}\n{self.stored_at}\n".encode("utf-8")
+        return header + self.body
+
+    @classmethod
+    def load(cls, raw):
+        version, etag, stored_at, body = raw.split(b"\n", 3)
+        return cls(body, etag.decode("utf-8"), version.decode("utf-8"), float(stored_at))
+
+
+def make_etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+class LRUCache:
+    """LRU thread-safe borné en octets, avec expiration des entrées après `ttl` secondes."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.evictions = self.expirations = 0
+
+    def get(self, key):
+        """Entrée de `key`, ou None si absente ou expirée."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl and time.time() - entry.stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key).size
+
+    def stats(self):
+        with self.lock:
+            return {
+                "evictions": self.evictions, "expirations": self.expirations,
+                "entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes
+            }
+
+
+class MemoryCacheBackend:
+    """Backend partagé de substitution (dict en mémoire) : même interface que RedisCacheBackend."""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires = self.data.get(key, (None, 0))
+            if value is not None and expires and expires < time.time():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.data[key] = (value, time.time() + ttl if ttl else 0)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+class RedisCacheBackend:
+    """Backend partagé Redis (dépendance optionnelle `redis`)."""
+
+    def __init__(self, url, prefix="ctcache:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def make_backend(url):
+    """'' -> pas de backend partagé, 'memory://' -> MemoryCacheBackend, 'redis://...' -> Redis."""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryCacheBackend()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisCacheBackend(url)
+    raise ValueError(f"Backend de cache inconnu : {url}")
+
+
+class ResponseCache:
+    """
+    Réponses indexées par (route, NCT ID). Chaque entrée porte la version de
+    l'essai (clinical_trials.updated_at) : si la version lue en base diffère,
+    l'entrée est invalidée, y compris quand l'ingestion tourne dans un autre
+    process. La version n'est relue qu'après `revalidate_after` secondes, ce
+    qui évite une requête SQL par hit sur les essais les plus demandés.
+    """
+
+    def __init__(self, local, shared=None, revalidate_after=2.0):
+        self.local = local
+        self.shared = shared
+        self.revalidate_after = revalidate_after
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = self.shared_hits = self.shared_errors = 0
+
+    @staticmethod
+    def key(route, nct_id):
+        return f"{route}:{nct_id}"
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def lookup(self, route, nct_id, load_version):
+        """
+        Renvoie (entrée, version). L'entrée vaut None en cas de miss ; la
+        version (obtenue via load_version()) sert alors à put().
+        """
+        key = self.key(route, nct_id)
+        entry = self.local.get(key)
+        now = time.time()
+        if entry is not None and now - entry.checked_at < self.revalidate_after:
+            self._count("hits")
+            return entry, entry.version
+
+        version = load_version()
+        if entry is not None:
+            if entry.version == version:
+                entry.checked_at = now
+                self._count("hits")
+                return entry, version
+            self.local.delete(key)
+            self._count("invalidations")
+
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(key)
+            except Exception:
+                self._count("shared_errors")
+                raw = None
+            if raw is not None:
+                entry = CacheEntry.load(raw)
+                if entry.version == version:
+                    entry.checked_at = now
+                    self.local.set(key, entry)
+                    self._count("shared_hits")
+                    self._count("hits")
+                    return entry, version
+
+        self._count("misses")
+        return None, version
+
+    def put(self, route, nct_id, version, body):
+        entry = CacheEntry(body, make_etag(body), version, time.time())
+        key = self.key(route, nct_id)
+        self.local.set(key, entry)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, entry.dump(), self.local.ttl)
+            except Exception:
+                self._count("shared_errors")
+        return entry
+
+    def stats(self):
+        stats = self.local.stats()
+        with self.lock:
+            stats.update(hits=self.hits, misses=self.misses, invalidations=self.invalidations,
+                         shared_hits=self.shared_hits, shared_errors=self.shared_errors)
+        stats["shared_backend"] = type(self.shared).__name__ if self.shared else None
+        return stats
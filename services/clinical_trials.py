@@ -1,16 +1,202 @@
-import requests
+import threading
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from config import settings
 
 logger = logging.getLogger(__name__)
 
-BASE_URL_STUDY_FIELDS = "https://clinicaltrials.gov/api/query/study_fields"
-BASE_URL_FULL_STUDY = "https://clinicaltrials.gov/api/query/full_studies"
+STUDY_FIELDS_PATH = "study_fields"
+FULL_STUDIES_PATH = "full_studies"
 
 FIELDS_INVENTORY = [
     "NCTId", "BriefTitle", "Condition", "InterventionName",
     "OverallStatus", "StartDate", "CompletionDate",
     "LocationCountry", "LocationCity", "LocationFacility"
 ]
+FIELDS_ARMS = ["NCTId", "ArmGroupDescription", "InterventionName"]
+FIELDS_LOCATIONS = ["NCTId", "LocationFacility", "LocationCity", "LocationCountry", "LocationZip"]
+FIELDS_SPONSORS = [
+    "NCTId", "LeadSponsorName", "CollaboratorName",
+    "OverallOfficialName", "OverallOfficialRole", "ResponsibleParty"
+]
+
+# Codes HTTP rejoués avec un backoff exponentiel (trop de requêtes / erreurs serveur)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Attente maximale demandée par un en-tête Retry-After
+MAX_RETRY_AFTER = 120.0
+
+
+def retry_after(response):
+    """Secondes demandées par l'en-tête Retry-After (délai ou date HTTP) ; 0 si absent ou illisible."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return 0.0
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return 0.0
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+def _first(value):
+    """Les champs de l'API legacy sont des listes, y compris NCTId."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+class RateLimiter:
+    """Seau à jetons partagé entre threads : au plus `rate` requêtes/s, rafales de `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ClinicalTrialsClient:
+    """
+    Client HTTP de l'API ClinicalTrials.gov : connexions keep-alive réutilisées,
+    concurrence bornée, limitation de débit et reprise avec backoff exponentiel
+    sur 429/5xx et erreurs réseau. Chaque tentative, reprises comprises,
+    consomme un jeton du limiteur, et Retry-After est respecté : le débit
+    reste sous `rate_limit` quand le serveur demande de ralentir.
+    `base_url` peut pointer vers le serveur local de services/ctgov_stub.py
+    pour travailler hors ligne.
+    """
+
+    def __init__(self, base_url=None, max_workers=8, rate_limit=10.0, batch_size=50,
+                 retries=5, backoff_factor=0.5, timeout=10):
+        self.base_url = (base_url or settings.CT_GOV_BASE_URL).rstrip("/")
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.limiter = RateLimiter(rate_limit)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.http = requests.Session()
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+    def get(self, path, params):
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            last = attempt == self.retries
+            backoff = self.backoff_factor * 2 ** attempt
+            try:
+                res = self.http.get(f"{self.base_url}/{path}", params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+                time.sleep(backoff)
+                continue
+            if res.status_code in RETRY_STATUSES and not last:
+                time.sleep(max(backoff, retry_after(res)))
+                continue
+            res.raise_for_status()
+            return res.json()
+
+    def study_fields(self, expr, fields, max_rnk=None, min_rnk=None):
+        params = {"expr": expr, "fields": ",".join(fields), "fmt": "json"}
+        if min_rnk:
+            params["min_rnk"] = min_rnk
+        if max_rnk:
+            params["max_rnk"] = max_rnk
+        return self.get(STUDY_FIELDS_PATH, params).get("StudyFieldsResponse", {}).get("StudyFields", [])
+
+    def full_studies(self, expr, max_rnk=None, min_rnk=None):
+        params = {"expr": expr, "fmt": "json"}
+        if min_rnk:
+            params["min_rnk"] = min_rnk
+        if max_rnk:
+            params["max_rnk"] = max_rnk
+        return self.get(FULL_STUDIES_PATH, params).get("FullStudiesResponse", {}).get("FullStudies", [])
+
+    def _batches(self, nct_ids):
+        ids = list(dict.fromkeys(i for i in nct_ids if i))
+        return [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+
+    def _fetch_batches(self, fetch, nct_ids, label):
+        """Exécute `fetch(batch)` en parallèle (borné) ; un lot en échec est journalisé et ignoré."""
+        def run(batch):
+            try:
+                return fetch(batch)
+            except requests.RequestException as e:
+                logger.warning(f"[{label}] API failed for batch {batch[0]}..{batch[-1]}: {e}")
+                return []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for items in executor.map(run, self._batches(nct_ids)):
+                yield from items
+
+    def study_fields_by_ids(self, nct_ids, fields):
+        """
+        StudyFields de plusieurs essais, regroupés par lots dans une requête
+        `expr=NCT1 OR NCT2 ...`. Renvoie {nct_id: item}.
+        """
+        fields = fields if "NCTId" in fields else ["NCTId"] + list(fields)
+        fetch = lambda batch: self.study_fields(" OR ".join(batch), fields, max_rnk=len(batch))
+        results = {}
+        for item in self._fetch_batches(fetch, nct_ids, "Study Fields"):
+            nct_id = _first(item.get("NCTId"))
+            if nct_id:
+                results[nct_id] = item
+        return results
+
+    def full_studies_by_ids(self, nct_ids):
+        """FullStudies de plusieurs essais, par lots. Renvoie {nct_id: full_study}."""
+        fetch = lambda batch: self.full_studies(" OR ".join(batch), max_rnk=len(batch))
+        results = {}
+        for item in self._fetch_batches(fetch, nct_ids, "Full Studies"):
+            study = item.get("Study", {})
+            nct_id = study.get("ProtocolSection", {}).get("IdentificationModule", {}).get("NCTId")
+            if nct_id:
+                results[nct_id] = item
+        return results
+
+    def close(self):
+        self.http.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Client partagé par ClinicalTrialsService (créé au premier appel)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ClinicalTrialsClient(
+                max_workers=settings.CT_GOV_MAX_WORKERS,
+                rate_limit=settings.CT_GOV_RATE_LIMIT,
+                batch_size=settings.CT_GOV_BATCH_SIZE
+            )
+        return _client
+
 
 class ClinicalTrialsService:
 
@@ -26,18 +212,9 @@ class ClinicalTrialsService:
             expr_parts.append(f'"{condition}"')
         expr = " AND ".join(expr_parts)
 
-        params = {
-            "expr": expr,
-            "fields": ",".join(FIELDS_INVENTORY),
-            "max_rnk": limit,
-            "fmt": "json"
-        }
-
         try:
             logger.info(f"[Inventory] Fetching expr='{expr}'")
-            res = requests.get(BASE_URL_STUDY_FIELDS, params=params, timeout=10)
-            res.raise_for_status()
-            return res.json().get("StudyFieldsResponse", {}).get("StudyFields", [])
+            return get_client().study_fields(expr, FIELDS_INVENTORY, max_rnk=limit)
         except requests.RequestException as e:
             logger.warning(f"[Inventory] API failed: {e}")
             return []
@@ -46,11 +223,8 @@ class ClinicalTrialsService:
     def get_trial_details(nct_id):
         if not nct_id:
             return []
-        params = {"expr": nct_id, "fmt": "json"}
         try:
-            res = requests.get(BASE_URL_FULL_STUDY, params=params, timeout=10)
-            res.raise_for_status()
-            return res.json().get("FullStudiesResponse", {}).get("FullStudies", [])
+            return get_client().full_studies(nct_id)
         except requests.RequestException as e:
             logger.warning(f"[Trial Details] API failed for {nct_id}: {e}")
             return []
@@ -61,39 +235,41 @@ class ClinicalTrialsService:
 
     @staticmethod
     def get_trial_arms(nct_id):
-        fields = ["NCTId", "ArmGroupDescription", "InterventionName"]
-        params = {"expr": nct_id, "fields": ",".join(fields), "fmt": "json"}
         try:
-            res = requests.get(BASE_URL_STUDY_FIELDS, params=params, timeout=10)
-            res.raise_for_status()
-            return res.json().get("StudyFieldsResponse", {}).get("StudyFields", [])
+            return get_client().study_fields(nct_id, FIELDS_ARMS)
         except requests.RequestException as e:
             logger.warning(f"[Trial Arms] API failed for {nct_id}: {e}")
             return []
 
     @staticmethod
     def get_trial_locations(nct_id):
-        fields = ["NCTId", "LocationFacility", "LocationCity", "LocationCountry", "LocationZip"]
-        params = {"expr": nct_id, "fields": ",".join(fields), "fmt": "json"}
         try:
-            res = requests.get(BASE_URL_STUDY_FIELDS, params=params, timeout=10)
-            res.raise_for_status()
-            return res.json().get("StudyFieldsResponse", {}).get("StudyFields", [])
+            return get_client().study_fields(nct_id, FIELDS_LOCATIONS)
         except requests.RequestException as e:
             logger.warning(f"[Trial Locations] API failed for {nct_id}: {e}")
             return []
 
     @staticmethod
     def get_trial_sponsors(nct_id):
-        fields = [
-            "NCTId", "LeadSponsorName", "CollaboratorName",
-            "OverallOfficialName", "OverallOfficialRole", "ResponsibleParty"
-        ]
-        params = {"expr": nct_id, "fields": ",".join(fields), "fmt": "json"}
         try:
-            res = requests.get(BASE_URL_STUDY_FIELDS, params=params, timeout=10)
-            res.raise_for_status()
-            return res.json().get("StudyFieldsResponse", {}).get("StudyFields", [])
+            return get_client().study_fields(nct_id, FIELDS_SPONSORS)
         except requests.RequestException as e:
             logger.warning(f"[Trial Sponsors] API failed for {nct_id}: {e}")
             return []
+
+    # ------------------- Rafraîchissement par lots -------------------
+    @staticmethod
+    def get_trials_details(nct_ids):
+        return get_client().full_studies_by_ids(nct_ids)
+
+    @staticmethod
+    def get_trials_arms(nct_ids):
+        return get_client().study_fields_by_ids(nct_ids, FIELDS_ARMS)
+
+    @staticmethod
+    def get_trials_locations(nct_ids):
+        return get_client().study_fields_by_ids(nct_ids, FIELDS_LOCATIONS)
+
+    @staticmethod
+    def get_trials_sponsors(nct_ids):
+        return get_client().study_fields_by_ids(nct_ids, FIELDS_SPONSORS)
@@ -0,0 +1,172 @@
+# services/ctgov_stub.py
+"""
+Serveur HTTP local qui imite les endpoints legacy de ClinicalTrials.gov
+(study_fields, full_studies) à partir d'études en mémoire ou d'un répertoire
+de fichiers JSON. Sert au mode hors ligne de l'ingestion :
+
+    python -m services.ctgov_stub --port 8765 --studies-dir dumps/
+    CT_GOV_BASE_URL=http://127.0.0.1:8765/api/query python ...
+
+`latency` simule le temps d'aller-retour réseau et `fail_first` renvoie des
+429/503 sur les premières requêtes pour exercer la reprise avec backoff ;
+`fail_after` fait échouer toutes les requêtes au-delà de la N-ième (panne en
+cours de synchronisation). Les filtres AREA[LastUpdatePostDate]RANGE[...]
+sont appliqués, résultats triés par date de mise à jour puis NCT ID.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from services.preprocessor import payload_studies, study_nct_id, study_fields
+from services.utils import DATE_FORMATS
+
+NCT_RE = re.compile(r"NCT\d+", re.IGNORECASE)
+RANGE_RE = re.compile(r"AREA\[LastUpdatePostDate\]RANGE\[([^,\]]+),\s*([^\]]+)\]", re.IGNORECASE)
+
+
+def load_studies(directory):
+    """Charge les études (une par fichier, ou une réponse FullStudies) d'un répertoire."""
+    studies = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            studies.extend(payload_studies(json.load(f)))
+    return studies
+
+
+def _update_date(fields):
+    value = (fields.get("LastUpdatePostDate") or [None])[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return date.min
+
+
+class StubState:
+    def __init__(self, studies, latency=0.0, fail_first=0, fail_status=503, fail_after=None):
+        self.studies = {}
+        self.fields = {}
+        self.upsert(studies)
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_after = fail_after
+        self.fail_status = fail_status
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def upsert(self, studies):
+        """Ajoute ou remplace des études (fixtures modifiées entre deux synchronisations)."""
+        for study in studies:
+            nct = study_nct_id(study)
+            self.studies[nct] = study
+            self.fields[nct] = study_fields(study)
+
+    def match(self, expr):
+        """
+        Sous-ensemble de la syntaxe expr : liste de NCT IDs, ou texte cherché
+        dans les champs, éventuellement restreint par une plage de LastUpdatePostDate.
+        """
+        expr = expr or ""
+        ids = NCT_RE.findall(expr)
+        if ids:
+            return [i.upper() for i in ids if i.upper() in self.studies]
+        since = until = None
+        found = RANGE_RE.search(expr)
+        if found:
+            bounds = [None if b.strip().upper() in ("MIN", "MAX") else datetime.strptime(b.strip(), "%m/%d/%Y").date()
+                      for b in found.groups()]
+            since, until = bounds
+            expr = RANGE_RE.sub(" ", expr)
+        words = [w.lower() for w in re.findall(r"\w+", re.sub(r"AREA\[\w+\]", " ", expr))
+                 if w.upper() not in ("AND", "OR")]
+        matches = []
+        for nct, fields in self.fields.items():
+            updated = _update_date(fields)
+            if (since and updated < since) or (until and updated > until):
+                continue
+            if all(w in json.dumps(fields).lower() for w in words):
+                matches.append((updated, nct))
+        return [nct for _, nct in sorted(matches)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            failing = state.requests <= state.fail_first or (
+                state.fail_after is not None and state.requests > state.fail_after)
+        if state.latency:
+            time.sleep(state.latency)
+        if failing:
+            return self._send(state.fail_status, {"error": "stub failure"})
+
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        max_rnk = int(params.get("max_rnk", 20))
+        min_rnk = int(params.get("min_rnk", 1))
+        matches = state.match(params.get("expr", ""))
+        page = matches[min_rnk - 1:max_rnk]
+
+        if url.path.endswith("/study_fields"):
+            wanted = params.get("fields", "NCTId").split(",")
+            rows = [{f: state.fields[n].get(f, []) for f in wanted} for n in page]
+            return self._send(200, {"StudyFieldsResponse": {
+                "NStudiesFound": len(matches), "MinRank": min_rnk, "MaxRank": max_rnk, "StudyFields": rows
+            }})
+        if url.path.endswith("/full_studies"):
+            return self._send(200, {"FullStudiesResponse": {
+                "NStudiesFound": len(matches), "MinRank": min_rnk, "MaxRank": max_rnk,
+                "FullStudies": [state.studies[n] for n in page]
+            }})
+        return self._send(404, {"error": f"unknown path {url.path}"})
+
+
+def start_stub_server(studies, host="127.0.0.1", port=0, **options):
+    """
+    Démarre le serveur dans un thread ; renvoie (server, base_url). Arrêt :
+    server.shutdown(). L'état (études, pannes) est server.RequestHandlerClass.state.
+    """
+    handler = type("BoundStubHandler", (StubHandler,), {"state": StubState(studies, **options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api/query"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur local imitant l'API ClinicalTrials.gov")
+    parser.add_argument("--studies-dir", required=True)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server, base_url = start_stub_server(load_studies(args.studies_dir), port=args.port, latency=args.latency)
+    print(f"Serveur ClinicalTrials.gov local sur {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
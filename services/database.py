@@ -1,59 +1,417 @@
 # services/database.py
-from sqlalchemy import create_engine, Column, String, Integer, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import hashlib
+import threading
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import create_engine, delete, event, insert, inspect, select, update
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from config import settings
+from models import (
+    Base, ClinicalTrial, TrialDetails, TrialArms, TrialLocation, TrialSponsor,
+    TrialCondition, TrialCountry, FacetCount, SchemaState, TrialEligibility
+)
+from services.queries import distinct_conditions, distinct_countries
+from services.search import FTS_DDL, init_search_index
+from services.geo import RTREE_DDL, init_geo_index
+from services.utils import DATE_FORMATS
+from services.details import storage_columns
+from services.facets import current_trials, refresh_facet_counts, rebuild_facet_counts
+from services.query_cache import bump_generation
+from services.eligibility import eligibility_columns, rebuild_eligibility, rebuild_match_rows, refresh_match_rows
+from services.migrations import MIGRATIONS, run_migrations
 
-DATABASE_URL = "sqlite:///clinical_trials.db"
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL : les lecteurs ne sont plus bloqués par l'écrivain de l'ingestion
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
 
-Base = declarative_base()
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
-session = SessionLocal()
+def make_engine(url=None, **kwargs):
+    """
+    Crée un engine pour `url` (settings.DATABASE_URL par défaut) dont le pool
+    et les options dépendent du dialecte : pool borné + pre-ping pour un
+    serveur (PostgreSQL...), pragmas WAL et busy_timeout pour un fichier
+    SQLite partagé entre threads.
+    """
+    url = url or settings.DATABASE_URL
+    db_url = make_url(url)
+    options = {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW,
+               "pool_timeout": settings.DB_POOL_TIMEOUT}
+    if db_url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if db_url.database in (None, "", ":memory:"):
+            options = {"connect_args": options["connect_args"]}
+    else:
+        options.update(pool_pre_ping=True, pool_recycle=settings.DB_POOL_RECYCLE)
+    options.update(kwargs)
+    new_engine = create_engine(url, **options)
+    if db_url.get_backend_name() == "sqlite":
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+# L'engine n'est créé qu'au premier usage : importer ce module ne
+# touche ni aux paramètres ni à la base
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = make_engine()
+    return _engine
 
-# ------------------- Models -------------------
-class ClinicalTrial(Base):
-    __tablename__ = "clinical_trials"
-    id = Column(Integer, primary_key=True, index=True)
-    NCTId = Column(String, unique=True, index=True)
-    data = Column(JSON)
+def __getattr__(name):
+    # `from services.database import engine` reste valable
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+SessionLocal = sessionmaker()
+# Une session par thread (et donc par requête Flask, cf. remove_session dans app.py)
+session = scoped_session(lambda: SessionLocal(bind=get_engine()))
 
 # ------------------- Initialization -------------------
+def add_missing_columns(bind):
+    """
+    Ajoute aux tables existantes les colonnes et index déclarés depuis dans
+    models.py (create_all ne modifie pas une table déjà créée). Colonnes
+    nullables uniquement.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            existing = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+
+def schema_fingerprint():
+    """Empreinte de models.py (tables, colonnes, index), des tables virtuelles FTS5 / R*Tree et des migrations."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{column.name}:{column.type}" for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    parts.extend(FTS_DDL)
+    parts.extend(RTREE_DDL)
+    parts.extend(name for name, _, _ in MIGRATIONS)
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def _stored_fingerprint(bind):
+    try:
+        with bind.connect() as conn:
+            return conn.execute(
+                select(SchemaState.value).where(SchemaState.key == "fingerprint")
+            ).scalar()
+    except Exception:
+        # Base neuve ou antérieure à schema_state
+        return None
+
 def init_db():
+    """
+    Crée ou met à niveau le schéma. Quand l'empreinte enregistrée dans
+    schema_state correspond à models.py, une seule requête suffit : les
+    vérifications complètes ne tournent qu'à la création de la base ou après
+    un changement de modèle.
+    """
+    engine = get_engine()
+    fingerprint = schema_fingerprint()
+    if _stored_fingerprint(engine) == fingerprint:
+        return
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    # Base existante sans tables de correspondance : on les reconstruit une fois
+    if session.query(TrialCondition.id).first() is None and session.query(ClinicalTrial.id).first() is not None:
+        rebuild_trial_lookups(session)
+    # Idem pour les comptages de /api/facets
+    if session.query(FacetCount.id).first() is None and session.query(ClinicalTrial.id).first() is not None:
+        rebuild_facet_counts(session)
+    # Et pour l'éligibilité de /api/match (colonnes de trial_details et table trial_eligibility)
+    if session.query(TrialEligibility.nct_id).first() is None and session.query(TrialDetails.id).first() is not None:
+        rebuild_eligibility(session)
+    session.remove()
+    init_search_index(engine)
+    init_geo_index(engine)
+    # Index et types propres au dialecte (services/migrations.py)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        _upsert_state(conn, "fingerprint", fingerprint)
 
-# ------------------- Save Functions -------------------
-def save_clinical_trial(trial):
-    if not trial or "NCTId" not in trial:
+def _upsert_state(conn, key, value):
+    table = SchemaState.__table__
+    values = {"value": value, "updated_at": datetime.utcnow()}
+    if conn.execute(update(table).where(table.c.key == key).values(**values)).rowcount == 0:
+        conn.execute(insert(table).values(key=key, **values))
+
+# ------------------- Helpers -------------------
+def parse_date(value):
+    if not value or value == "N/A":
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def _as_list(value):
+    if value is None or value == "N/A":
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _trial_columns(trial):
+    """Convertit un essai prétraité (Preprocessor) en colonnes de ClinicalTrial."""
+    conditions = _as_list(trial.get("Conditions", trial.get("Condition")))
+    locations = trial.get("Locations") or []
+    if not locations and trial.get("Country", "N/A") != "N/A":
+        locations = [{"city": trial.get("City", "N/A"), "country": trial["Country"]}]
+    return {
+        "title": trial.get("Title"),
+        "conditions": [c for c in conditions if c != "N/A"],
+        "interventions": _as_list(trial.get("Interventions")),
+        "status": trial.get("Status"),
+        "start_date": parse_date(trial.get("StartDate")),
+        "completion_date": parse_date(trial.get("CompletionDate")),
+        "locations": locations,
+    }
+
+def batches(items, size):
+    """Lots successifs de `size` éléments (listes), lus au fur et à mesure dans `items`."""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def upsert_rows(db_session, model, rows, key="nct_id"):
+    """
+    INSERT ... ON CONFLICT (key) DO UPDATE en un seul executemany, pour
+    SQLite comme pour PostgreSQL. created_at n'est écrit qu'à l'insertion.
+    """
+    if not rows:
         return
-    existing = session.query(ClinicalTrial).filter_by(NCTId=trial["NCTId"]).first()
-    if existing:
-        existing.data = trial
+    dialect = db_session.get_bind().dialect.name
+    if dialect == "postgresql":
+        # Importé à la demande : le dialecte PostgreSQL (et ses pilotes async) coûte ~40 ms au démarrage
+        from sqlalchemy.dialects import postgresql
+        stmt = postgresql.insert(model)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(model)
     else:
-        session.add(ClinicalTrial(NCTId=trial["NCTId"], data=trial))
-    session.commit()
+        raise NotImplementedError(f"Upsert non supporté pour le dialecte {dialect}")
+    updated = {c for row in rows for c in row} - {key, "created_at"}
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key], set_={c: stmt.excluded[c] for c in updated}
+    )
+    db_session.execute(stmt, rows)
+
+# ------------------- Lookup tables -------------------
+def refresh_trial_lookups(db_session, trials):
+    """
+    Réécrit les lignes de trial_conditions / trial_countries des essais donnés
+    (dictionnaires nct_id / conditions / locations). Doit être appelé dans la
+    même transaction que l'écriture des essais.
+    """
+    nct_ids = [t["nct_id"] for t in trials]
+    if not nct_ids:
+        return
+    db_session.execute(delete(TrialCondition).where(TrialCondition.nct_id.in_(nct_ids)))
+    db_session.execute(delete(TrialCountry).where(TrialCountry.nct_id.in_(nct_ids)))
+    _insert_lookups(db_session, trials)
+
+def _insert_lookups(db_session, trials):
+    conditions = [{"nct_id": t["nct_id"], "condition": c}
+                  for t in trials for c in distinct_conditions(t["conditions"])]
+    countries = [{"nct_id": t["nct_id"], "country": c}
+                 for t in trials for c in distinct_countries(t["locations"])]
+    if conditions:
+        db_session.execute(insert(TrialCondition), conditions)
+    if countries:
+        db_session.execute(insert(TrialCountry), countries)
+
+def rebuild_trial_lookups(db_session, batch_size=1000):
+    """Reconstruit entièrement les tables de correspondance depuis clinical_trials."""
+    db_session.execute(delete(TrialCondition))
+    db_session.execute(delete(TrialCountry))
+    rows = db_session.query(ClinicalTrial.nct_id, ClinicalTrial.conditions, ClinicalTrial.locations)
+    batch = []
+    for t in rows.yield_per(batch_size):
+        batch.append({"nct_id": t.nct_id, "conditions": t.conditions, "locations": t.locations})
+        if len(batch) >= batch_size:
+            _insert_lookups(db_session, batch)
+            batch = []
+    _insert_lookups(db_session, batch)
+    rebuild_match_rows(db_session)
+    bump_generation(db_session)
+    db_session.commit()
+
+def touch_trials(db_session, nct_ids):
+    """
+    Avance clinical_trials.updated_at des essais dont une donnée liée a changé
+    (détails, bras, localisations, sponsors) : invalide le cache de réponses.
+    Incrémente aussi la génération des essais : l'index plein texte couvre
+    trial_details.eligibility_text (/api/search?mode=fulltext en cache).
+    """
+    if nct_ids:
+        db_session.execute(
+            update(ClinicalTrial).where(ClinicalTrial.nct_id.in_(list(nct_ids))).values(updated_at=datetime.utcnow())
+        )
+        bump_generation(db_session)
+
+# ------------------- Bulk load -------------------
+# Une transaction par lot de `batch_size` lignes (INGEST_BATCH_SIZE par défaut)
+
+def bulk_upsert_trials(trials, batch_size=None, db_session=None):
+    """Upsert d'essais prétraités dans clinical_trials (+ tables de correspondance)."""
+    rows = ({"nct_id": t["NCTId"], **_trial_columns(t)} for t in trials if t and "NCTId" in t)
+    return bulk_upsert_trial_rows(rows, batch_size, db_session)
+
+def bulk_upsert_trial_rows(rows, batch_size=None, db_session=None):
+    """
+    Upsert de lignes déjà au format des colonnes de ClinicalTrial (nct_id,
+    title, conditions, ...), telles que produites par Preprocessor.trial_rows.
+    """
+    db_session = db_session or session
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    count = 0
+    for chunk in batches(rows, batch_size):
+        now = datetime.utcnow()
+        batch = list({r["nct_id"]: {**r, "created_at": now, "updated_at": now} for r in chunk}.values())
+        try:
+            # Valeurs avant réécriture : les comptages de facettes sont mis à jour par delta
+            previous = current_trials(db_session, [r["nct_id"] for r in batch])
+            upsert_rows(db_session, ClinicalTrial, batch)
+            refresh_trial_lookups(db_session, batch)
+            refresh_facet_counts(db_session, previous, batch)
+            # Conditions et statut recopiés dans l'index d'appariement de /api/match
+            refresh_match_rows(db_session, [r["nct_id"] for r in batch])
+            # Résultats de /api/inventory et /api/search en cache périmés (services/query_cache.py)
+            bump_generation(db_session)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        count += len(batch)
+    return count
+
+def detail_row(details):
+    """
+    Document détaillé -> ligne de trial_details, compressée par sections
+    (DETAILS_CODEC, cf. services/details.py), avec les colonnes
+    d'éligibilité de /api/match (services/eligibility.py).
+    """
+    criteria = details.get("EligibilityCriteria")
+    return {
+        "nct_id": details["NCTId"], **storage_columns(details), **eligibility_columns(details, criteria),
+        "eligibility_criteria": criteria, "arms": details.get("Arms")
+    }
+
+def bulk_upsert_details(details_list, batch_size=None, db_session=None):
+    """Upsert de documents détaillés dans trial_details."""
+    rows = (detail_row(d) for d in details_list if d and "NCTId" in d)
+    return bulk_upsert_detail_rows(rows, batch_size, db_session)
+
+def bulk_upsert_detail_rows(rows, batch_size=None, db_session=None):
+    """Upsert de lignes déjà au format de trial_details (detail_row), ex: compressées hors du process écrivain."""
+    db_session = db_session or session
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    count = 0
+    for chunk in batches(rows, batch_size):
+        now = datetime.utcnow()
+        batch = list({r["nct_id"]: {**r, "created_at": now} for r in chunk}.values())
+        try:
+            upsert_rows(db_session, TrialDetails, batch)
+            refresh_match_rows(db_session, [r["nct_id"] for r in batch])
+            touch_trials(db_session, [r["nct_id"] for r in batch])
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        count += len(batch)
+    return count
+
+def _bulk_replace(db_session, model, rows_by_nct, batch_size):
+    """Remplace, lot par lot, toutes les lignes de `model` des NCT IDs fournis."""
+    count = 0
+    for chunk in batches(list(rows_by_nct.items()), batch_size):
+        nct_ids = [nct_id for nct_id, _ in chunk]
+        rows = [row for _, nct_rows in chunk for row in nct_rows]
+        try:
+            db_session.execute(delete(model).where(model.nct_id.in_(nct_ids)))
+            if rows:
+                db_session.execute(insert(model), rows)
+            touch_trials(db_session, nct_ids)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        count += len(rows)
+    return count
+
+def bulk_replace_arms(arms_by_nct, batch_size=None, db_session=None):
+    """{nct_id: arms} -> une ligne trial_arms par essai."""
+    rows = {nct_id: [{"nct_id": nct_id, "arms": arms}] for nct_id, arms in arms_by_nct.items() if nct_id}
+    return _bulk_replace(db_session or session, TrialArms, rows, batch_size or settings.INGEST_BATCH_SIZE)
+
+def bulk_replace_locations(locations, batch_size=None, db_session=None, nct_ids=()):
+    """
+    Localisations prétraitées (Preprocessor.process_locations) -> trial_locations.
+    Les essais de `nct_ids` sans localisation dans le lot sont vidés.
+    """
+    rows = {nct_id: [] for nct_id in nct_ids}
+    for loc in locations:
+        if not loc.get("nct_id"):
+            continue
+        rows.setdefault(loc["nct_id"], []).append({
+            "nct_id": loc["nct_id"],
+            "facility": loc.get("Facility"),
+            "city": loc.get("City"),
+            "country": loc.get("Country"),
+            "zip_code": loc.get("Zip"),
+            "latitude": loc.get("Latitude"),
+            "longitude": loc.get("Longitude")
+        })
+    return _bulk_replace(db_session or session, TrialLocation, rows, batch_size or settings.INGEST_BATCH_SIZE)
+
+def bulk_replace_sponsors(sponsors_by_nct, batch_size=None, db_session=None):
+    """{nct_id: sponsors prétraités} -> trial_sponsors."""
+    rows = {nct_id: [{
+        "nct_id": nct_id,
+        "lead_sponsor": s.get("LeadSponsorName"),
+        "collaborators": s.get("CollaboratorName", []),
+        "contacts": s.get("Contacts", [])
+    } for s in sponsors] for nct_id, sponsors in sponsors_by_nct.items() if nct_id}
+    return _bulk_replace(db_session or session, TrialSponsor, rows, batch_size or settings.INGEST_BATCH_SIZE)
+
+# ------------------- Save Functions -------------------
+def save_clinical_trial(trial):
+    bulk_upsert_trials([trial])
 
 def save_trial_details(details):
-    save_clinical_trial(details)
+    bulk_upsert_details([details])
 
 def save_targeted_search(condition, trials):
-    for t in trials:
-        save_clinical_trial(t)
+    bulk_upsert_trials(trials)
 
 def save_trial_arms(nct_id, arms):
-    trial = session.query(ClinicalTrial).filter_by(NCTId=nct_id).first()
-    if trial:
-        trial.data["Arms"] = arms
-        session.commit()
+    bulk_replace_arms({nct_id: arms})
 
 def save_trial_locations(locations):
-    for loc in locations:
-        trial = session.query(ClinicalTrial).filter_by(NCTId=loc.get("nct_id")).first()
-        if trial:
-            trial.data["Locations"] = loc
-            session.commit()
+    bulk_replace_locations(locations)
 
 def save_trial_sponsors(nct_id, sponsors):
-    trial = session.query(ClinicalTrial).filter_by(NCTId=nct_id).first()
-    if trial:
-        trial.data["Sponsors"] = sponsors
-        session.commit()
+    bulk_replace_sponsors({nct_id: sponsors})
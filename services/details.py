@@ -0,0 +1,243 @@
+# services/details.py
+"""
+Stockage compact des documents détaillés (TrialDetails.packed_data).
+
+Le document est découpé en sections : les modules de chaque partie de
+l'étude ("ProtocolSection.StatusModule", "DerivedSection.MiscInfoModule",
+...), les autres clés de premier niveau de Study, et une section "" pour
+les clés hors de Study (NCTId). Chaque section est sérialisée et compressée
+séparément ; une table d'offsets en tête du blob permet de ne décompresser
+que les sections demandées par ?fields=.
+
+    magic "CTD1" | codec (1 octet) | longueur de la table (4 octets)
+    | table JSON {"wrapped": bool, "sections": [[chemin, offset, taille], ...]}
+    | sections compressées
+
+    python -m services.details --pack     # convertit les lignes full_data existantes
+"""
+import argparse
+import json
+import struct
+import zlib
+from sqlalchemy import update
+from config import settings
+from models import TrialDetails
+
+MAGIC = b"CTD1"
+HEADER = struct.Struct(">4scI")
+
+
+# ------------------- Codecs -------------------
+# zstd (paquet optionnel `zstandard`) ou zlib (bibliothèque standard)
+def _zstd():
+    import zstandard
+    return zstandard
+
+def _compress(codec, data):
+    if codec == b"s":
+        return _zstd().ZstdCompressor(level=9).compress(data)
+    return zlib.compress(data, 9)
+
+def _decompress(codec, data):
+    if codec == b"s":
+        return _zstd().ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def default_codec():
+    """Codec configuré (DETAILS_CODEC) ; None = document JSON non compressé dans full_data."""
+    name = settings.DETAILS_CODEC.lower()
+    if name == "none":
+        return None
+    if name == "zstd":
+        return b"s"
+    if name == "zlib":
+        return b"z"
+    raise ValueError(f"Codec de détails inconnu : {name}")
+
+
+# ------------------- Sections -------------------
+def split_sections(document):
+    """(wrapped, [(chemin, valeur)]) : découpage d'un document en sections."""
+    wrapped = isinstance(document.get("Study"), dict)
+    body = document["Study"] if wrapped else document
+    sections = []
+    if wrapped:
+        extras = {k: v for k, v in document.items() if k != "Study"}
+        if extras:
+            sections.append(("", extras))
+    for key, value in body.items():
+        # Conteneur de modules (ProtocolSection, DerivedSection...) : un module par section
+        if isinstance(value, dict) and value and all(isinstance(v, dict) for v in value.values()):
+            sections.extend((f"{key}.{sub}", v) for sub, v in value.items())
+        else:
+            sections.append((key, value))
+    return wrapped, sections
+
+def _merge(target, value):
+    for key, item in value.items():
+        if isinstance(item, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], item)
+        else:
+            target[key] = item
+
+def join_sections(wrapped, sections):
+    """Inverse de split_sections (pour tout ou partie des sections)."""
+    root, body = {}, {}
+    for path, value in sections:
+        if path == "":
+            root.update(value)
+            continue
+        nested = value
+        for key in reversed(path.split(".")):
+            nested = {key: nested}
+        _merge(body, nested)
+    return {**root, "Study": body} if wrapped else body
+
+def _select(path, fields):
+    """
+    Part de la section `path` demandée par `fields` : None (rien), [] (toute
+    la section) ou la liste des sous-chemins demandés à l'intérieur.
+    """
+    if fields is None or path == "":
+        return []
+    inner = []
+    for field in fields:
+        if field == path or path.startswith(field + "."):
+            return []
+        if field.startswith(path + "."):
+            inner.append(field[len(path) + 1:].split("."))
+    return inner or None
+
+def _extract(value, inner):
+    """Sous-chemins `inner` d'une section (clés absentes ignorées)."""
+    if not inner:
+        return value
+    result = {}
+    for keys in inner:
+        node = value
+        for key in keys:
+            node = node.get(key) if isinstance(node, dict) else None
+            if node is None:
+                break
+        if node is not None:
+            nested = node
+            for key in reversed(keys):
+                nested = {key: nested}
+            _merge(result, nested)
+    return result or None
+
+def parse_fields(value):
+    """'ProtocolSection.StatusModule,...' -> liste de chemins ; None si absent, ValueError si mal formé."""
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    if not fields or any(not part for f in fields for part in f.split(".")):
+        raise ValueError(value)
+    return sorted(set(fields))
+
+
+# ------------------- Pack / unpack -------------------
+def pack_document(document, codec=b"z"):
+    wrapped, sections = split_sections(document)
+    table, chunks, offset = [], [], 0
+    for path, value in sections:
+        chunk = _compress(codec, json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        table.append([path, offset, len(chunk)])
+        chunks.append(chunk)
+        offset += len(chunk)
+    header = json.dumps({"wrapped": wrapped, "sections": table}, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(MAGIC, codec, len(header)) + header + b"".join(chunks)
+
+def section_table(blob):
+    magic, codec, size = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Blob de détails invalide")
+    header = json.loads(bytes(blob[HEADER.size:HEADER.size + size]))
+    return codec, header, HEADER.size + size
+
+def unpack_document(blob, fields=None):
+    """Document complet, ou seulement les sections couvrant `fields`."""
+    codec, header, start = section_table(blob)
+    view = memoryview(blob)
+    sections = []
+    for path, offset, length in header["sections"]:
+        inner = _select(path, fields)
+        if inner is None:
+            continue
+        value = json.loads(_decompress(codec, view[start + offset:start + offset + length]))
+        value = _extract(value, inner)
+        if value is not None:
+            sections.append((path, value))
+    return join_sections(header["wrapped"], sections)
+
+def project_document(document, fields=None):
+    """Même projection que unpack_document, pour un document JSON non compressé."""
+    if fields is None or not isinstance(document, dict):
+        return document
+    wrapped, sections = split_sections(document)
+    selected = []
+    for path, value in sections:
+        inner = _select(path, fields)
+        if inner is not None:
+            value = _extract(value, inner)
+            if value is not None:
+                selected.append((path, value))
+    return join_sections(wrapped, selected)
+
+def details_document(packed_data, full_data, fields=None):
+    """Document d'une ligne trial_details, qu'elle soit compressée ou non."""
+    if packed_data is not None:
+        return unpack_document(packed_data, fields)
+    return project_document(full_data, fields)
+
+def eligibility_text(document):
+    """Texte des critères d'éligibilité (indexé par FTS5, cf. services/search.py)."""
+    if not isinstance(document, dict):
+        return None
+    protocol = document.get("Study", {}).get("ProtocolSection", {}) if isinstance(document.get("Study"), dict) else {}
+    return protocol.get("EligibilityModule", {}).get("EligibilityCriteria") or document.get("EligibilityCriteria")
+
+def storage_columns(document, codec=None):
+    """Colonnes full_data / packed_data / eligibility_text d'un document à enregistrer."""
+    codec = default_codec() if codec is None else codec
+    if not codec:
+        return {"full_data": document, "packed_data": None, "eligibility_text": eligibility_text(document)}
+    return {"full_data": None, "packed_data": pack_document(document, codec),
+            "eligibility_text": eligibility_text(document)}
+
+
+# ------------------- Conversion des lignes existantes -------------------
+def pack_existing_details(db_session, batch_size=500, codec=None):
+    """Compresse les lignes dont le document est encore dans full_data. Renvoie le nombre de lignes."""
+    codec = codec or default_codec() or b"z"
+    count, last_id = 0, 0
+    while True:
+        rows = db_session.query(TrialDetails.id, TrialDetails.full_data).filter(
+            TrialDetails.id > last_id, TrialDetails.packed_data.is_(None), TrialDetails.full_data.isnot(None)
+        ).order_by(TrialDetails.id).limit(batch_size).all()
+        if not rows:
+            return count
+        last_id = rows[-1].id
+        try:
+            db_session.execute(update(TrialDetails), [
+                {"id": row.id, **storage_columns(row.full_data, codec)} for row in rows
+            ])
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        count += len(rows)
+
+
+if __name__ == "__main__":
+    from services.database import engine, init_db, session
+    parser = argparse.ArgumentParser(description="Stockage compressé de trial_details")
+    parser.add_argument("--pack", action="store_true", help="Compresse les lignes full_data existantes")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM après conversion (SQLite)")
+    args = parser.parse_args()
+    init_db()
+    if args.pack:
+        print(f"{pack_existing_details(session)} lignes compressées")
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
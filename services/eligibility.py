@@ -0,0 +1,257 @@
+# services/eligibility.py
+"""
+Critères d'éligibilité structurés et appariement de patients (/api/match).
+
+À l'ingestion, detail_row (services/database.py) extrait du module
+EligibilityModule de l'étude, dans des colonnes de trial_details :
+- les âges minimum et maximum, ramenés en jours ("18 Years" -> 6574), à
+  défaut ceux de trial_details.eligibility_criteria ({"min_age": 22,
+  "max_age": 72}, en années) ;
+- le sexe accepté ("All", "Female" ou "Male") et l'accord pour des volontaires sains ;
+- les mots-clés des critères d'inclusion et d'exclusion : mots en
+  minuscules, sans mots vides, au plus MAX_KEYWORDS par section, stockés
+  entre espaces (" adults breast cancer ") pour un test LIKE '% mot %'.
+
+La table trial_eligibility les recopie pour chaque (condition, essai) avec
+le statut de recrutement ; elle est réécrite pour les essais concernés à
+chaque écriture d'essais ou de détails. match_trials la lit en un parcours
+de clé primaire (condition, recruiting, nct_id) : filtres d'âge, de sexe et
+d'exclusion et score d'inclusion sont évalués dans la ligne, sans jointure
+par candidat. Les essais qui recrutent sont classés d'abord ; les autres ne
+sont lus que s'il en manque pour remplir la page.
+
+    python -m services.eligibility --rebuild   # extrait l'éligibilité des lignes existantes
+"""
+import argparse
+import re
+from sqlalchemy import and_, case, delete, func, insert, literal, select, update
+from models import ClinicalTrial, TrialCondition, TrialDetails, TrialEligibility
+from services.details import details_document
+
+# Jours par unité des âges de ClinicalTrials.gov ("18 Years", "6 Months", "28 Days"...)
+AGE_UNITS = {"year": 365.25, "month": 30.4375, "week": 7, "day": 1, "hour": 1 / 24, "minute": 1 / 1440}
+AGE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]+)")
+SEX_LABELS = {"all": "All", "both": "All", "female": "Female", "male": "Male"}
+HEALTHY_VALUES = {"yes": True, "accepts healthy volunteers": True, "true": True, "no": False, "false": False}
+RECRUITING_STATUSES = ("Recruiting", "Not yet recruiting", "Enrolling by invitation")
+
+WORD = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+EXCLUSION_MARKER = re.compile(r"exclusion\s+criteria", re.IGNORECASE)
+MAX_KEYWORDS = 64
+STOPWORDS = frozenset("""
+    a about above after all also an and any are as at be been before being below between both but by can
+    criteria day days did do does during each either exclusion following for from had has have having if in
+    inclusion into is it its least may more most must no non not of on one only or other over patient patients
+    per prior participant participants same should study subject subjects such than that the their them then
+    there these they this those through to two under until up upon was week weeks were what when which while
+    who will with within without year years
+""".split())
+
+
+# ------------------- Extraction -------------------
+def eligibility_module(document):
+    """EligibilityModule d'un document FullStudies, ou le document lui-même s'il est à plat."""
+    if not isinstance(document, dict):
+        return {}
+    study = document.get("Study")
+    if isinstance(study, dict):
+        return study.get("ProtocolSection", {}).get("EligibilityModule", {}) or {}
+    return document
+
+def age_days(value):
+    """"18 Years" -> 6574 jours ; None si l'âge est absent ("N/A") ou illisible."""
+    match = AGE_PATTERN.match(str(value).strip().lower()) if value is not None else None
+    if not match:
+        return None
+    factor = AGE_UNITS.get(match.group(2).rstrip("s"))
+    return int(float(match.group(1)) * factor) if factor else None
+
+def criteria_age_days(criteria, key):
+    """Âge de eligibility_criteria ({"min_age": 22, "max_age": 72}, en années) -> jours ; None si absent."""
+    value = criteria.get(key) if isinstance(criteria, dict) else None
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(float(value) * AGE_UNITS["year"])
+    except (TypeError, ValueError):
+        return age_days(value)
+
+def sex_label(value):
+    return SEX_LABELS.get(str(value).strip().lower()) if value is not None else None
+
+def healthy_volunteers(value):
+    if value is None or isinstance(value, bool):
+        return value
+    return HEALTHY_VALUES.get(str(value).strip().lower())
+
+def split_criteria(text):
+    """Texte des critères -> (inclusion, exclusion), coupé à "Exclusion Criteria"."""
+    if not text:
+        return "", ""
+    marker = EXCLUSION_MARKER.search(text)
+    if not marker:
+        return text, ""
+    return text[:marker.start()], text[marker.end():]
+
+def keywords(text, limit=MAX_KEYWORDS):
+    """Mots significatifs distincts de `text`, en minuscules, dans l'ordre d'apparition."""
+    words = dict.fromkeys(
+        w for w in WORD.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS and not w.isdigit()
+    )
+    return list(words)[:limit]
+
+def keyword_text(words):
+    return f" {' '.join(words)} " if words else ""
+
+def eligibility_columns(document, criteria=None):
+    """
+    Colonnes d'éligibilité de trial_details pour un document détaillé ;
+    `criteria` : colonne eligibility_criteria, dont les âges servent quand
+    le document n'en donne pas.
+    """
+    module = eligibility_module(document)
+    text = module.get("EligibilityCriteria")
+    inclusion, exclusion = split_criteria(text if isinstance(text, str) else "")
+    min_age, max_age = age_days(module.get("MinimumAge")), age_days(module.get("MaximumAge"))
+    return {
+        "min_age_days": criteria_age_days(criteria, "min_age") if min_age is None else min_age,
+        "max_age_days": criteria_age_days(criteria, "max_age") if max_age is None else max_age,
+        "sex": sex_label(module.get("Gender")),
+        "healthy_volunteers": healthy_volunteers(module.get("HealthyVolunteers")),
+        "inclusion_keywords": keyword_text(keywords(inclusion)),
+        "exclusion_keywords": keyword_text(keywords(exclusion)),
+    }
+
+
+# ------------------- Table d'appariement -------------------
+def _match_source():
+    """Lignes de trial_eligibility calculées depuis trial_conditions, clinical_trials et trial_details."""
+    return select(
+        TrialCondition.condition,
+        case((ClinicalTrial.status.in_(RECRUITING_STATUSES), 1), else_=0),
+        TrialCondition.nct_id, TrialDetails.sex, TrialDetails.min_age_days, TrialDetails.max_age_days,
+        TrialDetails.healthy_volunteers, TrialDetails.inclusion_keywords, TrialDetails.exclusion_keywords
+    ).select_from(TrialCondition).join(
+        ClinicalTrial, ClinicalTrial.nct_id == TrialCondition.nct_id
+    ).join(TrialDetails, TrialDetails.nct_id == TrialCondition.nct_id)
+
+MATCH_COLUMNS = (
+    "condition", "recruiting", "nct_id", "sex", "min_age_days", "max_age_days",
+    "healthy_volunteers", "inclusion_keywords", "exclusion_keywords"
+)
+
+def refresh_match_rows(db_session, nct_ids):
+    """
+    Réécrit les lignes de trial_eligibility des essais donnés. Doit être
+    appelé dans la transaction qui écrit leurs essais ou leurs détails, après
+    la mise à jour de trial_conditions.
+    """
+    nct_ids = list(nct_ids)
+    if not nct_ids:
+        return
+    db_session.execute(delete(TrialEligibility).where(TrialEligibility.nct_id.in_(nct_ids)))
+    db_session.execute(insert(TrialEligibility).from_select(
+        MATCH_COLUMNS, _match_source().where(TrialCondition.nct_id.in_(nct_ids))
+    ))
+
+def rebuild_match_rows(db_session):
+    """Reconstruit toute la table trial_eligibility (ne commit pas)."""
+    db_session.execute(delete(TrialEligibility))
+    db_session.execute(insert(TrialEligibility).from_select(MATCH_COLUMNS, _match_source()))
+
+def rebuild_eligibility(db_session, batch_size=500):
+    """
+    Extrait l'éligibilité de toutes les lignes de trial_details (documents
+    décompressés un par un) puis reconstruit trial_eligibility. Renvoie le
+    nombre de lignes.
+    """
+    count, last_id = 0, 0
+    while True:
+        rows = db_session.query(
+            TrialDetails.id, TrialDetails.packed_data, TrialDetails.full_data, TrialDetails.eligibility_criteria
+        ).filter(TrialDetails.id > last_id).order_by(TrialDetails.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        try:
+            db_session.execute(update(TrialDetails), [
+                {"id": row.id, **eligibility_columns(details_document(row.packed_data, row.full_data),
+                                                     row.eligibility_criteria)}
+                for row in rows
+            ])
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        count += len(rows)
+    try:
+        rebuild_match_rows(db_session)
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+    return count
+
+
+# ------------------- Appariement -------------------
+def keyword_terms(values):
+    """Mots-clés du patient ("heart failure", "pregnancy") -> listes de mots, comme à l'extraction."""
+    terms = (tuple(keywords(v)) for v in values if v)
+    return list(dict.fromkeys(t for t in terms if t))
+
+def _has_word(column, word):
+    return column.like(f"% {word} %")
+
+def match_trials(db_session, condition, age=None, sex=None, healthy=None, terms=(), recruiting_only=False, limit=20):
+    """
+    Lignes de trial_eligibility des essais de `condition` auxquels le patient
+    est éligible, les mieux classées d'abord. age : en jours ; sex : "Female"
+    / "Male" ; healthy : True pour un volontaire sain ; terms : keyword_terms().
+    Un champ absent côté essai (âge limite, sexe) ne restreint pas. Un essai
+    est écarté si tous les mots d'un des termes figurent dans ses critères
+    d'exclusion ; `score` compte les mots du patient présents dans ses
+    critères d'inclusion.
+    """
+    M = TrialEligibility
+    words = sorted({w for term in terms for w in term})
+    score = sum((case((_has_word(M.inclusion_keywords, w), 1), else_=0) for w in words), literal(0)).label("score")
+    query = db_session.query(
+        M.nct_id, M.recruiting, M.sex, M.min_age_days, M.max_age_days, M.healthy_volunteers,
+        M.inclusion_keywords, score
+    ).filter(M.condition == condition)
+
+    if age is not None:
+        query = query.filter(
+            (M.min_age_days.is_(None)) | (M.min_age_days <= age),
+            (M.max_age_days.is_(None)) | (M.max_age_days >= age),
+        )
+    if sex:
+        query = query.filter((M.sex.is_(None)) | (M.sex.in_(("All", sex))))
+    if healthy:
+        query = query.filter(M.healthy_volunteers.is_(True))
+    for term in terms:
+        query = query.filter(~and_(*(_has_word(M.exclusion_keywords, w) for w in term)))
+
+    # Essais qui recrutent d'abord : chaque partie est un intervalle de la clé primaire
+    rows = []
+    for recruiting in ((1,) if recruiting_only else (1, 0)):
+        if len(rows) >= limit:
+            break
+        rows += query.filter(M.recruiting == recruiting).order_by(score.desc(), M.nct_id).limit(limit - len(rows)).all()
+    return rows
+
+def matched_keywords(row, terms):
+    """Mots du patient présents dans les critères d'inclusion d'une ligne de match_trials."""
+    text = row.inclusion_keywords or ""
+    return sorted({w for term in terms for w in term if f" {w} " in text})
+
+
+if __name__ == "__main__":
+    from services.database import init_db, session
+    parser = argparse.ArgumentParser(description="Critères d'éligibilité de /api/match")
+    parser.add_argument("--rebuild", action="store_true", help="Extrait l'éligibilité de toutes les lignes de trial_details")
+    args = parser.parse_args()
+    init_db()
+    if args.rebuild:
+        print(f"{rebuild_eligibility(session)} lignes de trial_details")
+    print(f"{session.query(func.count()).select_from(TrialEligibility).scalar()} lignes dans trial_eligibility")
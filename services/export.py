@@ -0,0 +1,139 @@
+# services/export.py
+"""
+Export de l'inventaire (/api/export) en CSV ou en Parquet, généré au fil de
+l'eau : les essais sont lus par lots de `chunk_size` lignes (yield_per, le
+curseur SQL avance au fur et à mesure) et chaque lot est écrit puis envoyé
+(bloc CSV ou row group Parquet) avant la lecture du suivant. La mémoire
+dépend de la taille d'un lot, pas du nombre de lignes exportées.
+
+Parquet nécessite le paquet optionnel `pyarrow` ; sans lui seul le CSV est
+proposé (parquet_available()). pyarrow (et numpy) n'est importé qu'au
+premier export Parquet, pas au démarrage de l'application.
+"""
+import csv
+import importlib.util
+import io
+from itertools import islice
+from sqlalchemy import Text, cast
+from models import ClinicalTrial
+from services.queries import TRIAL_COLUMNS
+
+EXPORT_FORMATS = ("csv", "parquet")
+MIMETYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Colonnes exportées, dans l'ordre ; listes jointes par LIST_SEPARATOR en CSV
+EXPORT_COLUMNS = (
+    "NCTId", "Title", "Conditions", "Interventions", "Status", "StartDate", "CompletionDate", "Locations"
+)
+LIST_SEPARATOR = "; "
+
+# Colonnes lues : celles de l'inventaire, localisations en texte JSON tel que stocké
+# (écrites telles quelles, sans décodage puis réencodage par ligne)
+EXPORT_TRIAL_COLUMNS = tuple(
+    cast(c, Text).label("locations") if c is ClinicalTrial.locations else c for c in TRIAL_COLUMNS
+)
+
+
+def parquet_available():
+    # Dépendance optionnelle : export CSV seulement sans elle
+    return importlib.util.find_spec("pyarrow") is not None
+
+def _strings(values):
+    return [str(v) for v in (values or []) if v is not None]
+
+def export_row(t):
+    """Row de EXPORT_TRIAL_COLUMNS -> valeurs des EXPORT_COLUMNS (listes Python, dates, localisations en JSON)."""
+    return (
+        t.nct_id, t.title, _strings(t.conditions), _strings(t.interventions), t.status,
+        t.start_date, t.completion_date, t.locations if t.locations not in (None, "null", "[]") else None,
+    )
+
+def chunks(rows, chunk_size):
+    """Lots successifs de `chunk_size` lignes d'un itérable."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ------------------- CSV -------------------
+def _csv_value(value):
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join(value)
+    return "" if value is None else value
+
+def csv_chunks(rows, chunk_size):
+    """Texte CSV (en-tête puis un bloc par lot) des essais de `rows`."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks(rows, chunk_size):
+        writer.writerows([_csv_value(v) for v in export_row(t)] for t in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # aucun essai : en-tête seul
+
+
+# ------------------- Parquet -------------------
+class _Drain:
+    """Fichier en écriture seule dont take() rend et oublie les octets écrits depuis l'appel précédent."""
+
+    def __init__(self):
+        self.parts, self.position, self.closed = [], 0, False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+def parquet_schema():
+    import pyarrow
+    strings = pyarrow.list_(pyarrow.string())
+    return pyarrow.schema([
+        ("NCTId", pyarrow.string()), ("Title", pyarrow.string()), ("Conditions", strings),
+        ("Interventions", strings), ("Status", pyarrow.string()), ("StartDate", pyarrow.date32()),
+        ("CompletionDate", pyarrow.date32()), ("Locations", pyarrow.string()),
+    ])
+
+def parquet_chunks(rows, chunk_size):
+    """Octets d'un fichier Parquet des essais de `rows` : un row group par lot, envoyé dès qu'il est écrit."""
+    import pyarrow
+    import pyarrow.parquet
+    schema = parquet_schema()
+    sink = _Drain()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for chunk in chunks(rows, chunk_size):
+            columns = list(zip(*(export_row(t) for t in chunk)))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.take()
+    finally:
+        # Pied de fichier (métadonnées des row groups) écrit à la fermeture
+        writer.close()
+    yield sink.take()
+
+
+def export_chunks(query, fmt, chunk_size):
+    """Morceaux (str en CSV, bytes en Parquet) de l'export des essais de `query` (Row de EXPORT_TRIAL_COLUMNS)."""
+    rows = query.yield_per(chunk_size)
+    return parquet_chunks(rows, chunk_size) if fmt == "parquet" else csv_chunks(rows, chunk_size)
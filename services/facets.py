@@ -0,0 +1,172 @@
+# services/facets.py
+"""
+Comptages par facette (statut, pays, condition, année de début) pour
+/api/facets, lus dans la table précalculée trial_facet_counts.
+
+Chaque essai compte pour toutes les combinaisons (condition, pays) de ses
+conditions et pays distincts, plus la valeur "*" de chaque dimension : un
+filtre (condition et/ou pays) se résout ainsi en une recherche d'index,
+sans parcourir clinical_trials. L'ingestion applique des deltas (anciennes
+valeurs de l'essai retirées, nouvelles ajoutées) dans la transaction qui
+écrit les essais.
+
+    python -m services.facets --rebuild     # recalcule toute la table
+"""
+import argparse
+from collections import Counter
+from sqlalchemy import bindparam, delete, func
+from sqlalchemy.dialects import sqlite
+from models import ClinicalTrial, FacetCount
+from services.queries import distinct_conditions, distinct_countries
+
+ANY = "*"            # toutes les valeurs de la dimension
+TOTAL_YEAR = -1      # ligne de total d'un couple (condition, pays)
+UNKNOWN_YEAR = 0     # date de début absente
+KEY_COLUMNS = ("condition", "country", "status", "start_year")
+
+
+# ------------------- Clés et deltas -------------------
+def facet_keys(trial):
+    """
+    Clés (condition, pays, statut, année) auxquelles contribue un essai
+    (dictionnaire status / start_date / conditions / locations).
+    """
+    status = trial.get("status") or ""
+    start = trial.get("start_date")
+    year = start.year if start else UNKNOWN_YEAR
+    keys = []
+    for condition in distinct_conditions(trial.get("conditions")) + [ANY]:
+        for country in distinct_countries(trial.get("locations")) + [ANY]:
+            keys.append((condition, country, status, year))
+            keys.append((condition, country, ANY, TOTAL_YEAR))
+    return keys
+
+def facet_delta(old_trials, new_trials):
+    """Variation des comptages quand `old_trials` sont remplacés par `new_trials`."""
+    delta = Counter()
+    for trial in new_trials:
+        delta.update(facet_keys(trial))
+    for trial in old_trials:
+        delta.subtract(facet_keys(trial))
+    return {key: n for key, n in delta.items() if n}
+
+def current_trials(db_session, nct_ids):
+    """Valeurs actuellement enregistrées des essais (avant leur réécriture)."""
+    if not nct_ids:
+        return []
+    rows = db_session.query(
+        ClinicalTrial.status, ClinicalTrial.start_date, ClinicalTrial.conditions, ClinicalTrial.locations
+    ).filter(ClinicalTrial.nct_id.in_(list(nct_ids)))
+    return [{"status": r.status, "start_date": r.start_date, "conditions": r.conditions,
+             "locations": r.locations} for r in rows]
+
+
+# ------------------- Écriture -------------------
+def apply_facet_delta(db_session, delta):
+    """
+    Ajoute `delta` aux comptages (INSERT ... ON CONFLICT DO UPDATE
+    trial_count = trial_count + n) et supprime les lignes tombées à zéro.
+    Ne commit pas : à appeler dans la transaction qui écrit les essais.
+    """
+    if not delta:
+        return
+    # Instructions sur la Table (et non le modèle) : executemany direct, sans le bulk insert de l'ORM
+    table = FacetCount.__table__
+    dialect = db_session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects import postgresql
+        stmt = postgresql.insert(table)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+    else:
+        raise NotImplementedError(f"Upsert non supporté pour le dialecte {dialect}")
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={"trial_count": table.c.trial_count + stmt.excluded.trial_count}
+    )
+    db_session.execute(stmt, [{**dict(zip(KEY_COLUMNS, key)), "trial_count": n} for key, n in delta.items()])
+
+    emptied = [dict(zip(("c", "k", "s", "y"), key)) for key, n in delta.items() if n < 0]
+    if emptied:
+        db_session.execute(delete(table).where(
+            table.c.condition == bindparam("c"), table.c.country == bindparam("k"),
+            table.c.status == bindparam("s"), table.c.start_year == bindparam("y"),
+            table.c.trial_count <= 0
+        ), emptied)
+
+def refresh_facet_counts(db_session, old_trials, new_trials):
+    apply_facet_delta(db_session, facet_delta(old_trials, new_trials))
+
+def rebuild_facet_counts(db_session, batch_size=5000):
+    """Recalcule entièrement trial_facet_counts depuis clinical_trials."""
+    counts = Counter()
+    rows = db_session.query(
+        ClinicalTrial.status, ClinicalTrial.start_date, ClinicalTrial.conditions, ClinicalTrial.locations
+    )
+    for t in rows.yield_per(batch_size):
+        counts.update(facet_keys({"status": t.status, "start_date": t.start_date,
+                                  "conditions": t.conditions, "locations": t.locations}))
+    try:
+        db_session.execute(delete(FacetCount))
+        items = list(counts.items())
+        for i in range(0, len(items), batch_size):
+            db_session.execute(FacetCount.__table__.insert(), [
+                {**dict(zip(KEY_COLUMNS, key)), "trial_count": n} for key, n in items[i:i + batch_size]
+            ])
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+    return len(counts)
+
+
+# ------------------- Lecture -------------------
+def _values(rows):
+    return [{"value": value, "count": n} for value, n in rows]
+
+def facet_counts(db_session, condition=None, country=None, limit=20):
+    """
+    Comptages des essais correspondant aux filtres. Les facettes pays et
+    condition ignorent leur propre filtre (répartition des valeurs voisines) ;
+    statut et année appliquent les deux. Un essai multi-pays (ou
+    multi-conditions) compte une fois pour chacun de ses pays.
+    """
+    condition_key, country_key = condition or ANY, country or ANY
+
+    statuses, years, total = Counter(), Counter(), 0
+    for status, year, n in db_session.query(FacetCount.status, FacetCount.start_year, FacetCount.trial_count).filter(
+        FacetCount.condition == condition_key, FacetCount.country == country_key, FacetCount.status != ANY
+    ):
+        statuses[status or None] += n
+        years[year if year != UNKNOWN_YEAR else None] += n
+        total += n
+
+    countries = db_session.query(FacetCount.country, FacetCount.trial_count).filter(
+        FacetCount.condition == condition_key, FacetCount.status == ANY, FacetCount.country != ANY
+    ).order_by(FacetCount.trial_count.desc(), FacetCount.country).limit(limit)
+    conditions = db_session.query(FacetCount.condition, FacetCount.trial_count).filter(
+        FacetCount.country == country_key, FacetCount.status == ANY, FacetCount.condition != ANY
+    ).order_by(FacetCount.trial_count.desc(), FacetCount.condition).limit(limit)
+
+    return {
+        "total": total,
+        "status": _values(sorted(statuses.items(), key=lambda kv: (-kv[1], kv[0] or ""))),
+        # Années croissantes, date inconnue en dernier
+        "start_year": _values(sorted(years.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))),
+        "country": _values(countries),
+        "condition": _values(conditions),
+    }
+
+def facet_rows(db_session):
+    return db_session.query(func.count(FacetCount.id)).scalar()
+
+
+if __name__ == "__main__":
+    from services.database import init_db, session
+    parser = argparse.ArgumentParser(description="Comptages précalculés de /api/facets")
+    parser.add_argument("--rebuild", action="store_true", help="Recalcule toute la table trial_facet_counts")
+    args = parser.parse_args()
+    init_db()
+    if args.rebuild:
+        print(f"{rebuild_facet_counts(session)} lignes de comptage")
+    print(f"{facet_rows(session)} lignes dans trial_facet_counts")
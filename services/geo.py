@@ -0,0 +1,165 @@
+# services/geo.py
+import math
+from sqlalchemy import inspect, text
+from models import ClinicalTrial
+
+# Index spatial des sites d'essai. Sous SQLite : table R*Tree dont l'id est
+# celui de trial_locations, tenue à jour par triggers. Les coordonnées
+# absentes ou à (0, 0) (valeur par défaut du Preprocessor) ne sont pas indexées.
+# Les autres bases utilisent l'index (latitude, longitude) de TrialLocation.
+RTREE_TABLE = "trial_locations_rtree"
+
+# Sites candidats de la première page, par essai demandé (les plus proches
+# d'abord) ; pages suivantes de taille doublée tant que le classement exact
+# pouvait dépendre des sites non lus
+SITES_PER_TRIAL = 4
+# Le R*Tree stocke ses coordonnées en flottants 32 bits (arrondis de l'ordre
+# du mètre) : marge retirée de la borne des sites non lus
+RTREE_SLACK_KM = 0.01
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+HAS_COORDS = "{t}.latitude IS NOT NULL AND {t}.longitude IS NOT NULL AND NOT ({t}.latitude = 0 AND {t}.longitude = 0)"
+
+RTREE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    f"""CREATE TRIGGER IF NOT EXISTS trial_locations_rtree_ai AFTER INSERT ON trial_locations
+    WHEN {HAS_COORDS.format(t='new')} BEGIN
+        INSERT INTO {RTREE_TABLE} VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trial_locations_rtree_au AFTER UPDATE OF latitude, longitude ON trial_locations BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+        INSERT INTO {RTREE_TABLE} SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE {HAS_COORDS.format(t='new')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trial_locations_rtree_ad AFTER DELETE ON trial_locations BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+    END""",
+]
+
+RTREE_BACKFILL = f"""INSERT INTO {RTREE_TABLE}
+    SELECT id, latitude, latitude, longitude, longitude FROM trial_locations t WHERE {HAS_COORDS.format(t='t')}"""
+
+def init_geo_index(engine):
+    """Crée l'index R*Tree et ses triggers (SQLite uniquement) et l'alimente s'il est nouveau."""
+    if engine.dialect.name != "sqlite":
+        return False
+    created = not inspect(engine).has_table(RTREE_TABLE)
+    with engine.begin() as conn:
+        for ddl in RTREE_DDL:
+            conn.exec_driver_sql(ddl)
+        if created:
+            conn.exec_driver_sql(RTREE_BACKFILL)
+    return True
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def bounding_boxes(lat, lon, radius_km):
+    """
+    Rectangles (min_lat, max_lat, min_lon, max_lon) couvrant le cercle ; deux
+    rectangles quand il traverse l'antiméridien.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if cos_lat <= 1e-6 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    dlon = radius_km / (KM_PER_DEGREE * cos_lat)
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return [(min_lat, max_lat, min_lon + 360, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
+
+def _candidates_sql(box_count, with_condition, use_rtree):
+    """
+    Page (:limit, :offset) des sites des rectangles triés par une borne
+    inférieure de leur distance (équirectangulaire au cosinus de la latitude
+    la plus éloignée de l'équateur, arithmétique seule, évaluée par la base),
+    puis par id : l'ordre reste le même d'une page à l'autre. Sous SQLite, la distance est calculée sur les coordonnées du R*Tree :
+    sans filtre de condition, seuls les sites de la page sont lus dans
+    trial_locations.
+    """
+    if use_rtree:
+        lat, lon = "r.min_lat", "r.min_lon"
+        box = "(r.min_lat <= :max_lat{i} AND r.max_lat >= :min_lat{i} AND r.min_lon <= :max_lon{i} AND r.max_lon >= :min_lon{i})"
+    else:
+        lat, lon = "l.latitude", "l.longitude"
+        box = "(l.latitude BETWEEN :min_lat{i} AND :max_lat{i} AND l.longitude BETWEEN :min_lon{i} AND :max_lon{i})"
+    where = " OR ".join(box.format(i=i) for i in range(box_count))
+    # Écart en longitude ramené dans [-180, 180] pour les cercles à cheval sur l'antiméridien
+    dlon = f"(CASE WHEN {lon} - :lon > 180 THEN {lon} - :lon - 360 " \
+           f"WHEN {lon} - :lon < -180 THEN {lon} - :lon + 360 ELSE {lon} - :lon END)"
+    d2 = f"(({lat} - :lat) * ({lat} - :lat) + {dlon} * {dlon} * :cos2)"
+    columns = "l.nct_id, l.facility, l.city, l.country, l.latitude, l.longitude"
+    if use_rtree and not with_condition:
+        return f"""
+            WITH page AS (
+                SELECT r.id, {d2} AS d2 FROM {RTREE_TABLE} r
+                WHERE ({where}) AND {d2} <= :max_d2
+                ORDER BY d2, r.id LIMIT :limit OFFSET :offset
+            )
+            SELECT {columns}, page.d2 FROM page JOIN trial_locations l ON l.id = page.id
+            ORDER BY page.d2, page.id
+        """
+    source = f"{RTREE_TABLE} r JOIN trial_locations l ON l.id = r.id" if use_rtree else "trial_locations l"
+    if with_condition:
+        where = f"({where}) AND EXISTS (SELECT 1 FROM trial_conditions c WHERE c.condition = :condition AND c.nct_id = l.nct_id)"
+    return f"""
+        SELECT {columns}, {d2} AS d2
+        FROM {source}
+        WHERE ({where}) AND {d2} <= :max_d2
+        ORDER BY d2, l.id LIMIT :limit OFFSET :offset
+    """
+
+def _nearest_sites(rows, lat, lon, radius_km):
+    """Site le plus proche (distance exacte) de chaque essai à moins de `radius_km` : [(distance, site)] triés."""
+    nearest = {}
+    for row in rows:
+        distance = haversine_km(lat, lon, row.latitude, row.longitude)
+        if distance <= radius_km and (row.nct_id not in nearest or distance < nearest[row.nct_id][0]):
+            nearest[row.nct_id] = (distance, row)
+    return sorted(nearest.values(), key=lambda s: s[0])
+
+def nearby_trials(db_session, lat, lon, radius_km, condition=None, limit=50):
+    """
+    Essais ayant un site à moins de `radius_km` de (lat, lon), triés par
+    distance du site le plus proche. Renvoie [(ClinicalTrial, site, distance_km)].
+    """
+    boxes = bounding_boxes(lat, lon, radius_km)
+    # Cosinus minimal sur la bande de latitudes couverte (comme bounding_boxes) : la
+    # distance approchée ne dépasse jamais la distance réelle, aux hautes latitudes comprises
+    min_lat, max_lat = boxes[0][0], boxes[0][1]
+    cos_lat = max(0.0, min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat))))
+    params = {"lat": lat, "lon": lon, "cos2": cos_lat ** 2,
+              # Marge de 2 % pour les arrondis, la distance exacte est recalculée ensuite
+              "max_d2": (radius_km * 1.02 / KM_PER_DEGREE) ** 2, "condition": condition}
+    for i, (min_lat, max_lat, min_lon, max_lon) in enumerate(boxes):
+        params.update({f"min_lat{i}": min_lat, f"max_lat{i}": max_lat, f"min_lon{i}": min_lon, f"max_lon{i}": max_lon})
+    use_rtree = db_session.get_bind().dialect.name == "sqlite"
+    sql = text(_candidates_sql(len(boxes), bool(condition), use_rtree))
+    slack = RTREE_SLACK_KM if use_rtree else 0.0
+
+    rows, page = [], limit * SITES_PER_TRIAL
+    while True:
+        params.update({"limit": page, "offset": len(rows)})
+        batch = db_session.execute(sql, params).fetchall()
+        rows += batch
+        sites = _nearest_sites(rows, lat, lon, radius_km)[:limit]
+        if len(batch) < page:
+            break
+        # Sites non lus à au moins `bound` km : le classement n'est sûr que si le dernier essai retenu est plus proche
+        bound = math.sqrt(batch[-1].d2) * KM_PER_DEGREE - slack
+        if len(sites) == limit and sites[-1][0] <= bound:
+            break
+        page *= 2
+
+    trials = {t.nct_id: t for t in db_session.query(ClinicalTrial).filter(
+        ClinicalTrial.nct_id.in_([row.nct_id for _, row in sites]))}
+    return [(trials[row.nct_id], row, distance) for distance, row in sites if row.nct_id in trials]
@@ -0,0 +1,274 @@
+# services/geocoding.py
+"""
+Étape de géocodage des localisations d'essais, hors du chemin des requêtes.
+Les adresses (établissement, ville, code postal, pays) sont dédupliquées sur
+tout le lot, cherchées dans la table geocode_cache, et seules les adresses
+inconnues sont envoyées au géocodeur (appels parallèles bornés et limités en
+débit). Chaque adresse n'est donc géocodée qu'une fois, tous runs confondus.
+
+    python -m services.geocoding                      # localisations sans coordonnées
+    python -m services.geocoding --geocoder local --local-file coords.json
+"""
+import argparse
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import or_, and_, update
+from config import settings
+from models import GeocodeCache, TrialLocation
+from services.clinical_trials import RateLimiter
+from services.database import batches, session, touch_trials, upsert_rows
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------- Adresses -------------------
+def normalize_address(facility=None, city=None, zip_code=None, country=None):
+    """(établissement, ville, code postal, pays) nettoyés ; 'N/A' et None -> ''."""
+    return tuple("" if not part or part == "N/A" else " ".join(str(part).split())
+                 for part in (facility, city, zip_code, country))
+
+def address_key(address):
+    return hashlib.sha1("\x1f".join(address).lower().encode("utf-8")).hexdigest()
+
+def is_geocodable(address):
+    return bool(address[1] or address[3])
+
+def has_coordinates(lat, lon):
+    """Même règle que l'index spatial : None ou (0, 0) = coordonnées absentes."""
+    return lat is not None and lon is not None and not (lat == 0 and lon == 0)
+
+
+# ------------------- Géocodeurs -------------------
+# Interface commune : geocode(address) -> (lat, lon) ou None si introuvable ;
+# une exception signale un échec temporaire (l'adresse sera retentée).
+class GeopyGeocoder:
+    """Service geopy (Nominatim, GoogleV3, ...). Repli sur la ville si l'adresse complète est inconnue."""
+
+    def __init__(self, service="nominatim", api_key=None, user_agent=None, timeout=10):
+        from geopy.geocoders import get_geocoder_for_service
+        options = {"user_agent": user_agent or settings.GEOCODING_USER_AGENT, "timeout": timeout}
+        if api_key:
+            options["api_key"] = api_key
+        self.client = get_geocoder_for_service(service)(**options)
+        self.name = service
+
+    def geocode(self, address):
+        facility, city, zip_code, country = address
+        place = ", ".join(p for p in (" ".join(p for p in (zip_code, city) if p), country) if p)
+        queries = [", ".join(p for p in (facility, place) if p), place] if facility else [place]
+        for query in queries:
+            location = self.client.geocode(query, exactly_one=True)
+            if location is not None:
+                return location.latitude, location.longitude
+        return None
+
+
+class LocalGeocoder:
+    """
+    Géocodeur hors ligne (tests, benchmarks, environnements sans réseau) :
+    table {"ville|pays": [lat, lon]} ; `latency` simule un service distant.
+    """
+
+    def __init__(self, table, latency=0.0, name="local"):
+        self.table = {k.lower(): tuple(v) for k, v in table.items()}
+        self.latency = latency
+        self.name = name
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, **options):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **options)
+
+    def geocode(self, address):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.table.get(f"{address[1]}|{address[3]}".lower())
+
+
+def make_geocoder(name=None):
+    """Géocodeur configuré par settings.GEOCODER (None pour 'none')."""
+    name = (name or settings.GEOCODER).lower()
+    if name == "none":
+        return None
+    if name == "local":
+        if not settings.GEOCODING_LOCAL_FILE:
+            raise ValueError("GEOCODING_LOCAL_FILE est requis pour le géocodeur 'local'")
+        return LocalGeocoder.from_file(settings.GEOCODING_LOCAL_FILE)
+    return GeopyGeocoder(name, api_key=settings.GEOCODING_API_KEY, timeout=settings.GEOCODING_TIMEOUT)
+
+
+# ------------------- Étape de géocodage -------------------
+class GeocodeReport:
+    """Compteurs d'un run : adresses distinctes, hits du cache, résolues, introuvables, en échec."""
+
+    def __init__(self):
+        self.addresses = self.cache_hits = self.resolved = self.not_found = self.failed = 0
+        self.updated_locations = 0
+        self.started = time.perf_counter()
+
+    @property
+    def hit_rate(self):
+        return self.cache_hits / self.addresses if self.addresses else 0.0
+
+    def as_dict(self):
+        return {
+            "addresses": self.addresses, "cache_hits": self.cache_hits, "hit_rate": round(self.hit_rate, 4),
+            "resolved": self.resolved, "not_found": self.not_found, "failed": self.failed,
+            "updated_locations": self.updated_locations,
+            "seconds": round(time.perf_counter() - self.started, 2),
+        }
+
+    def __str__(self):
+        return ", ".join(f"{k}={v}" for k, v in self.as_dict().items())
+
+
+def _load_cached(db_session, keys, batch_size):
+    cached = {}
+    for chunk in batches(keys, batch_size):
+        for row in db_session.query(GeocodeCache.address_key, GeocodeCache.latitude, GeocodeCache.longitude) \
+                             .filter(GeocodeCache.address_key.in_(chunk)):
+            cached[row.address_key] = (row.latitude, row.longitude) if row.latitude is not None else None
+    return cached
+
+def geocode_addresses(addresses, geocoder, db_session=None, max_workers=None, rate_limit=None,
+                      batch_size=500, report=None):
+    """
+    Coordonnées de chaque adresse normalisée : {address_key: (lat, lon) ou None}.
+    Le cache est consulté d'abord ; les adresses inconnues sont géocodées en
+    parallèle puis enregistrées (y compris les introuvables). Les échecs ne
+    sont pas enregistrés et seront retentés au prochain run.
+    """
+    db_session = db_session or session
+    report = report or GeocodeReport()
+    unique = {address_key(a): a for a in addresses if is_geocodable(a)}
+    report.addresses += len(unique)
+
+    results = _load_cached(db_session, list(unique), batch_size)
+    report.cache_hits += len(results)
+    missing = [(key, address) for key, address in unique.items() if key not in results]
+    if not missing or geocoder is None:
+        return results
+
+    limiter = RateLimiter(settings.GEOCODING_RATE_LIMIT if rate_limit is None else rate_limit)
+
+    def resolve(item):
+        key, address = item
+        limiter.acquire()
+        try:
+            return key, address, geocoder.geocode(address), None
+        except Exception as e:
+            return key, address, None, e
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=max_workers or settings.GEOCODING_MAX_WORKERS) as executor:
+        for key, address, coords, error in executor.map(resolve, missing):
+            if error is not None:
+                report.failed += 1
+                logger.warning(f"[Geocoding] Échec pour '{', '.join(p for p in address if p)}': {error}")
+                continue
+            results[key] = coords
+            if coords:
+                report.resolved += 1
+            else:
+                report.not_found += 1
+            rows.append({
+                "address_key": key, "facility": address[0], "city": address[1], "zip_code": address[2],
+                "country": address[3], "latitude": coords[0] if coords else None,
+                "longitude": coords[1] if coords else None, "provider": geocoder.name
+            })
+
+    for chunk in batches(rows, batch_size):
+        try:
+            upsert_rows(db_session, GeocodeCache, chunk, key="address_key")
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+    return results
+
+def geocode_locations(locations, geocoder=None, db_session=None, report=None, max_workers=None, rate_limit=None):
+    """
+    Étape du pipeline d'ingestion : complète en place les localisations
+    prétraitées (Preprocessor.process_locations) sans coordonnées, avant
+    bulk_replace_locations. Renvoie le GeocodeReport du lot.
+    """
+    report = report or GeocodeReport()
+    pending = [(loc, normalize_address(loc.get("Facility"), loc.get("City"), loc.get("Zip"), loc.get("Country")))
+               for loc in locations if not has_coordinates(loc.get("Latitude"), loc.get("Longitude"))]
+    results = geocode_addresses([a for _, a in pending], geocoder, db_session, max_workers=max_workers,
+                                rate_limit=rate_limit, report=report)
+    for loc, address in pending:
+        coords = results.get(address_key(address))
+        if coords:
+            loc["Latitude"], loc["Longitude"] = coords
+            report.updated_locations += 1
+    return report
+
+def geocode_stored_locations(geocoder=None, db_session=None, batch_size=None, report=None,
+                             max_workers=None, rate_limit=None):
+    """
+    Géocode les lignes de trial_locations sans coordonnées, par lots de
+    `batch_size` (parcours par id croissant). Les essais modifiés sont
+    marqués (updated_at) pour invalider le cache de réponses.
+    """
+    db_session = db_session or session
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    report = report or GeocodeReport()
+    missing_coords = or_(
+        TrialLocation.latitude.is_(None), TrialLocation.longitude.is_(None),
+        and_(TrialLocation.latitude == 0, TrialLocation.longitude == 0)
+    )
+    last_id = 0
+    while True:
+        rows = db_session.query(
+            TrialLocation.id, TrialLocation.nct_id, TrialLocation.facility,
+            TrialLocation.city, TrialLocation.zip_code, TrialLocation.country
+        ).filter(missing_coords, TrialLocation.id > last_id).order_by(TrialLocation.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        addresses = {row.id: normalize_address(row.facility, row.city, row.zip_code, row.country) for row in rows}
+        results = geocode_addresses(addresses.values(), geocoder, db_session, max_workers=max_workers,
+                                    rate_limit=rate_limit, batch_size=batch_size, report=report)
+
+        updates, touched = [], set()
+        for row in rows:
+            coords = results.get(address_key(addresses[row.id]))
+            if coords:
+                updates.append({"id": row.id, "latitude": coords[0], "longitude": coords[1]})
+                touched.add(row.nct_id)
+        if not updates:
+            continue
+        try:
+            db_session.execute(update(TrialLocation), updates)
+            touch_trials(db_session, list(touched))
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        report.updated_locations += len(updates)
+    logger.info(f"[Geocoding] {report}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Géocode les localisations sans coordonnées")
+    parser.add_argument("--geocoder", default=None, help="nominatim, googlev3, ..., local (défaut : GEOCODER)")
+    parser.add_argument("--local-file", default=None, help="Table JSON du géocodeur 'local'")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.local_file:
+        geocoder = LocalGeocoder.from_file(args.local_file)
+    else:
+        geocoder = make_geocoder(args.geocoder)
+    report = geocode_stored_locations(geocoder, batch_size=args.batch_size)
+    print(json.dumps(report.as_dict(), indent=2))
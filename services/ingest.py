@@ -0,0 +1,380 @@
+# services/ingest.py
+"""
+Ingestion en masse d'études FullStudies, en pipeline à trois étapes reliées
+par des files bornées (un étage lent fait attendre les précédents) :
+
+1. fetch : threads concurrents (E/S) qui lisent des pages de l'API ou des
+   fichiers d'un répertoire local ;
+2. parse : décodage JSON et prétraitement (Preprocessor, compression des
+   détails) dans un pool de process ;
+3. écriture : un seul écrivain qui charge les lots par upserts en masse
+   (services/database.py), une transaction par lot.
+
+    python -m services.ingest --dir dumps/
+    python -m services.ingest --expr "diabetes" --max-studies 5000
+    python -m services.ingest --ids-file nct_ids.txt
+
+Un répertoire local contient des fichiers .json (ou .json.gz) : une étude,
+une liste d'études ou une réponse FullStudies par fichier, comme ceux que
+sert services/ctgov_stub.py. L'avancement est journalisé toutes les
+--progress secondes ; le rapport final donne le débit de chaque étape.
+"""
+import argparse
+import gzip
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import requests
+from config import settings
+from services.preprocessor import payload_studies, study_nct_id
+from services.sync import prepare_studies, write_prepared
+
+logger = logging.getLogger(__name__)
+
+DONE = object()  # fin de flux, transmise d'une étape à la suivante
+
+
+class StageStats:
+    """
+    Compteurs d'une étape : éléments traités (`unit` : études, ou fichiers
+    pour la lecture d'un répertoire), lots, temps de travail cumulé, erreurs.
+    """
+
+    def __init__(self, name, unit="studies"):
+        self.name, self.unit = name, unit
+        self.count = self.batches = self.errors = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, count, seconds, errors=0):
+        with self.lock:
+            self.count += count
+            self.batches += 1
+            self.busy += seconds
+            self.errors += errors
+
+    def as_dict(self, elapsed):
+        return {
+            self.unit: self.count, "batches": self.batches, "errors": self.errors,
+            "busy_seconds": round(self.busy, 2),
+            f"{self.unit}_per_second": round(self.count / elapsed, 1) if elapsed else None,
+        }
+
+
+class IngestReport:
+    def __init__(self, source, fetch_unit="studies"):
+        self.source = source
+        self.stages = {"fetch": StageStats("fetch", fetch_unit), "parse": StageStats("parse"),
+                       "write": StageStats("write")}
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        elapsed = self.elapsed or time.perf_counter() - self.started
+        return {
+            "source": self.source, "elapsed_seconds": round(elapsed, 2),
+            **{name: stats.as_dict(elapsed) for name, stats in self.stages.items()},
+        }
+
+    def __str__(self):
+        return ", ".join(f"{name}={stats.count} {stats.unit}" for name, stats in self.stages.items())
+
+
+# ------------------- Sources (étape fetch) -------------------
+# Une source = itérateur de tâches + fetch(tâche) -> études décodées, ou contenus de fichiers
+# (unit = "files" : l'étape fetch compte alors des fichiers). Les threads fetch se partagent
+# l'itérateur ; `exhausted` arrête les sources paginées dont la fin n'est pas connue à l'avance.
+class DirectorySource:
+    """Fichiers d'un répertoire (récursif), regroupés en lots d'environ `batch_bytes` octets."""
+
+    unit = "files"
+
+    def __init__(self, directory, batch_bytes=2 * 1024 * 1024):
+        paths = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(directory)
+            for name in names if name.endswith((".json", ".json.gz"))
+        )
+        # Lots par taille plutôt que par nombre : un fichier peut contenir une étude ou une page de 100
+        batches, current, size = [], [], 0
+        for path in paths:
+            current.append(path)
+            size += os.path.getsize(path)
+            if size >= batch_bytes:
+                batches.append(current)
+                current, size = [], 0
+        if current:
+            batches.append(current)
+        self.label = f"dir:{directory}"
+        self.tasks = iter(batches)
+        self.exhausted = threading.Event()
+
+    def fetch(self, paths):
+        # Contenus bruts : décodage JSON et décompression se font dans le pool de parse
+        contents = []
+        for path in paths:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        return contents
+
+
+class ExprSource:
+    """Pages successives de full_studies(expr) ; la première page incomplète arrête la source."""
+
+    unit = "studies"
+
+    def __init__(self, client, expr, page_size, max_studies=None):
+        self.client, self.expr, self.page_size = client, expr, page_size
+        ranks = itertools.count(1, page_size)
+        if max_studies:
+            ranks = itertools.takewhile(lambda rank: rank <= max_studies, ranks)
+        self.label = f"expr:{expr}"
+        self.max_studies = max_studies
+        self.tasks = ranks
+        self.exhausted = threading.Event()
+
+    def fetch(self, start):
+        end = start + self.page_size - 1
+        if self.max_studies:
+            end = min(end, self.max_studies)
+        page = self.client.full_studies(self.expr, min_rnk=start, max_rnk=end)
+        if len(page) < end - start + 1:
+            self.exhausted.set()
+        return page
+
+
+class IdsSource:
+    """Études de NCT IDs connus, par lots `expr=NCT1 OR NCT2 ...`."""
+
+    unit = "studies"
+
+    def __init__(self, client, nct_ids):
+        self.client = client
+        self.label = f"ids:{len(nct_ids)}"
+        self.tasks = iter(client._batches(nct_ids))
+        self.exhausted = threading.Event()
+
+    def fetch(self, batch):
+        return self.client.full_studies(" OR ".join(batch), max_rnk=len(batch))
+
+
+# ------------------- Étape parse (pool de process) -------------------
+def parse_batch(items):
+    """
+    Contenus de fichiers (octets) ou études déjà décodées -> lignes à écrire
+    (prepare_studies). Exécutée dans un process du pool : renvoie aussi le
+    temps passé et les erreurs de décodage.
+    """
+    started = time.perf_counter()
+    studies, errors = [], 0
+    for item in items:
+        if isinstance(item, bytes):
+            try:
+                if item[:2] == b"\x1f\x8b":
+                    item = gzip.decompress(item)
+                studies.extend(payload_studies(json.loads(item)))
+            except (OSError, ValueError) as e:
+                logger.error(f"[Ingest] Erreur de décodage d'un fichier : {e}")
+                errors += 1
+        else:
+            studies.append(item)
+    studies = [s for s in studies if isinstance(s, dict) and study_nct_id(s)]
+    return prepare_studies(studies), time.perf_counter() - started, errors
+
+
+# ------------------- Pipeline -------------------
+def _put(target, item, stop):
+    """put bloquant (file bornée) qui abandonne si le pipeline est arrêté."""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(source, stop, timeout=0.5):
+    while not stop.is_set():
+        try:
+            return source.get(timeout=timeout)
+        except queue.Empty:
+            continue
+    return DONE
+
+
+class IngestPipeline:
+    """
+    fetch (threads) -> file bornée -> parse (pool de process) -> file bornée
+    -> écrivain unique (thread appelant). `parse_workers=0` prétraite dans le
+    thread de l'étape parse, sans pool. Par défaut, un process par CPU moins
+    celui de l'écrivain : sur une machine à un CPU, pas de pool (le transfert
+    des lots entre process coûterait plus qu'il ne rapporte).
+    """
+
+    def __init__(self, source, fetch_workers=None, parse_workers=None, queue_size=8,
+                 db_session=None, progress_every=5.0):
+        self.source = source
+        self.fetch_workers = fetch_workers or settings.CT_GOV_MAX_WORKERS
+        self.parse_workers = max(0, (os.cpu_count() or 1) - 1) if parse_workers is None else parse_workers
+        self.fetched = queue.Queue(maxsize=queue_size)
+        self.parsed = queue.Queue(maxsize=queue_size)
+        self.db_session = db_session
+        self.progress_every = progress_every
+        self.stop = threading.Event()
+        self.task_lock = threading.Lock()
+        self.report = IngestReport(source.label, source.unit)
+
+    def _next_task(self):
+        with self.task_lock:
+            if self.source.exhausted.is_set():
+                return None
+            return next(self.source.tasks, None)
+
+    def _fetch_worker(self):
+        stats = self.report.stages["fetch"]
+        while not self.stop.is_set():
+            task = self._next_task()
+            if task is None:
+                return
+            started = time.perf_counter()
+            try:
+                items = self.source.fetch(task)
+            except (requests.RequestException, OSError) as e:
+                logger.error(f"[Ingest] Erreur de lecture ({task if not isinstance(task, list) else task[0]}...): {e}")
+                stats.add(0, time.perf_counter() - started, errors=1)
+                continue
+            stats.add(len(items), time.perf_counter() - started)
+            if items and not _put(self.fetched, items, self.stop):
+                return
+
+    def _fetch_stage(self):
+        workers = [threading.Thread(target=self._fetch_worker, daemon=True) for _ in range(self.fetch_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        _put(self.fetched, DONE, self.stop)
+
+    def _parse_stage(self):
+        stats = self.report.stages["parse"]
+
+        def forward(result):
+            prepared, seconds, errors = result
+            stats.add(len(prepared["nct_ids"]), seconds, errors)
+            return _put(self.parsed, prepared, self.stop)
+
+        try:
+            if not self.parse_workers:
+                while (items := _get(self.fetched, self.stop)) is not DONE:
+                    if not forward(parse_batch(items)):
+                        return
+                return
+            # Lots en vol bornés : au-delà, on attend le plus ancien (l'ordre d'arrivée est conservé)
+            # forkserver : pas de fork d'un process dont les threads fetch tiennent des verrous
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=context) as pool:
+                pending = deque()
+                while (items := _get(self.fetched, self.stop)) is not DONE:
+                    pending.append(pool.submit(parse_batch, items))
+                    if len(pending) >= self.parse_workers * 2 and not forward(pending.popleft().result()):
+                        return
+                while pending and not self.stop.is_set():
+                    if not forward(pending.popleft().result()):
+                        return
+        except Exception as e:
+            logger.error(f"[Ingest] Erreur de prétraitement : {e}")
+            self.stop.set()
+        finally:
+            _put(self.parsed, DONE, self.stop)
+
+    def _log_progress(self):
+        elapsed = time.perf_counter() - self.report.started
+        fetch, written = self.report.stages["fetch"], self.report.stages["write"].count
+        logger.info(
+            f"[Ingest] {elapsed:.0f}s : lues {fetch.count} ({fetch.unit}), "
+            f"prétraitées {self.report.stages['parse'].count}, écrites {written} "
+            f"({written / elapsed:.0f}/s) ; files {self.fetched.qsize()}/{self.parsed.qsize()}"
+        )
+
+    def run(self):
+        """Exécute le pipeline jusqu'à épuisement de la source ; renvoie le rapport."""
+        stats = self.report.stages["write"]
+        stages = [threading.Thread(target=self._fetch_stage, daemon=True),
+                  threading.Thread(target=self._parse_stage, daemon=True)]
+        for stage in stages:
+            stage.start()
+        next_progress = time.perf_counter() + self.progress_every
+        try:
+            while True:
+                try:
+                    prepared = self.parsed.get(timeout=min(self.progress_every, 1.0))
+                except queue.Empty:
+                    prepared = None
+                if time.perf_counter() >= next_progress:
+                    self._log_progress()
+                    next_progress += self.progress_every
+                if prepared is DONE:
+                    break
+                if prepared is None:
+                    if self.stop.is_set():
+                        break
+                    continue
+                started = time.perf_counter()
+                try:
+                    count = write_prepared(prepared, self.db_session)
+                    stats.add(count, time.perf_counter() - started)
+                except Exception as e:
+                    # Le lot est annulé (rollback dans les fonctions bulk) ; on passe au suivant
+                    logger.error(f"[Ingest] Erreur d'écriture d'un lot de {len(prepared['nct_ids'])} études : {e}")
+                    stats.add(0, time.perf_counter() - started, errors=len(prepared["nct_ids"]))
+        finally:
+            self.stop.set()
+            for stage in stages:
+                stage.join()
+            self.report.elapsed = time.perf_counter() - self.report.started
+        logger.info(f"[Ingest] Terminé en {self.report.elapsed:.1f}s : {self.report}")
+        return self.report
+
+
+def ingest(source, **options):
+    return IngestPipeline(source, **options).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion en masse d'études ClinicalTrials.gov")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--dir", help="Répertoire de fichiers JSON FullStudies (hors ligne)")
+    group.add_argument("--expr", help="Requête expr de l'API (ex: diabetes)")
+    group.add_argument("--ids-file", help="Fichier de NCT IDs, un par ligne")
+    parser.add_argument("--max-studies", type=int, default=None, help="Études max avec --expr")
+    parser.add_argument("--page-size", type=int, default=None, help="Études par page API")
+    parser.add_argument("--batch-kb", type=int, default=2048, help="Taille (Ko) d'un lot de fichiers avec --dir")
+    parser.add_argument("--fetch-workers", type=int, default=None)
+    parser.add_argument("--parse-workers", type=int, default=None, help="Process de prétraitement (0 = sans pool)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Lots en attente max entre deux étapes")
+    parser.add_argument("--progress", type=float, default=5.0, help="Intervalle (s) des messages d'avancement")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from services.database import init_db
+    init_db()
+    page_size = args.page_size or settings.SYNC_PAGE_SIZE
+    if args.dir:
+        source = DirectorySource(args.dir, args.batch_kb * 1024)
+    else:
+        from services.clinical_trials import get_client
+        if args.expr:
+            source = ExprSource(get_client(), args.expr, page_size, args.max_studies)
+        else:
+            with open(args.ids_file, encoding="utf-8") as f:
+                source = IdsSource(get_client(), [line.strip() for line in f if line.strip()])
+    report = ingest(source, fetch_workers=args.fetch_workers, parse_workers=args.parse_workers,
+                    queue_size=args.queue_size, progress_every=args.progress)
+    print(json.dumps(report.as_dict(), indent=2))
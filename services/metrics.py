@@ -0,0 +1,286 @@
+# services/metrics.py
+"""
+Métriques de l'API au format texte Prometheus, servies par /metrics.
+
+Par route (règle Flask, ex: /api/trial/<string:nct_id>) : nombre de
+requêtes par statut HTTP, histogrammes de latence totale, de temps passé en
+base et de nombre de requêtes SQL, requêtes en erreur (statut 5xx ou erreur
+journalisée pendant la requête, les routes répondant 200 avec
+{"status": "error"}). Le temps d'attente avant traitement est lu dans
+l'en-tête X-Request-Start posé par le proxy (nginx : "t=${msec}").
+
+Les requêtes SQL plus lentes que SLOW_QUERY_MS sont journalisées avec leur
+plan d'exécution (EXPLAIN QUERY PLAN sous SQLite, EXPLAIN sous PostgreSQL).
+Le chronométrage des requêtes SQL (temps en base par route, requêtes lentes)
+se désactive par METRICS_SQL_TIMING : aucun événement n'est alors branché
+sur l'engine.
+
+Pour rester sous quelques µs par requête HTTP, les mesures sont empilées
+telles quelles et ne sont agrégées dans les compteurs qu'au rendu de
+/metrics (ou tous les FLUSH_EVERY requêtes).
+
+Les valeurs sont propres à chaque process : avec plusieurs workers
+gunicorn, chaque worker expose ses propres compteurs. Une seule instance
+par engine : une application recréée sur le même engine (create_app appelé
+deux fois) reprend les compteurs et les événements déjà branchés.
+"""
+import bisect
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+FLUSH_EVERY = 1024
+
+
+# ------------------- Types de métriques -------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}" for labels, v in items]
+        return lines
+
+
+class Histogram:
+    """Histogramme à seuils fixes ; les compteurs par seuil sont cumulés au rendu."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [compteurs par seuil (+Inf en dernier), somme]
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((labels, list(counts), total) for labels, (counts, total) in self.values.items())
+        names = self.labelnames + ("le",)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+# ------------------- Métriques de l'API -------------------
+class Metrics:
+    def __init__(self, slow_query_ms=250.0, sql_timing=True):
+        self.enabled = True
+        self.sql_timing = sql_timing
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.requests = Counter("http_requests_total", "Requêtes HTTP traitées", ("route", "method", "status"))
+        self.errors = Counter("http_request_errors_total", "Requêtes en erreur (5xx ou erreur journalisée)", ("route",))
+        self.latency = Histogram("http_request_duration_seconds", "Durée de traitement d'une requête", ("route",))
+        self.db_time = Histogram("http_request_db_seconds", "Temps passé en base par requête", ("route",))
+        self.db_queries = Histogram("http_request_db_queries", "Requêtes SQL par requête HTTP", ("route",),
+                                    buckets=QUERY_COUNT_BUCKETS)
+        self.queue_time = Histogram("http_request_queue_seconds", "Attente entre le proxy et le worker (X-Request-Start)")
+        self.sql_queries = Counter("db_queries_total", "Requêtes SQL exécutées")
+        self.sql_latency = Histogram("db_query_duration_seconds", "Durée d'une requête SQL")
+        self.slow_queries = Counter("db_slow_queries_total", "Requêtes SQL au-delà du seuil SLOW_QUERY_MS")
+        self.local = threading.local()
+        # Mesures pas encore agrégées ; deque.append et popleft sont sûrs entre threads
+        self.pending_requests = deque()
+        self.pending_queries = deque()
+
+    def render(self):
+        self.flush()
+        lines = []
+        for metric in (self.requests, self.errors, self.latency, self.db_time, self.db_queries, self.queue_time,
+                       self.sql_queries, self.sql_latency, self.slow_queries):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Agrège les mesures en attente dans les compteurs et histogrammes."""
+        pending = self.pending_requests
+        while pending:
+            try:
+                route, method, status, elapsed, queued, db_queries, db_seconds, failed = pending.popleft()
+            except IndexError:
+                break
+            self.requests.inc((route, method, str(status)))
+            self.latency.observe(elapsed, (route,))
+            if queued is not None:
+                self.queue_time.observe(queued)
+            if self.sql_timing:
+                self.db_time.observe(db_seconds, (route,))
+                self.db_queries.observe(db_queries, (route,))
+            if failed or status >= 500:
+                self.errors.inc((route,))
+        pending = self.pending_queries
+        while pending:
+            try:
+                elapsed = pending.popleft()
+            except IndexError:
+                break
+            self.sql_queries.inc()
+            self.sql_latency.observe(elapsed)
+
+    # ------------------- Requêtes HTTP -------------------
+    def start_request(self):
+        if not self.enabled:
+            return
+        state = self.local
+        state.started = time.perf_counter()
+        state.db_queries, state.db_seconds = 0, 0.0
+        state.queued = queue_seconds(request.environ.get("HTTP_X_REQUEST_START"))
+
+    def end_request(self, response):
+        state = self.local
+        started = getattr(state, "started", None)
+        if not self.enabled or started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        state.started = None
+        rule = request.url_rule
+        self.pending_requests.append((
+            rule.rule if rule else "<unmatched>", request.method, response.status_code, elapsed, state.queued,
+            state.db_queries, state.db_seconds, g.pop("metrics_failed", False)
+        ))
+        if len(self.pending_requests) >= FLUSH_EVERY:
+            self.flush()
+        return response
+
+    # ------------------- Requêtes SQL -------------------
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("metrics_started")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        if not self.enabled:
+            return
+        self.pending_queries.append(elapsed)
+        if len(self.pending_queries) >= FLUSH_EVERY:
+            self.flush()
+        state = self.local
+        if getattr(state, "started", None) is not None:
+            state.db_queries += 1
+            state.db_seconds += elapsed
+        if elapsed >= self.slow_query_seconds:
+            self.slow_queries.inc()
+            plan = "" if executemany else explain(conn, statement, parameters)
+            logger.warning(f"[Metrics] Requête lente ({elapsed * 1000:.0f} ms) : {statement} {parameters!r}{plan}")
+
+    def handle_error(self, context):
+        # Requête SQL en échec : after_cursor_execute ne sera pas appelé
+        stack = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+class ErrorLogHandler(logging.Handler):
+    """Marque la requête HTTP en cours comme en erreur dès qu'une erreur est journalisée."""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        if has_request_context():
+            g.metrics_failed = True
+
+
+# Un seul gestionnaire sur le logger racine, quel que soit le nombre d'applications
+_error_handler = ErrorLogHandler()
+# Métriques déjà branchées sur chaque engine
+_engine_metrics = weakref.WeakKeyDictionary()
+
+
+def queue_seconds(header):
+    """Attente depuis X-Request-Start ("t=<s>", en ms ou en µs) ; None si absent ou invalide."""
+    if not header:
+        return None
+    try:
+        value = float(header.strip().removeprefix("t="))
+    except ValueError:
+        return None
+    if value > 1e14:
+        value /= 1e6
+    elif value > 1e11:
+        value /= 1e3
+    queued = time.time() - value
+    return queued if queued >= 0 else None
+
+
+def explain(conn, statement, parameters):
+    """Plan d'exécution d'une requête SELECT, sur la connexion DBAPI (sans repasser par les événements)."""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return ""
+    prefix = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}.get(conn.dialect.name)
+    if prefix is None:
+        return ""
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception as e:
+        return f"\n  (plan indisponible : {e})"
+    return "".join(f"\n  {row[-1] if conn.dialect.name == 'sqlite' else row[0]}" for row in rows)
+
+
+def init_metrics(app, engine, slow_query_ms=250.0, sql_timing=True):
+    """Branche les métriques sur l'application Flask et l'engine SQLAlchemy, et ajoute /metrics."""
+    metrics = _engine_metrics.get(engine)
+    if metrics is None:
+        metrics = _engine_metrics[engine] = Metrics(slow_query_ms, sql_timing)
+        if sql_timing:
+            event.listen(engine, "before_cursor_execute", metrics.before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", metrics.after_cursor_execute)
+            event.listen(engine, "handle_error", metrics.handle_error)
+    root = logging.getLogger()
+    if _error_handler not in root.handlers:
+        root.addHandler(_error_handler)
+    app.before_request(metrics.start_request)
+    app.after_request(metrics.end_request)
+    app.add_url_rule("/metrics", "metrics", lambda: Response(metrics.render(), content_type=CONTENT_TYPE))
+    return metrics
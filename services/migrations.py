@@ -0,0 +1,91 @@
+# services/migrations.py
+"""
+Migrations de schéma propres à un type de base, pour ce que create_all et
+add_missing_columns ne font pas : changer le type d'une colonne existante,
+ajouter des index ou des colonnes qui n'existent que sous un dialecte
+(GIN, tsvector générée).
+
+Chaque migration a un identifiant stable, le dialecte visé et ses étapes
+(instructions SQL ou fonctions recevant la connexion). init_db joue, après
+create_all, celles du dialecte de la base qui n'y ont pas encore été
+appliquées, chacune dans sa transaction, et les note dans schema_state
+(clé "migration:<identifiant>"). La liste entre dans l'empreinte du schéma :
+une migration ajoutée ici est jouée au démarrage suivant.
+
+    python -m services.migrations            # migrations appliquées / en attente
+    python -m services.migrations --apply
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import insert, select, text
+from models import SchemaState
+from services.search import PG_SEARCH_DDL
+
+STATE_PREFIX = "migration:"
+
+# Colonnes de clinical_trials stockées en JSONB sous PostgreSQL (models.JSONDocument)
+JSONB_COLUMNS = ("conditions", "interventions", "locations")
+
+
+def _jsonb_trial_columns(conn):
+    """Bases PostgreSQL créées avant JSONDocument : colonnes json -> jsonb."""
+    rows = conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = 'clinical_trials' AND data_type = 'json'"
+    )).scalars().all()
+    for column in JSONB_COLUMNS:
+        if column in rows:
+            conn.exec_driver_sql(f"ALTER TABLE clinical_trials ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb")
+
+
+# (identifiant, dialecte, étapes), dans l'ordre d'application. Ne jamais
+# renommer ni modifier une migration publiée : en ajouter une nouvelle.
+MIGRATIONS = (
+    ("0001_postgresql_jsonb_trial_columns", "postgresql", (_jsonb_trial_columns,)),
+    ("0002_postgresql_search_vector", "postgresql", tuple(PG_SEARCH_DDL)),
+)
+
+
+def applied_migrations(conn):
+    rows = conn.execute(
+        select(SchemaState.key).where(SchemaState.key.startswith(STATE_PREFIX))
+    ).scalars().all()
+    return {key[len(STATE_PREFIX):] for key in rows}
+
+def pending_migrations(engine):
+    """Migrations du dialecte de `engine` pas encore appliquées à sa base."""
+    with engine.connect() as conn:
+        applied = applied_migrations(conn)
+    return [m for m in MIGRATIONS if m[1] == engine.dialect.name and m[0] not in applied]
+
+def run_migrations(engine):
+    """Applique les migrations en attente ; renvoie leurs identifiants."""
+    done = []
+    for name, _, steps in pending_migrations(engine):
+        with engine.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.exec_driver_sql(step)
+            conn.execute(insert(SchemaState).values(
+                key=STATE_PREFIX + name, value=datetime.utcnow().isoformat(), updated_at=datetime.utcnow()
+            ))
+        done.append(name)
+    return done
+
+
+if __name__ == "__main__":
+    from sqlalchemy import inspect
+    from services.database import get_engine, init_db
+    parser = argparse.ArgumentParser(description="Migrations de schéma par type de base")
+    parser.add_argument("--apply", action="store_true", help="Met le schéma à niveau (init_db) et applique les migrations")
+    args = parser.parse_args()
+    engine = get_engine()
+    if args.apply:
+        init_db()
+    # Base neuve (sans schema_state) : tout est en attente
+    pending = {m[0] for m in (pending_migrations(engine) if inspect(engine).has_table("schema_state") else MIGRATIONS)}
+    for name, dialect, _ in MIGRATIONS:
+        if dialect == engine.dialect.name:
+            print(f"{name:<40} {'en attente' if name in pending else 'appliquée'}")
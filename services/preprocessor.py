@@ -1,4 +1,144 @@
 # services/preprocessor.py
+import numpy as np
+import pandas as pd
+from services.utils import DATE_FORMATS
+
+# Champs StudyFields lus par le traitement par lots
+INVENTORY_FIELDS = [
+    "NCTId", "BriefTitle", "Condition", "InterventionName", "OverallStatus",
+    "StartDate", "CompletionDate", "LocationCity", "LocationCountry"
+]
+LOCATION_FIELDS = ["LocationFacility", "LocationCity", "LocationCountry", "LocationZip"]
+
+# Statuts de l'API v2 (énumérations) ramenés aux libellés de l'API legacy
+STATUS_LABELS = {
+    "RECRUITING": "Recruiting",
+    "NOT_YET_RECRUITING": "Not yet recruiting",
+    "ACTIVE_NOT_RECRUITING": "Active, not recruiting",
+    "ENROLLING_BY_INVITATION": "Enrolling by invitation",
+    "COMPLETED": "Completed",
+    "SUSPENDED": "Suspended",
+    "TERMINATED": "Terminated",
+    "WITHDRAWN": "Withdrawn",
+    "UNKNOWN": "Unknown status",
+}
+
+
+# ------------------- Opérations par colonne -------------------
+def _is_list(series):
+    return series.map(type).eq(list)
+
+def first_values(series, default="N/A"):
+    """
+    Premier élément de chaque valeur (les champs StudyFields sont des listes) :
+    explode() déplie les listes, on garde la première ligne de chaque index.
+    """
+    exploded = series.explode()
+    first = exploded[~exploded.index.duplicated()]
+    return first.where(first.notna(), default)
+
+def list_values(series):
+    """Chaque valeur sous forme de liste (valeur absente -> [])."""
+    lists = _is_list(series)
+    if lists.all():
+        return series
+    scalars = series[~lists].map(lambda v: [] if v is None or v != v or v == "N/A" else [v])
+    return series.where(lists, scalars)
+
+def frame_records(frame):
+    """Équivalent de frame.to_dict("records"), colonne par colonne (sans conversion par cellule)."""
+    columns = list(frame.columns)
+    return [dict(zip(columns, values)) for values in zip(*(frame[c].tolist() for c in columns))]
+
+def _map_unique(series, convert):
+    """
+    Applique `convert` une fois par valeur distincte (dates et statuts se
+    répètent beaucoup) ; factorize + take redistribue les résultats.
+    Valeur absente -> None.
+    """
+    codes, uniques = pd.factorize(series)
+    converted = np.empty(len(uniques) + 1, dtype=object)
+    converted[:-1] = list(convert(pd.Series(uniques, dtype=object)))
+    # Le code -1 (valeur absente) pointe sur la dernière case, restée à None
+    return pd.Series(converted[codes], index=series.index)
+
+# Dates déjà converties, partagées entre pages (les mêmes dates reviennent d'une page à l'autre)
+_parsed_dates = {}
+PARSED_DATES_MAX = 100000
+
+def parse_dates(series):
+    """Dates de l'API (formats DATE_FORMATS) -> datetime.date, None si absente ou invalide."""
+    def convert(values):
+        unknown = values[~values.isin(_parsed_dates.keys())]
+        if len(unknown):
+            parsed = pd.Series(pd.NaT, index=unknown.index, dtype="datetime64[ns]")
+            for fmt in DATE_FORMATS:
+                # Chaque format ne reçoit que les valeurs que les précédents n'ont pas reconnues
+                pending = parsed.isna()
+                if not pending.any():
+                    break
+                parsed[pending] = pd.to_datetime(unknown[pending], format=fmt, errors="coerce")
+            if len(_parsed_dates) > PARSED_DATES_MAX:
+                _parsed_dates.clear()
+            _parsed_dates.update(zip(unknown, (None if pd.isna(d) else d.date() for d in parsed)))
+        return [_parsed_dates.get(v) for v in values]
+    return _map_unique(series, convert)
+
+def normalize_statuses(series):
+    def convert(values):
+        cleaned = values.astype(str).str.strip()
+        return cleaned.str.upper().map(STATUS_LABELS).fillna(cleaned)
+    return _map_unique(series, convert).fillna("N/A")
+
+
+# ------------------- Études FullStudies -------------------
+def study_nct_id(study):
+    """NCT ID d'une étude au format FullStudies."""
+    return study.get("Study", {}).get("ProtocolSection", {}).get("IdentificationModule", {}).get("NCTId")
+
+
+def payload_studies(payload):
+    """Études FullStudies d'un document JSON : réponse FullStudies, liste d'études ou étude seule."""
+    if isinstance(payload, list):
+        return payload
+    if "FullStudiesResponse" in payload:
+        return payload["FullStudiesResponse"].get("FullStudies", [])
+    return [payload]
+
+
+def study_fields(study):
+    """Aplatit une étude FullStudies en dictionnaire de champs StudyFields (listes)."""
+    protocol = study.get("Study", {}).get("ProtocolSection", {})
+    ident = protocol.get("IdentificationModule", {})
+    status = protocol.get("StatusModule", {})
+    arms = protocol.get("ArmsInterventionsModule", {})
+    sponsors = protocol.get("SponsorCollaboratorsModule", {})
+    locations = protocol.get("ContactsLocationsModule", {}).get("LocationList", {}).get("Location", [])
+    interventions = arms.get("InterventionList", {}).get("Intervention", [])
+    arm_groups = arms.get("ArmGroupList", {}).get("ArmGroup", [])
+    officials = protocol.get("ContactsLocationsModule", {}).get("OverallOfficialList", {}).get("OverallOfficial", [])
+    fields = {
+        "NCTId": [ident.get("NCTId")],
+        "BriefTitle": [ident.get("BriefTitle")],
+        "OfficialTitle": [ident.get("OfficialTitle")],
+        "Condition": protocol.get("ConditionsModule", {}).get("ConditionList", {}).get("Condition", []),
+        "InterventionName": [i.get("InterventionName") for i in interventions],
+        "ArmGroupDescription": [a.get("ArmGroupDescription") for a in arm_groups],
+        "OverallStatus": [status.get("OverallStatus")],
+        "StartDate": [status.get("StartDateStruct", {}).get("StartDate")],
+        "CompletionDate": [status.get("CompletionDateStruct", {}).get("CompletionDate")],
+        "LastUpdatePostDate": [status.get("LastUpdatePostDateStruct", {}).get("LastUpdatePostDate")],
+        "LeadSponsorName": [sponsors.get("LeadSponsor", {}).get("LeadSponsorName")],
+        "CollaboratorName": [c.get("CollaboratorName") for c in sponsors.get("CollaboratorList", {}).get("Collaborator", [])],
+        "OverallOfficialName": [o.get("OverallOfficialName") for o in officials],
+        "OverallOfficialRole": [o.get("OverallOfficialRole") for o in officials],
+        "ResponsibleParty": [sponsors.get("ResponsibleParty", {}).get("ResponsiblePartyType")],
+    }
+    for key, name in [("LocationFacility", "LocationFacility"), ("LocationCity", "LocationCity"),
+                      ("LocationCountry", "LocationCountry"), ("LocationZip", "LocationZip")]:
+        fields[key] = [loc.get(name) for loc in locations]
+    return {k: [v for v in values if v is not None] for k, values in fields.items()}
+
 
 class Preprocessor:
 
@@ -76,8 +216,9 @@ class Preprocessor:
                 "Country": item.get("LocationCountry", ["N/A"])[0] if item.get("LocationCountry") else "N/A",
                 "Facility": item.get("LocationFacility", ["N/A"])[0] if item.get("LocationFacility") else "N/A",
                 "Zip": item.get("LocationZip", ["N/A"])[0] if item.get("LocationZip") else "N/A",
-                "Latitude": item.get("LocationLat", 0.0),
-                "Longitude": item.get("LocationLong", 0.0)
+                # Coordonnées absentes : None, complétées ensuite par services/geocoding.py
+                "Latitude": item.get("LocationLat", [None])[0] if item.get("LocationLat") else None,
+                "Longitude": item.get("LocationLong", [None])[0] if item.get("LocationLong") else None
             })
         return processed
 
@@ -87,9 +228,77 @@ class Preprocessor:
             return []
         processed = []
         for item in raw_data:
+            lead = item.get("LeadSponsorName", "N/A")
+            party = item.get("ResponsibleParty", "N/A")
             processed.append({
-                "LeadSponsorName": item.get("LeadSponsorName", "N/A"),
+                # Champs StudyFields : listes, y compris pour les valeurs uniques
+                "LeadSponsorName": (lead[0] if lead else "N/A") if isinstance(lead, list) else lead,
                 "CollaboratorName": item.get("CollaboratorName", []),
-                "ResponsibleParty": item.get("ResponsibleParty", "N/A")
+                "ResponsibleParty": (party[0] if party else "N/A") if isinstance(party, list) else party
             })
         return processed
+
+    # ------------------- Traitement par lots (pandas) -------------------
+    @staticmethod
+    def inventory_frame(raw_data):
+        """
+        Page StudyFields -> DataFrame aux colonnes de ClinicalTrial, une ligne
+        par essai. Premier élément, dates et statuts sont normalisés colonne
+        par colonne ; toutes les conditions et localisations sont conservées.
+        """
+        columns = ["nct_id", "title", "conditions", "interventions", "status",
+                   "start_date", "completion_date", "locations"]
+        if not raw_data:
+            return pd.DataFrame(columns=columns)
+        raw = pd.DataFrame.from_records(raw_data, columns=INVENTORY_FIELDS)
+        frame = pd.DataFrame({
+            "nct_id": first_values(raw["NCTId"], None),
+            "title": first_values(raw["BriefTitle"]),
+            "conditions": list_values(raw["Condition"]),
+            "interventions": list_values(raw["InterventionName"]),
+            "status": normalize_statuses(first_values(raw["OverallStatus"], None)),
+            "start_date": parse_dates(first_values(raw["StartDate"], None)),
+            "completion_date": parse_dates(first_values(raw["CompletionDate"], None)),
+            "locations": [[{"city": city, "country": country} for city, country in zip(cities, countries)]
+                          for cities, countries in zip(list_values(raw["LocationCity"]),
+                                                       list_values(raw["LocationCountry"]))],
+        }, columns=columns)
+        return frame[frame["nct_id"].notna()].drop_duplicates("nct_id", keep="last")
+
+    @staticmethod
+    def trial_rows(frame):
+        """Lignes prêtes pour database.bulk_upsert_trial_rows."""
+        return frame_records(frame)
+
+    @staticmethod
+    def locations_frame(raw_data):
+        """
+        Page StudyFields de localisations (plusieurs essais) -> une ligne par
+        site, au format de process_locations. Les listes Facility/City/...
+        d'un essai sont alignées (complétées si leurs longueurs diffèrent)
+        puis dépliées ensemble.
+        """
+        columns = ["nct_id", "Facility", "City", "Country", "Zip", "Latitude", "Longitude"]
+        if not raw_data:
+            return pd.DataFrame(columns=columns)
+        raw = pd.DataFrame.from_records(raw_data, columns=["NCTId"] + LOCATION_FIELDS)
+        lists = pd.DataFrame({field: list_values(raw[field]) for field in LOCATION_FIELDS})
+        lengths = lists.apply(lambda column: column.str.len())
+        sites = lengths.max(axis=1)
+        uneven = lengths.ne(sites, axis=0).any(axis=1)
+        for field in LOCATION_FIELDS:
+            padded = [values + [None] * (count - len(values))
+                      for values, count in zip(lists.loc[uneven, field], sites[uneven])]
+            lists.loc[uneven, field] = pd.Series(padded, index=lists.index[uneven], dtype=object)
+        lists["nct_id"] = first_values(raw["NCTId"], None)
+        frame = lists[(sites > 0) & lists["nct_id"].notna()].explode(LOCATION_FIELDS, ignore_index=True)
+        frame = frame.rename(columns={"LocationFacility": "Facility", "LocationCity": "City",
+                                      "LocationCountry": "Country", "LocationZip": "Zip"})
+        frame[["Facility", "City", "Country", "Zip"]] = frame[["Facility", "City", "Country", "Zip"]].fillna("N/A")
+        frame["Latitude"] = frame["Longitude"] = None
+        return frame[columns]
+
+    @staticmethod
+    def location_rows(frame):
+        """Lignes prêtes pour database.bulk_replace_locations (et services/geocoding.py)."""
+        return frame_records(frame)
@@ -0,0 +1,129 @@
+# services/queries.py
+import re
+from sqlalchemy import exists
+from models import (
+    ClinicalTrial, TrialCondition, TrialCountry, TrialDetails, TrialArms, TrialLocation, TrialSponsor
+)
+
+# Curseur de pagination de /api/inventory : le dernier NCT ID de la page précédente
+CURSOR_PATTERN = re.compile(r"NCT\d+")
+
+# Sections chargeables par /api/trial/<nct_id>?include=... et /api/trials
+TRIAL_INCLUDES = ("details", "arms", "locations", "sponsors")
+
+# Projections colonne par colonne des réponses : session.query(*COLUMNS) renvoie
+# des Row (mêmes attributs que les entités) sans identity map ni suivi des objets
+TRIAL_COLUMNS = (
+    ClinicalTrial.nct_id, ClinicalTrial.title, ClinicalTrial.conditions, ClinicalTrial.interventions,
+    ClinicalTrial.status, ClinicalTrial.start_date, ClinicalTrial.completion_date, ClinicalTrial.locations
+)
+LOCATION_COLUMNS = (
+    TrialLocation.nct_id, TrialLocation.facility, TrialLocation.city, TrialLocation.country,
+    TrialLocation.zip_code, TrialLocation.latitude, TrialLocation.longitude
+)
+SPONSOR_COLUMNS = (TrialSponsor.nct_id, TrialSponsor.lead_sponsor, TrialSponsor.collaborators, TrialSponsor.contacts)
+
+
+def filter_trials(query, condition=None, country=None, status=None):
+    """
+    Applique les filtres de l'inventaire à une requête sur ClinicalTrial.
+    Une condition (ou un pays) correspond si elle figure n'importe où dans la
+    liste de l'essai, et plus seulement en première position.
+
+    Le premier filtre est une jointure pilotée par l'index composite de la
+    table de correspondance (le LIMIT arrête le parcours tôt) ; le second est
+    un EXISTS résolu par une recherche (valeur, nct_id) dans l'autre index.
+    """
+    if condition:
+        query = query.join(TrialCondition, TrialCondition.nct_id == ClinicalTrial.nct_id).filter(
+            TrialCondition.condition == condition
+        )
+
+    if country:
+        if condition:
+            query = query.filter(exists().where(
+                TrialCountry.country == country, TrialCountry.nct_id == ClinicalTrial.nct_id
+            ))
+        else:
+            query = query.join(TrialCountry, TrialCountry.nct_id == ClinicalTrial.nct_id).filter(
+                TrialCountry.country == country
+            )
+
+    if status:
+        query = query.filter(ClinicalTrial.status == status)
+
+    return query
+
+
+def trials_by_ids(db_session, nct_ids, columns=TRIAL_COLUMNS):
+    """Essais des NCT IDs donnés, en une requête IN (...), dans l'ordre de `nct_ids`."""
+    if not nct_ids:
+        return []
+    rows = {t.nct_id: t for t in db_session.query(*columns).filter(ClinicalTrial.nct_id.in_(list(nct_ids)))}
+    return [rows[nct_id] for nct_id in nct_ids if nct_id in rows]
+
+
+def keyset_column(condition=None, country=None):
+    """
+    Colonne nct_id de la table qui pilote le parcours : trier et paginer sur
+    elle suit l'ordre de l'index (valeur, nct_id), sans tri ni OFFSET.
+    """
+    if condition:
+        return TrialCondition.nct_id
+    if country:
+        return TrialCountry.nct_id
+    return ClinicalTrial.nct_id
+
+
+def valid_cursor(cursor):
+    return bool(CURSOR_PATTERN.fullmatch(cursor))
+
+def paginate_trials(query, condition=None, country=None, after=None):
+    """Pagination par curseur (keyset) : essais dont le nct_id suit `after`, triés par nct_id."""
+    key = keyset_column(condition, country)
+    if after:
+        query = query.filter(key > after)
+    return query.order_by(key)
+
+
+def distinct_conditions(conditions):
+    """Conditions distinctes d'un essai, dans l'ordre d'origine."""
+    return list(dict.fromkeys(c for c in (conditions or []) if c))
+
+
+def distinct_countries(locations):
+    """Pays distincts des localisations d'un essai, dans l'ordre d'origine."""
+    return list(dict.fromkeys(
+        loc.get("country") for loc in (locations or [])
+        if isinstance(loc, dict) and loc.get("country")
+    ))
+
+
+def load_trial_bundles(db_session, nct_ids, include=TRIAL_INCLUDES):
+    """
+    Détails, bras, localisations et sponsors de plusieurs essais, avec une
+    requête IN (...) par table demandée quel que soit le nombre d'essais
+    (pas de N+1). Renvoie {nct_id: {"details": ..., "arms": ..., ...}}.
+    """
+    ids = list(dict.fromkeys(nct_ids))
+    bundles = {nct_id: {"details": None, "arms": None, "locations": [], "sponsors": []} for nct_id in ids}
+    if not ids:
+        return bundles
+    if "details" in include:
+        for d in db_session.query(TrialDetails.nct_id, TrialDetails.packed_data, TrialDetails.full_data).filter(
+            TrialDetails.nct_id.in_(ids)
+        ):
+            bundles[d.nct_id]["details"] = d
+    if "arms" in include:
+        # Comme /arms : la première ligne trial_arms de l'essai
+        for a in db_session.query(TrialArms.nct_id, TrialArms.arms).filter(TrialArms.nct_id.in_(ids)).order_by(
+            TrialArms.id.desc()
+        ):
+            bundles[a.nct_id]["arms"] = a
+    if "locations" in include:
+        for l in db_session.query(*LOCATION_COLUMNS).filter(TrialLocation.nct_id.in_(ids)).order_by(TrialLocation.id):
+            bundles[l.nct_id]["locations"].append(l)
+    if "sponsors" in include:
+        for s in db_session.query(*SPONSOR_COLUMNS).filter(TrialSponsor.nct_id.in_(ids)).order_by(TrialSponsor.id):
+            bundles[s.nct_id]["sponsors"].append(s)
+    return bundles
@@ -0,0 +1,164 @@
+# services/query_cache.py
+"""
+Cache des résultats de /api/inventory et /api/search dans targeted_searches :
+clé normalisée des filtres -> NCT IDs de la page, dans l'ordre de la réponse.
+
+Une recherche répétée coûte une lecture sur l'index de la clé, puis un
+SELECT ... WHERE nct_id IN (...) des colonnes de la réponse. Une entrée
+reste valable tant que :
+- la génération "trials" de cache_generations n'a pas changé : chaque
+  écriture d'essais ou de leurs données liées l'incrémente dans sa
+  transaction (bump_generation, appelée par bulk_upsert_trial_rows,
+  rebuild_trial_lookups et touch_trials). Un résultat calculé entre
+  l'écriture des essais et celle de leurs détails (write_prepared) est
+  donc périmé dès que les détails sont écrits ;
+- elle a moins de `ttl` secondes.
+Au-delà de `max_entries` lignes, les entrées les moins récemment utilisées
+sont supprimées ; last_used n'est rafraîchi qu'une fois par TOUCH_INTERVAL
+pour ne pas transformer chaque lecture en écriture.
+
+La table est partagée par tous les workers : un résultat calculé par l'un
+sert aux autres.
+
+Coût pour les lectures : un échec (miss) de /api/inventory ou /api/search
+écrit son résultat (INSERT et purge, un commit), et un succès (hit) peut
+rafraîchir last_used (UPDATE, un commit). Sous SQLite, ces requêtes GET
+prennent donc le verrou d'écriture de la base : elles attendent jusqu'à
+SQLITE_BUSY_TIMEOUT_MS qu'une ingestion en cours le libère. Une écriture du
+cache qui échoue (OperationalError "database is locked"...) est annulée et
+journalisée ; la requête répond avec le résultat qu'elle a calculé ou lu.
+"""
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import sqlite
+from models import CacheGeneration, TargetedSearch
+
+logger = logging.getLogger(__name__)
+
+TRIALS_GENERATION = "trials"
+TOUCH_INTERVAL = timedelta(seconds=60)
+
+
+# ------------------- Génération -------------------
+def bump_generation(db_session, name=TRIALS_GENERATION):
+    """Incrémente la génération `name`. Ne commit pas : à appeler dans la transaction d'écriture."""
+    table = CacheGeneration.__table__
+    result = db_session.execute(
+        update(table).where(table.c.name == name).values(generation=table.c.generation + 1)
+    )
+    if result.rowcount == 0:
+        db_session.execute(table.insert().values(name=name, generation=1))
+
+def current_generation(db_session, name=TRIALS_GENERATION):
+    return db_session.query(CacheGeneration.generation).filter(CacheGeneration.name == name).scalar() or 0
+
+
+# ------------------- Clés -------------------
+def normalize_key(route, **params):
+    """
+    Clé canonique d'une requête : paramètres triés, valeurs vides ignorées
+    (ex: "inventory|condition=Asthma|limit=50"). Les valeurs sont celles
+    réellement utilisées par la requête (filtres nettoyés, limit plafonnée).
+    """
+    parts = [route]
+    for name, value in sorted(params.items()):
+        if value is not None and value != "":
+            parts.append(f"{name}={value}")
+    return "|".join(parts)
+
+def key_hash(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+# ------------------- Cache -------------------
+class QueryCache:
+    def __init__(self, ttl=600, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = self.misses = self.stores = 0
+        self.lock = threading.Lock()
+
+    def _count(self, attribute):
+        with self.lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def get(self, db_session, key):
+        """NCT IDs en cache pour `key`, ou None (absente, expirée ou d'une génération passée)."""
+        generation = select(CacheGeneration.generation).where(
+            CacheGeneration.name == TRIALS_GENERATION
+        ).scalar_subquery()
+        query = db_session.query(TargetedSearch.id, TargetedSearch.results, TargetedSearch.last_used).filter(
+            TargetedSearch.query_key == key_hash(key),
+            TargetedSearch.generation == func.coalesce(generation, 0)
+        )
+        now = datetime.utcnow()
+        if self.ttl:
+            query = query.filter(TargetedSearch.created_at >= now - timedelta(seconds=self.ttl))
+        entry = query.first()
+        if entry is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        if entry.last_used is None or now - entry.last_used > TOUCH_INTERVAL:
+            try:
+                db_session.execute(update(TargetedSearch).where(TargetedSearch.id == entry.id).values(last_used=now))
+                db_session.commit()
+            except Exception as e:
+                db_session.rollback()
+                logger.warning(f"[Query Cache] last_used non mis à jour : {e}")
+        return entry.results
+
+    def put(self, db_session, key, nct_ids, generation):
+        """
+        Enregistre le résultat de `key`, calculé à la génération `generation`
+        (lue avant la requête : une écriture concurrente le rend aussitôt
+        périmé). Purge les entrées périmées et les moins récemment utilisées.
+        """
+        now = datetime.utcnow()
+        row = {"query": key[:255], "query_key": key_hash(key), "results": list(nct_ids),
+               "generation": generation, "created_at": now, "last_used": now}
+        table = TargetedSearch.__table__
+        dialect = db_session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects import postgresql
+            stmt = postgresql.insert(table)
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(table)
+        else:
+            raise NotImplementedError(f"Upsert non supporté pour le dialecte {dialect}")
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["query_key"], set_={c: stmt.excluded[c] for c in row if c != "query_key"}
+        )
+        try:
+            db_session.execute(stmt, row)
+            self._evict(db_session, generation, now)
+            db_session.commit()
+            self._count("stores")
+        except Exception as e:
+            # Le cache est facultatif : la réponse est servie même si l'écriture échoue (base verrouillée...)
+            db_session.rollback()
+            logger.warning(f"[Query Cache] Résultat non enregistré pour '{key}': {e}")
+
+    def _evict(self, db_session, generation, now):
+        stale = TargetedSearch.generation < generation
+        if self.ttl:
+            stale = stale | (TargetedSearch.created_at < now - timedelta(seconds=self.ttl))
+        db_session.execute(delete(TargetedSearch).where(stale))
+        if self.max_entries:
+            oldest = select(TargetedSearch.id).order_by(TargetedSearch.last_used.desc()).offset(self.max_entries)
+            db_session.execute(delete(TargetedSearch).where(TargetedSearch.id.in_(oldest)))
+
+    def clear(self, db_session):
+        db_session.execute(delete(TargetedSearch))
+        db_session.commit()
+
+    def stats(self, db_session):
+        with self.lock:
+            counters = {"hits": self.hits, "misses": self.misses, "stores": self.stores}
+        return {
+            **counters, "entries": db_session.query(func.count(TargetedSearch.id)).scalar(),
+            "generation": current_generation(db_session), "ttl": self.ttl, "max_entries": self.max_entries,
+        }
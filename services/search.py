@@ -0,0 +1,161 @@
+# services/search.py
+import re
+from sqlalchemy import inspect, text
+from models import ClinicalTrial
+
+# Index plein texte SQLite FTS5 sur le titre, les conditions, les interventions
+# et le texte des critères d'éligibilité (TrialDetails.eligibility_text, ou
+# full_data pour les lignes écrites avant son ajout). Le rowid de
+# trials_fts est l'id de clinical_trials ; des triggers le tiennent à jour.
+FTS_TABLE = "trials_fts"
+
+# Poids BM25 par colonne (nct_id, title, conditions, interventions, eligibility)
+BM25_WEIGHTS = (0.0, 10.0, 8.0, 3.0, 1.0)
+
+ELIGIBILITY_SQL = """coalesce({d}.eligibility_text,
+    json_extract({d}.full_data, '$.Study.ProtocolSection.EligibilityModule.EligibilityCriteria'),
+    json_extract({d}.full_data, '$.EligibilityCriteria'), '')"""
+
+def _json_text(column):
+    return f"(SELECT group_concat(value, ' ; ') FROM json_each(coalesce({column}, '[]')))"
+
+def _eligibility_of(nct_id):
+    return f"(SELECT {ELIGIBILITY_SQL.format(d='d')} FROM trial_details d WHERE d.nct_id = {nct_id})"
+
+def _fts_row(t):
+    return (
+        f"{t}.id, {t}.nct_id, coalesce({t}.title, ''), {_json_text(f'{t}.conditions')}, "
+        f"{_json_text(f'{t}.interventions')}, coalesce({_eligibility_of(f'{t}.nct_id')}, '')"
+    )
+
+# Mots vides ignorés dans la saisie (sinon "Cancer of the Breast" exigerait "of" et "the")
+STOPWORDS = {
+    "a", "an", "and", "by", "for", "in", "of", "on", "or", "the", "to", "with",
+    "au", "aux", "de", "des", "du", "en", "et", "la", "le", "les", "ou", "un", "une"
+}
+
+FTS_COLUMNS = f"{FTS_TABLE}(rowid, nct_id, title, conditions, interventions, eligibility)"
+
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        nct_id UNINDEXED, title, conditions, interventions, eligibility,
+        tokenize = 'porter unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS clinical_trials_fts_ai AFTER INSERT ON clinical_trials BEGIN
+        INSERT INTO {FTS_COLUMNS} SELECT {_fts_row('new')};
+    END""",
+    # Seules les colonnes indexées déclenchent la réindexation (pas updated_at)
+    "DROP TRIGGER IF EXISTS clinical_trials_fts_au",
+    f"""CREATE TRIGGER clinical_trials_fts_au
+    AFTER UPDATE OF nct_id, title, conditions, interventions ON clinical_trials BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_COLUMNS} SELECT {_fts_row('new')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clinical_trials_fts_ad AFTER DELETE ON clinical_trials BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    # Triggers de trial_details recréés à chaque démarrage : leur définition a évolué
+    "DROP TRIGGER IF EXISTS trial_details_fts_ai",
+    f"""CREATE TRIGGER trial_details_fts_ai AFTER INSERT ON trial_details BEGIN
+        UPDATE {FTS_TABLE} SET eligibility = {ELIGIBILITY_SQL.format(d='new')}
+        WHERE rowid = (SELECT id FROM clinical_trials WHERE nct_id = new.nct_id);
+    END""",
+    "DROP TRIGGER IF EXISTS trial_details_fts_au",
+    f"""CREATE TRIGGER trial_details_fts_au AFTER UPDATE OF full_data, eligibility_text ON trial_details BEGIN
+        UPDATE {FTS_TABLE} SET eligibility = {ELIGIBILITY_SQL.format(d='new')}
+        WHERE rowid = (SELECT id FROM clinical_trials WHERE nct_id = new.nct_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trial_details_fts_ad AFTER DELETE ON trial_details BEGIN
+        UPDATE {FTS_TABLE} SET eligibility = ''
+        WHERE rowid = (SELECT id FROM clinical_trials WHERE nct_id = old.nct_id);
+    END""",
+]
+
+FTS_BACKFILL = f"INSERT INTO {FTS_COLUMNS} SELECT {_fts_row('clinical_trials')} FROM clinical_trials"
+
+# PostgreSQL : pas de FTS5, recherche sur une colonne tsvector générée
+# (search_vector, calculée à l'écriture) indexée en GIN, ajoutée par
+# services/migrations.py. Titre, conditions et interventions pondérés A, B, C
+# comme BM25_WEIGHTS ; le texte d'éligibilité, dans une autre table, n'y
+# figure pas.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(jsonb_to_tsvector('english', coalesce(conditions, '[]'::jsonb), '[\"string\"]'), 'B') || "
+    "setweight(jsonb_to_tsvector('english', coalesce(interventions, '[]'::jsonb), '[\"string\"]'), 'C')"
+)
+PG_SEARCH_DDL = [
+    f"ALTER TABLE clinical_trials ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({PG_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_clinical_trials_search ON clinical_trials USING gin (search_vector)",
+]
+# Poids ts_rank des classes D, C, B, A
+PG_RANK_WEIGHTS = "{0.1, 0.3, 0.8, 1.0}"
+
+def init_search_index(engine):
+    """Crée la table FTS5 et ses triggers (SQLite uniquement) et l'alimente si elle est nouvelle."""
+    if engine.dialect.name != "sqlite":
+        return False
+    created = not inspect(engine).has_table(FTS_TABLE)
+    with engine.begin() as conn:
+        for ddl in FTS_DDL:
+            conn.exec_driver_sql(ddl)
+        if created:
+            conn.exec_driver_sql(FTS_BACKFILL)
+    if created:
+        optimize_search_index(engine)
+    return True
+
+def optimize_search_index(engine):
+    """Fusionne les segments FTS5 ; à lancer après un chargement massif."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+def search_tokens(terms):
+    """Mots d'une saisie libre, sans les mots vides."""
+    return [t for t in re.findall(r"\w+", terms or "") if t.lower() not in STOPWORDS]
+
+def fts_query(terms):
+    """
+    Transforme une saisie libre en requête FTS5 sûre : chaque mot devient un
+    terme entre guillemets, combinés en ET implicite. "Cancer of the Breast"
+    et "breast cancer" trouvent donc les mêmes essais.
+    """
+    return " ".join(f'"{t}"' for t in search_tokens(terms))
+
+def search_trials(db_session, terms, limit=50, offset=0, columns=None):
+    """
+    Essais correspondant à `terms`, triés par pertinence (BM25 sous SQLite,
+    ts_rank sous PostgreSQL) : entités ClinicalTrial, ou Row des seules
+    `columns` (colonnes de ClinicalTrial).
+    """
+    match = fts_query(terms)
+    if not match:
+        return []
+    selected = ", ".join(f"clinical_trials.{c.key}" for c in columns) if columns else "clinical_trials.*"
+    if db_session.get_bind().dialect.name == "postgresql":
+        # Mots combinés en ET par plainto_tsquery, racinisés comme l'index
+        match = " ".join(search_tokens(terms))
+        statement = text(f"""
+            SELECT {selected} FROM clinical_trials, plainto_tsquery('english', :match) AS query
+            WHERE search_vector @@ query
+            ORDER BY ts_rank('{PG_RANK_WEIGHTS}', search_vector, query) DESC, clinical_trials.id
+            LIMIT :limit OFFSET :offset
+        """)
+    else:
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        # Classement et pagination sur l'index seul, puis jointure des lignes retenues
+        statement = text(f"""
+            SELECT {selected} FROM (
+                SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH :match
+                ORDER BY score LIMIT :limit OFFSET :offset
+            ) AS hits
+            JOIN clinical_trials ON clinical_trials.id = hits.rowid
+            ORDER BY hits.score
+        """)
+    params = {"match": match, "limit": limit, "offset": offset}
+    if columns:
+        # Types des colonnes (JSON, Date) appliqués aux valeurs brutes
+        return db_session.execute(statement.columns(*columns), params).all()
+    return db_session.query(ClinicalTrial).from_statement(statement).params(**params).all()
@@ -0,0 +1,70 @@
+# services/serialization.py
+"""
+Encodeur JSON rapide pour les réponses Flask : orjson quand il est installé,
+avec une sortie octet pour octet identique à celle de jsonify (clés triées,
+séparateurs compacts, caractères non ASCII échappés en \\uXXXX).
+
+Les cas où orjson écrit autrement que le module json basculent sur
+l'encodeur standard : flottants en notation exponentielle côté json
+(|x| < 1e-4 ou >= 1e16), types confiés à default() non reconnus, clés non
+textuelles, entiers hors 64 bits. Seule différence restante : NaN et
+Infinity (JSON invalide) sortent en null.
+"""
+import re
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle : encodeur standard
+    orjson = None
+
+NON_ASCII = re.compile("[\x7f-\U0010ffff]")
+# Nombres qu'orjson n'écrit pas comme json : 0.00001 (json : 1e-05), 1e16 (json : 1e+16).
+# Chiffres ramenés à "0" et tout le reste hors "e" à " " : un exposant devient "0e",
+# trouvé en une recherche de sous-chaîne (une regex \de est plusieurs fois plus lente)
+EXPONENT_TABLE = bytes(0x30 if 0x30 <= c <= 0x39 else c if c == 0x65 else 0x20 for c in range(256))
+
+
+def _escape(match):
+    code = ord(match.group())
+    if code > 0xFFFF:
+        code -= 0x10000
+        return "\\u%04x\\u%04x" % (0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return "\\u%04x" % code
+
+
+def compact_dumps(provider, obj):
+    """Texte JSON de `obj` tel que jsonify l'écrit (séparateurs compacts), quel que soit le provider."""
+    data = provider.fast_dumps(obj) if isinstance(provider, FastJSONProvider) else None
+    if data is not None:
+        return data.decode("ascii")
+    return provider.dumps(obj, separators=(",", ":"))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSONProvider de l'application : même sortie que DefaultJSONProvider, encodée par orjson."""
+
+    def fast_dumps(self, obj):
+        """Octets de json.dumps(obj, separators=(",", ":")) ; None si l'encodeur standard est nécessaire."""
+        if orjson is None or not self.sort_keys or not self.ensure_ascii:
+            return None
+        try:
+            data = orjson.dumps(obj, default=self.default, option=(
+                orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+            ))
+        except (orjson.JSONEncodeError, TypeError):
+            return None
+        if b"0.0000" in data or b"0e" in data.translate(EXPONENT_TABLE):
+            return None
+        if not data.isascii() or b"\x7f" in data:
+            data = NON_ASCII.sub(_escape, data.decode("utf-8")).encode("ascii")
+        return data
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        obj = self._prepare_response_obj(args, kwargs)
+        body = None if pretty else self.fast_dumps(obj)
+        if body is None:
+            return super().response(obj)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,210 @@
+# services/sync.py
+"""
+Synchronisation incrémentale de la base locale avec ClinicalTrials.gov.
+
+Pour chaque requête (expr), sync_checkpoints garde un high-water mark : la
+LastUpdatePostDate la plus récente des runs terminés. Un run ne demande que
+les études modifiées depuis (AREA[LastUpdatePostDate]RANGE[...]), compare
+l'empreinte de chaque document à celle de trial_sync et n'écrit que les
+études réellement modifiées. La position dans les résultats est enregistrée
+après chaque page : un run interrompu reprend là où il s'était arrêté.
+
+    python -m services.sync --expr "diabetes"
+"""
+import argparse
+import hashlib
+import json
+import logging
+from datetime import date, datetime
+from config import settings
+from models import SyncCheckpoint, TrialSync
+from services.clinical_trials import get_client
+from services.database import (
+    session, parse_date, upsert_rows, bulk_upsert_trial_rows, bulk_upsert_detail_rows, detail_row,
+    bulk_replace_arms, bulk_replace_locations, bulk_replace_sponsors
+)
+from services.preprocessor import Preprocessor, study_nct_id, study_fields
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(study):
+    """Empreinte d'un document FullStudies, indépendante de l'ordre des clés."""
+    return hashlib.sha1(json.dumps(study, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def delta_expr(expr, since):
+    """Requête restreinte aux études mises à jour depuis `since` (inclus)."""
+    if since is None:
+        return expr
+    window = f"AREA[LastUpdatePostDate]RANGE[{since:%m/%d/%Y}, MAX]"
+    return f"({expr}) AND {window}" if expr else window
+
+
+class SyncReport:
+    def __init__(self, query):
+        self.query = query
+        self.pages = self.fetched = self.unchanged = self.changed = 0
+        self.resumed = False
+        self.since = self.high_water = None
+
+    def as_dict(self):
+        return {
+            "query": self.query, "resumed": self.resumed, "since": str(self.since) if self.since else None,
+            "pages": self.pages, "fetched": self.fetched, "unchanged": self.unchanged, "changed": self.changed,
+            "high_water": str(self.high_water) if self.high_water else None,
+        }
+
+    def __str__(self):
+        return ", ".join(f"{k}={v}" for k, v in self.as_dict().items())
+
+
+# ------------------- Écriture des études -------------------
+def prepare_studies(studies):
+    """
+    Lignes de toutes les tables pour des études FullStudies : essai (via le
+    traitement par lots du Preprocessor), détail compressé, bras,
+    localisations et sponsors. Sans accès à la base : exécutable dans un
+    process du pool d'ingestion (services/ingest.py).
+    """
+    fields = [study_fields(s) for s in studies]
+    nct_ids = [study_nct_id(s) for s in studies]
+    return {
+        "nct_ids": nct_ids,
+        "trials": Preprocessor.trial_rows(Preprocessor.inventory_frame(fields)),
+        "details": [detail_row({"NCTId": nct_id, **study}) for nct_id, study in zip(nct_ids, studies)],
+        "arms": {nct_id: Preprocessor.process_arms([f]) for nct_id, f in zip(nct_ids, fields)},
+        "locations": Preprocessor.location_rows(Preprocessor.locations_frame(fields)),
+        "sponsors": {nct_id: Preprocessor.process_sponsors([f]) for nct_id, f in zip(nct_ids, fields)},
+    }
+
+def write_prepared(prepared, db_session=None, geocoder=None):
+    """Écrit le résultat de prepare_studies ; les données liées sont remplacées."""
+    db_session = db_session or session
+    nct_ids = prepared["nct_ids"]
+    if not nct_ids:
+        return 0
+    bulk_upsert_trial_rows(prepared["trials"], db_session=db_session)
+    bulk_upsert_detail_rows(prepared["details"], db_session=db_session)
+    bulk_replace_arms(prepared["arms"], db_session=db_session)
+    locations = prepared["locations"]
+    if geocoder is not None:
+        from services.geocoding import geocode_locations
+        geocode_locations(locations, geocoder, db_session)
+    bulk_replace_locations(locations, db_session=db_session, nct_ids=nct_ids)
+    bulk_replace_sponsors(prepared["sponsors"], db_session=db_session)
+    return len(nct_ids)
+
+def write_studies(studies, db_session=None, geocoder=None):
+    """Écrit des études FullStudies dans toutes les tables (prepare_studies + write_prepared)."""
+    if not studies:
+        return 0
+    return write_prepared(prepare_studies(studies), db_session, geocoder)
+
+def _changed_studies(db_session, studies):
+    """Études dont l'empreinte diffère de celle enregistrée : [(étude, hash, date de mise à jour)]."""
+    by_id = {}
+    for study in studies:
+        nct_id = study_nct_id(study)
+        if nct_id:
+            by_id[nct_id] = study
+    known = dict(db_session.query(TrialSync.nct_id, TrialSync.content_hash).filter(TrialSync.nct_id.in_(list(by_id))))
+    changed = []
+    for nct_id, study in by_id.items():
+        digest = content_hash(study)
+        if known.get(nct_id) != digest:
+            updated = parse_date((study_fields(study).get("LastUpdatePostDate") or [None])[0])
+            changed.append((study, digest, updated))
+    return changed
+
+def _page_high_water(studies):
+    dates = [parse_date((study_fields(s).get("LastUpdatePostDate") or [None])[0]) for s in studies]
+    dates = [d for d in dates if d]
+    return max(dates) if dates else None
+
+
+# ------------------- Synchronisation -------------------
+def _checkpoint(db_session, expr):
+    checkpoint = db_session.query(SyncCheckpoint).filter_by(query=expr).first()
+    if checkpoint is None:
+        checkpoint = SyncCheckpoint(query=expr, status="done", next_rank=1)
+        db_session.add(checkpoint)
+    return checkpoint
+
+def sync_query(expr, client=None, db_session=None, page_size=None, overlap=None, geocoder=None):
+    """
+    Synchronise les études de `expr` modifiées depuis le dernier run terminé.
+    Reprend un run interrompu à partir de son point de reprise.
+    """
+    db_session = db_session or session
+    client = client or get_client()
+    page_size = page_size or settings.SYNC_PAGE_SIZE
+    overlap = settings.SYNC_PAGE_OVERLAP if overlap is None else overlap
+    report = SyncReport(expr)
+
+    checkpoint = _checkpoint(db_session, expr)
+    if checkpoint.status == "running":
+        report.resumed = True
+    else:
+        checkpoint.status = "running"
+        checkpoint.run_since = checkpoint.high_water
+        checkpoint.run_started = date.today()
+        checkpoint.run_high_water = None
+        checkpoint.next_rank = 1
+    db_session.commit()
+    report.since = checkpoint.run_since
+    query = delta_expr(expr, checkpoint.run_since)
+    logger.info(f"[Sync] '{expr}' depuis {checkpoint.run_since or 'le début'} (rang {checkpoint.next_rank})")
+
+    while True:
+        # Quelques études relues : le classement peut se décaler pendant le run
+        start = max(1, checkpoint.next_rank - (overlap if checkpoint.next_rank > 1 else 0))
+        page = client.full_studies(query, min_rnk=start, max_rnk=start + page_size - 1)
+        if not page:
+            break
+        report.pages += 1
+        report.fetched += len(page)
+
+        changed = _changed_studies(db_session, page)
+        report.unchanged += len(page) - len(changed)
+        report.changed += len(changed)
+        write_studies([study for study, _, _ in changed], db_session, geocoder)
+
+        # Empreintes et point de reprise dans la même transaction, après les données :
+        # une page interrompue est simplement réécrite à la reprise
+        try:
+            upsert_rows(db_session, TrialSync, [{
+                "nct_id": study_nct_id(study), "content_hash": digest,
+                "last_update_posted": updated, "synced_at": datetime.utcnow()
+            } for study, digest, updated in changed], key="nct_id")
+            page_high = _page_high_water(page)
+            if page_high and (checkpoint.run_high_water is None or page_high > checkpoint.run_high_water):
+                checkpoint.run_high_water = page_high
+            checkpoint.next_rank = start + len(page)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        if len(page) < page_size:
+            break
+
+    # Le high-water mark ne dépasse pas le jour de démarrage du run : une étude
+    # modifiée pendant le run sera relue au suivant
+    high_water = checkpoint.run_high_water
+    if high_water and checkpoint.run_started:
+        high_water = min(high_water, checkpoint.run_started)
+    if high_water and (checkpoint.high_water is None or high_water > checkpoint.high_water):
+        checkpoint.high_water = high_water
+    checkpoint.status = "done"
+    checkpoint.next_rank = 1
+    db_session.commit()
+    report.high_water = checkpoint.high_water
+    logger.info(f"[Sync] {report}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synchronisation incrémentale depuis ClinicalTrials.gov")
+    parser.add_argument("--expr", required=True, help="Requête expr de l'API (ex: diabetes)")
+    parser.add_argument("--page-size", type=int, default=None)
+    args = parser.parse_args()
+    print(json.dumps(sync_query(args.expr, page_size=args.page_size).as_dict(), indent=2))
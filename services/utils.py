@@ -0,0 +1,12 @@
+# services/utils.py
+
+# Formats de date de l'API legacy : "2020-01-15", "January 15, 2020", "January 2020", "2020-01"
+DATE_FORMATS = ("%Y-%m-%d", "%B %d, %Y", "%B %Y", "%Y-%m")
+
+# Valeurs des paramètres booléens de requête (?recruiting=1, ?healthy_volunteer=false)
+BOOLEAN_VALUES = {"true": True, "1": True, "yes": True, "false": False, "0": False, "no": False}
+
+
+def parse_bool(value):
+    """'true' / '1' / 'yes' -> True, 'false' / '0' / 'no' -> False (casse ignorée) ; None si non reconnu."""
+    return BOOLEAN_VALUES.get(value.strip().lower())
@@ -0,0 +1,78 @@
+# tests/conftest.py
+"""
+Fixtures communes : serveur local services/ctgov_stub.py (études
+synthétiques de benchmarks/synthetic.py), sans accès réseau.
+"""
+import os
+import random
+import pytest
+
+# Paramètres lus au premier accès (config.get_settings) : pas d'affichage debug
+os.environ.setdefault("FLASK_DEBUG", "false")
+
+
+@pytest.fixture
+def studies():
+    """Fabrique d'études FullStudies synthétiques : studies(n, start=0, last_update=None)."""
+    from benchmarks.synthetic import generate_full_study
+
+    def make(n, start=0, last_update=None):
+        rnd = random.Random(start)
+        return [generate_full_study(i, rnd, last_update) for i in range(start, start + n)]
+    return make
+
+
+@pytest.fixture
+def stub():
+    """Démarre des serveurs stub(studies, **options) -> (state, base_url), arrêtés en fin de test."""
+    from services.ctgov_stub import start_stub_server
+    servers = []
+
+    def start(studies, **options):
+        server, base_url = start_stub_server(studies, **options)
+        servers.append(server)
+        return server.RequestHandlerClass.state, base_url
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def use_database(tmp_path, monkeypatch, trials):
+    """
+    Base SQLite temporaire de `trials` essais synthétiques, schéma complet
+    (init_db), utilisée par l'engine et la session de services/database.py.
+    """
+    from benchmarks.synthetic import build_database
+    from services import database
+    url = f"sqlite:///{tmp_path / 'clinical_trials.db'}"
+    if trials:
+        build_database(url, trials).dispose()
+    engine = database.make_engine(url)
+    monkeypatch.setattr(database, "_engine", engine)
+    database.init_db()
+    yield engine
+    database.session.remove()
+    engine.dispose()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Base de 50 essais synthétiques (NCT00000000 à NCT00000049)."""
+    yield from use_database(tmp_path, monkeypatch, 50)
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    yield from use_database(tmp_path, monkeypatch, 0)
+
+
+@pytest.fixture
+def app(db):
+    import app as api
+    return api.create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
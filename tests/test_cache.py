@@ -0,0 +1,74 @@
+# tests/test_cache.py
+"""Cache des réponses de détail : ETag / 304, invalidation par clinical_trials.updated_at, backend partagé."""
+from services.cache import LRUCache, MemoryCacheBackend, ResponseCache
+from services.database import bulk_replace_arms, session, touch_trials
+from benchmarks.synthetic import nct_id
+
+NCT = nct_id(1)
+
+
+def test_etag_and_not_modified(client):
+    first = client.get(f"/api/trial/{NCT}/arms")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get(f"/api/trial/{NCT}/arms", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
+    other = client.get(f"/api/trial/{NCT}/arms", headers={"If-None-Match": '"other"'})
+    assert other.status_code == 200 and other.data == first.data
+
+
+def test_write_invalidates_cached_response(app, client):
+    cache = app.extensions["response_cache"]
+    # Version relue à chaque hit
+    cache.revalidate_after = 0
+    before = client.get(f"/api/trial/{NCT}/arms")
+    assert client.get(f"/api/trial/{NCT}/arms").data == before.data
+    assert cache.stats()["hits"] == 1
+
+    new_arms = [{"ArmGroupDescription": "Placebo", "InterventionName": "Drug Z"}]
+    bulk_replace_arms({NCT: new_arms})
+    after = client.get(f"/api/trial/{NCT}/arms", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.get_json()["data"] == new_arms
+    assert cache.stats()["invalidations"] == 1
+
+    # Donnée liée modifiée hors des bulk_* : touch_trials suffit à périmer l'entrée
+    touch_trials(session, [NCT])
+    session.commit()
+    client.get(f"/api/trial/{NCT}/arms")
+    assert cache.stats()["invalidations"] == 2
+    assert cache.stats()["misses"] == 3
+
+
+def test_shared_backend_between_workers(db):
+    from app import trial_version
+    shared = MemoryCacheBackend()
+    worker_a = ResponseCache(LRUCache(), shared, revalidate_after=0)
+    worker_b = ResponseCache(LRUCache(), shared, revalidate_after=0)
+    version = lambda: trial_version(NCT)
+
+    entry, current = worker_a.lookup("arms", NCT, version)
+    assert entry is None
+    worker_a.put("arms", NCT, current, b'{"data": []}')
+    entry, _ = worker_b.lookup("arms", NCT, version)
+    assert entry is not None and entry.body == b'{"data": []}'
+    assert worker_b.stats()["shared_hits"] == 1
+
+    # Écriture (autre process) : l'entrée locale et l'entrée partagée sont périmées
+    touch_trials(session, [NCT])
+    session.commit()
+    entry, _ = worker_b.lookup("arms", NCT, version)
+    assert entry is None
+    assert worker_b.stats()["invalidations"] == 1
+
+
+def test_trial_without_inventory_row_is_not_cached(app, client):
+    # Bras d'un essai absent de clinical_trials : pas de version pour invalider une entrée
+    orphan = nct_id(9999999)
+    cache = app.extensions["response_cache"]
+    cache.revalidate_after = 0
+    bulk_replace_arms({orphan: [{"ArmGroupDescription": "A"}]})
+    first = client.get(f"/api/trial/{orphan}/arms")
+    assert first.get_json()["data"] == [{"ArmGroupDescription": "A"}]
+    bulk_replace_arms({orphan: [{"ArmGroupDescription": "B"}]})
+    assert client.get(f"/api/trial/{orphan}/arms").get_json()["data"] == [{"ArmGroupDescription": "B"}]
+    assert cache.stats()["hits"] == 0
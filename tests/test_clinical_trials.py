@@ -0,0 +1,107 @@
+# tests/test_clinical_trials.py
+"""ClinicalTrialsClient contre le serveur local : reprise sur 429/5xx, limitation de débit, lots."""
+import time
+import pytest
+import requests
+from services.clinical_trials import FIELDS_ARMS, ClinicalTrialsClient, RateLimiter
+from benchmarks.synthetic import nct_id
+
+
+def make_client(base_url, **options):
+    options = {"rate_limit": 0, "backoff_factor": 0, **options}
+    return ClinicalTrialsClient(base_url=base_url, **options)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_transient_errors(studies, stub, status):
+    state, base_url = stub(studies(3), fail_first=2, fail_status=status)
+    client = make_client(base_url)
+    rows = client.study_fields(nct_id(1), FIELDS_ARMS)
+    assert [r["NCTId"] for r in rows] == [[nct_id(1)]]
+    assert state.requests == 3
+
+
+def test_gives_up_after_retries(studies, stub):
+    state, base_url = stub(studies(3), fail_first=100)
+    client = make_client(base_url, retries=2)
+    with pytest.raises(requests.RequestException):
+        client.study_fields(nct_id(1), FIELDS_ARMS)
+    assert state.requests == 3
+
+
+def test_failed_batch_is_skipped(studies, stub):
+    # Premier lot en échec définitif, les suivants aboutissent
+    state, base_url = stub(studies(30), fail_first=3)
+    client = make_client(base_url, retries=2, batch_size=10, max_workers=1)
+    found = client.study_fields_by_ids([nct_id(i) for i in range(30)], FIELDS_ARMS)
+    assert sorted(found) == [nct_id(i) for i in range(10, 30)]
+
+
+def test_batches_ids_into_few_requests(studies, stub):
+    state, base_url = stub(studies(120))
+    client = make_client(base_url, batch_size=50)
+    ids = [nct_id(i) for i in range(120)] + [nct_id(0), None]
+    found = client.study_fields_by_ids(ids, FIELDS_ARMS)
+    assert sorted(found) == sorted(nct_id(i) for i in range(120))
+    assert state.requests == 3
+    details = client.full_studies_by_ids(ids[:60])
+    assert len(details) == 60 and state.requests == 5
+
+
+def test_concurrent_batches_overlap_latency(studies, stub):
+    state, base_url = stub(studies(40), latency=0.2)
+    client = make_client(base_url, batch_size=5, max_workers=8)
+    started = time.perf_counter()
+    found = client.study_fields_by_ids([nct_id(i) for i in range(40)], FIELDS_ARMS)
+    elapsed = time.perf_counter() - started
+    assert len(found) == 40 and state.requests == 8
+    # 8 lots de 0,2 s : 1,6 s en séquentiel
+    assert elapsed < 0.8
+
+
+def test_rate_limit(studies, stub):
+    state, base_url = stub(studies(30))
+    client = make_client(base_url, rate_limit=20, batch_size=1)
+    started = time.perf_counter()
+    client.study_fields_by_ids([nct_id(i) for i in range(30)], FIELDS_ARMS)
+    elapsed = time.perf_counter() - started
+    # Rafale de 20 jetons, puis 10 requêtes à 20/s
+    assert state.requests == 30
+    assert elapsed >= 0.45
+
+
+def test_rate_limiter_spacing():
+    limiter = RateLimiter(50, burst=1)
+    started = time.perf_counter()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.perf_counter() - started >= 0.19
+    # rate=0 : pas de limite
+    unlimited = RateLimiter(0)
+    started = time.perf_counter()
+    for _ in range(1000):
+        unlimited.acquire()
+    assert time.perf_counter() - started < 0.1
+
+
+def test_retries_count_against_rate_limit(studies, stub):
+    # 5 jetons d'avance : les 2 dernières des 7 tentatives attendent le limiteur (5/s)
+    state, base_url = stub(studies(3), fail_first=6, fail_status=429)
+    client = make_client(base_url, rate_limit=5, retries=10)
+    started = time.perf_counter()
+    client.study_fields(nct_id(1), FIELDS_ARMS)
+    assert state.requests == 7
+    assert time.perf_counter() - started >= 0.35
+
+
+def test_retry_after_header():
+    from email.utils import formatdate
+    from services.clinical_trials import retry_after
+    response = requests.Response()
+    assert retry_after(response) == 0
+    response.headers["Retry-After"] = "3"
+    assert retry_after(response) == 3
+    response.headers["Retry-After"] = formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after(response) <= 30
+    response.headers["Retry-After"] = "bientôt"
+    assert retry_after(response) == 0
@@ -0,0 +1,69 @@
+# tests/test_database.py
+"""Écritures en masse : lots, upsert, tables de correspondance."""
+import itertools
+from datetime import date, datetime
+from sqlalchemy import event
+from models import ClinicalTrial, TrialCondition, TrialCountry
+from services.database import batches, bulk_upsert_trial_rows, session, upsert_rows
+from benchmarks.synthetic import nct_id
+
+NCT = nct_id(1)
+
+
+def trial_row(nct, conditions, countries, title="Study"):
+    return {
+        "nct_id": nct, "title": title, "conditions": conditions, "interventions": ["Drug A"],
+        "status": "Recruiting", "start_date": date(2020, 1, 1), "completion_date": date(2022, 1, 1),
+        "locations": [{"city": f"{c} City 0", "country": c} for c in countries],
+    }
+
+
+def lookups(nct):
+    conditions = sorted(c for (c,) in session.query(TrialCondition.condition).filter_by(nct_id=nct))
+    countries = sorted(c for (c,) in session.query(TrialCountry.country).filter_by(nct_id=nct))
+    return conditions, countries
+
+
+def test_update_replaces_lookup_rows(db):
+    bulk_upsert_trial_rows([trial_row(NCT, ["Zzz Condition", "Asthma", "Asthma"], ["Atlantis", "France", "France"])])
+    assert lookups(NCT) == (["Asthma", "Zzz Condition"], ["Atlantis", "France"])
+    bulk_upsert_trial_rows([trial_row(NCT, ["Diabetes"], ["Japan"])])
+    assert lookups(NCT) == (["Diabetes"], ["Japan"])
+    assert session.query(TrialCondition).filter_by(condition="Zzz Condition").count() == 0
+    assert session.query(TrialCountry).filter_by(country="Atlantis").count() == 0
+    session.remove()
+
+
+def test_batches_are_read_lazily():
+    chunks = batches(itertools.count(), 3)
+    assert next(chunks) == [0, 1, 2] and next(chunks) == [3, 4, 5]
+    assert list(batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_upsert_rows_updates_on_conflict(db):
+    new = nct_id(999)
+    upsert_rows(session, ClinicalTrial, [{"nct_id": new, "title": "First", "created_at": datetime(2001, 1, 1)}])
+    session.commit()
+    upsert_rows(session, ClinicalTrial, [{"nct_id": new, "title": "Second", "created_at": datetime(2020, 1, 1)}])
+    session.commit()
+    rows = session.query(ClinicalTrial.title, ClinicalTrial.created_at).filter_by(nct_id=new).all()
+    # Une seule ligne, réécrite, created_at de l'insertion conservé
+    assert [(r.title, r.created_at.year) for r in rows] == [("Second", 2001)]
+    session.remove()
+
+
+def test_bulk_upsert_trial_rows(db):
+    created = session.query(ClinicalTrial.created_at).filter_by(nct_id=NCT).scalar()
+    commits = []
+    event.listen(session(), "after_commit", lambda s: commits.append(1))
+    rows = [trial_row(nct_id(i), ["Asthma"], ["France"], title=f"New {i}") for i in range(1, 6)]
+    # Doublon dans le lot : la dernière version l'emporte
+    rows.append(trial_row(nct_id(5), ["Asthma"], ["France"], title="Last"))
+    assert bulk_upsert_trial_rows(iter(rows), batch_size=2) == 5
+    # Une transaction par lot de 2 lignes lues : [1, 2], [3, 4], [5, 5]
+    assert len(commits) == 3
+    assert session.query(ClinicalTrial).count() == 50
+    assert session.query(ClinicalTrial.title).filter_by(nct_id=nct_id(5)).scalar() == "Last"
+    trial = session.query(ClinicalTrial).filter_by(nct_id=NCT).one()
+    assert trial.title == "New 1" and trial.created_at == created
+    session.remove()
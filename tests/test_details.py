@@ -0,0 +1,94 @@
+# tests/test_details.py
+"""Format packed_data (en-tête, codec, table d'offsets) et projection ?fields=, compressé ou non."""
+import pytest
+from models import TrialDetails
+from services.database import bulk_upsert_detail_rows, session
+from services.details import (
+    MAGIC, details_document, pack_document, project_document, section_table, storage_columns,
+    unpack_document
+)
+from benchmarks.synthetic import nct_id
+
+NCT = nct_id(7)
+DOCUMENT = {
+    "Rank": 1,
+    "Study": {
+        "ProtocolSection": {
+            "IdentificationModule": {"NCTId": NCT, "BriefTitle": "Étude 7"},
+            "StatusModule": {"OverallStatus": "RECRUITING", "StartDateStruct": {"StartDate": "2020-01"}},
+            "EligibilityModule": {"EligibilityCriteria": "Adultes", "MinimumAge": "18 Years"},
+        },
+        "DerivedSection": {"MiscInfoModule": {"VersionHolder": "2024-01-01"}},
+        "HasResults": False,
+    },
+}
+FIELDS = ["ProtocolSection.StatusModule.OverallStatus", "DerivedSection", "HasResults", "Missing.Module"]
+PROJECTED = {
+    "Rank": 1,
+    "Study": {
+        "ProtocolSection": {"StatusModule": {"OverallStatus": "RECRUITING"}},
+        "DerivedSection": {"MiscInfoModule": {"VersionHolder": "2024-01-01"}},
+        "HasResults": False,
+    },
+}
+
+
+@pytest.fixture(params=[b"z", b"s"], ids=["zlib", "zstd"])
+def codec(request):
+    if request.param == b"s":
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+def test_pack_round_trip(codec):
+    blob = pack_document(DOCUMENT, codec)
+    assert blob[:4] == MAGIC and blob[4:5] == codec
+    found, header, start = section_table(blob)
+    assert found == codec and header["wrapped"] is True
+    assert [path for path, _, _ in header["sections"]] == [
+        "", "ProtocolSection.IdentificationModule", "ProtocolSection.StatusModule",
+        "ProtocolSection.EligibilityModule", "DerivedSection.MiscInfoModule", "HasResults",
+    ]
+    # Sections contiguës après la table
+    offset = 0
+    for _, section_offset, length in header["sections"]:
+        assert section_offset == offset
+        offset += length
+    assert start + offset == len(blob)
+    assert unpack_document(blob) == DOCUMENT
+    assert unpack_document(blob, FIELDS) == PROJECTED
+
+
+def test_unwrapped_document_round_trip(codec):
+    document = {"NCTId": NCT, "EligibilityCriteria": "Adultes", "Conditions": ["Asthma"]}
+    assert unpack_document(pack_document(document, codec)) == document
+    assert unpack_document(pack_document(document, codec), ["Conditions"]) == {"Conditions": ["Asthma"]}
+
+
+def test_invalid_blob_rejected():
+    with pytest.raises(ValueError):
+        section_table(b"XXXX" + pack_document(DOCUMENT)[4:])
+
+
+def test_project_document_matches_unpack():
+    assert project_document(DOCUMENT) is DOCUMENT
+    assert project_document(DOCUMENT, FIELDS) == PROJECTED
+    assert project_document(DOCUMENT, ["ProtocolSection"]) == {
+        "Rank": 1, "Study": {"ProtocolSection": DOCUMENT["Study"]["ProtocolSection"]}
+    }
+    assert project_document(DOCUMENT, ["Missing"]) == {"Rank": 1, "Study": {}}
+
+
+@pytest.mark.parametrize("packed", [True, False], ids=["packed_data", "full_data"])
+def test_trial_details_fields(client, packed):
+    # Ligne compressée ou document JSON hérité (full_data, sans packed_data) : mêmes réponses
+    bulk_upsert_detail_rows([{"nct_id": NCT, **storage_columns(DOCUMENT, b"z" if packed else b"")}])
+    row = session.query(TrialDetails.packed_data, TrialDetails.full_data).filter_by(nct_id=NCT).one()
+    assert (row.packed_data is not None, row.full_data is not None) == (packed, not packed)
+    assert details_document(row.packed_data, row.full_data, FIELDS) == PROJECTED
+    session.remove()
+
+    assert client.get(f"/api/trial/{NCT}").get_json()["data"] == DOCUMENT
+    response = client.get(f"/api/trial/{NCT}?fields={','.join(FIELDS)}").get_json()
+    assert response["data"] == PROJECTED
+    assert client.get(f"/api/trial/{NCT}?fields=ProtocolSection..StatusModule").status_code == 400
@@ -0,0 +1,54 @@
+# tests/test_eligibility.py
+"""Appariement /api/match : âges limites lus dans eligibility_criteria à défaut du document."""
+from models import ClinicalTrial, TrialDetails
+from services.database import bulk_upsert_detail_rows, session
+from services.details import storage_columns
+from services.eligibility import RECRUITING_STATUSES, eligibility_columns, rebuild_eligibility
+from benchmarks.synthetic import nct_id
+
+NCT = nct_id(3)
+
+
+def matched(client, condition, age):
+    response = client.get(f"/api/match?condition={condition}&age={age}&limit=100").get_json()
+    return {m["NCTId"] for m in response["data"]}
+
+
+def test_criteria_ages_fallback():
+    columns = eligibility_columns({"Gender": "All"}, {"min_age": 22, "max_age": 72})
+    assert (columns["min_age_days"], columns["max_age_days"]) == (8035, 26298)
+    # Les âges du document l'emportent
+    columns = eligibility_columns({"MinimumAge": "18 Years"}, {"min_age": 22})
+    assert columns["min_age_days"] == 6574
+
+
+def test_under_age_patient_excluded(client):
+    # Ligne sans âges dans le document, comme les bases antérieures à l'extraction :
+    # seuls ceux de eligibility_criteria (en années) sont connus
+    bulk_upsert_detail_rows([{
+        "nct_id": NCT, **storage_columns({"NCTId": NCT, "Title": "Study 3"}),
+        "eligibility_criteria": {"min_age": 30, "max_age": 60},
+    }])
+    rebuild_eligibility(session)
+    assert session.query(TrialDetails.min_age_days).filter_by(nct_id=NCT).scalar() == 10957
+    condition = session.query(ClinicalTrial.conditions).filter_by(nct_id=NCT).scalar()[0]
+    session.remove()
+    assert NCT not in matched(client, condition, 5)
+    assert NCT in matched(client, condition, 40)
+
+
+def test_boolean_parameters(client):
+    condition = session.query(ClinicalTrial.conditions).filter_by(nct_id=NCT).scalar()[0]
+    url = f"/api/match?condition={condition}&limit=100"
+    everyone = client.get(url).get_json()["data"]
+    recruiting = client.get(url + "&recruiting=1").get_json()
+    assert recruiting["status"] == "success"
+    assert recruiting["data"] and {m["NCTId"] for m in recruiting["data"]} < {m["NCTId"] for m in everyone}
+    assert {m["Status"] for m in recruiting["data"]} <= set(RECRUITING_STATUSES)
+    assert client.get(url + "&recruiting=0").get_json()["data"] == everyone
+    assert client.get(url + "&recruiting=TRUE").get_json()["data"] == recruiting["data"]
+    assert client.get(url + "&healthy_volunteer=false").status_code == 200
+    # Valeur de HealthyVolunteers dans les documents, pas un booléen de requête
+    assert client.get(url + "&recruiting=accepts healthy volunteers").status_code == 400
+    assert client.get(url + "&healthy_volunteer=accepts healthy volunteers").status_code == 400
+    assert client.get(url + "&recruiting=maybe").status_code == 400
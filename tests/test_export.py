@@ -0,0 +1,25 @@
+# tests/test_export.py
+"""Export Parquet : pyarrow importé au premier export seulement."""
+import os
+import subprocess
+import sys
+import pytest
+from services.export import parquet_available
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_app_import_skips_pyarrow(tmp_path):
+    probe = "import sys, app; print(sorted(m for m in ('pyarrow', 'numpy') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", probe], cwd=tmp_path, capture_output=True, text=True, check=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT, FLASK_DEBUG="false")).stdout
+    assert output.strip().splitlines()[-1] == "[]"
+
+
+@pytest.mark.skipif(not parquet_available(), reason="pyarrow absent")
+def test_parquet_export(client):
+    import io
+    import pyarrow.parquet
+    response = client.get("/api/export?format=parquet")
+    assert response.status_code == 200
+    assert pyarrow.parquet.read_table(io.BytesIO(response.data)).num_rows == 50
@@ -0,0 +1,52 @@
+# tests/test_facets.py
+"""Comptages de /api/facets maintenus par deltas : mêmes lignes qu'un recalcul complet."""
+from datetime import date
+from models import ClinicalTrial, FacetCount
+from services.database import bulk_upsert_trial_rows, session
+from services.facets import current_trials, facet_counts, rebuild_facet_counts, refresh_facet_counts
+from benchmarks.synthetic import nct_id
+
+
+def trial_row(i, conditions, countries, status="RECRUITING", start_date=date(2021, 3, 1)):
+    return {"nct_id": nct_id(i), "title": f"Study {i}", "conditions": conditions, "interventions": [],
+            "status": status, "start_date": start_date, "completion_date": None,
+            "locations": [{"city": "City", "country": c} for c in countries]}
+
+
+def snapshot():
+    return sorted(session.query(FacetCount.condition, FacetCount.country, FacetCount.status,
+                                FacetCount.start_year, FacetCount.trial_count).all())
+
+
+def test_deltas_match_rebuild(db):
+    rebuild_facet_counts(session)
+    # Nouveaux essais (doublons de conditions et de pays, statut et date absents), réécritures
+    # d'essais existants, et un même essai écrit deux fois dans le lot
+    bulk_upsert_trial_rows([
+        trial_row(100, ["Rare Disease", "Asthma", "Asthma"], ["France", "Spain", "France"]),
+        trial_row(101, ["Asthma"], [], status=None, start_date=None),
+        trial_row(0, ["Asthma"], ["France"], status="COMPLETED"),
+        trial_row(1, [], ["Germany"]),
+        trial_row(101, ["Asthma", "Rare Disease"], ["Italy"], status=None, start_date=None),
+    ], batch_size=2)
+    assert session.query(FacetCount).filter_by(condition="Rare Disease", country="Italy").count() > 0
+
+    # Réécriture qui fait tomber des comptages à zéro : leurs lignes disparaissent
+    bulk_upsert_trial_rows([trial_row(100, ["Asthma"], ["Spain"]), trial_row(101, ["Asthma"], ["Italy"])])
+    assert session.query(FacetCount).filter_by(condition="Rare Disease").count() == 0
+
+    # Suppression d'essais : delta vers aucune valeur, dans la transaction qui les retire
+    removed = [nct_id(i) for i in range(5, 10)]
+    refresh_facet_counts(session, current_trials(session, removed), [])
+    session.query(ClinicalTrial).filter(ClinicalTrial.nct_id.in_(removed)).delete(synchronize_session=False)
+    session.commit()
+
+    incremental = snapshot()
+    filters = [(None, None), ("Asthma", None), (None, "France"), ("Asthma", "Italy")]
+    responses = [facet_counts(session, condition, country) for condition, country in filters]
+    assert all(row.trial_count > 0 for row in incremental)
+
+    rebuild_facet_counts(session)
+    assert snapshot() == incremental
+    assert [facet_counts(session, condition, country) for condition, country in filters] == responses
+    assert responses[0]["total"] == session.query(ClinicalTrial).count()
@@ -0,0 +1,83 @@
+# tests/test_geo.py
+"""Recherche de proximité comparée à un calcul exhaustif (haversine sur tous les sites), hautes latitudes comprises."""
+import random
+import pytest
+from models import TrialLocation
+from services.database import bulk_replace_locations, session
+from services.geo import bounding_boxes, haversine_km, nearby_trials
+
+
+def brute_force(lat, lon, radius_km):
+    nearest = {}
+    for site in session.query(TrialLocation):
+        distance = haversine_km(lat, lon, site.latitude, site.longitude)
+        if distance <= radius_km:
+            nearest[site.nct_id] = min(distance, nearest.get(site.nct_id, distance))
+    return sorted(nearest.items(), key=lambda item: item[1])
+
+
+@pytest.fixture
+def polar_sites(db):
+    """Sites des 50 essais entre 55 et 80° (nord et sud), y compris autour de l'antiméridien."""
+    rnd = random.Random(3)
+    nct_ids = [nct for (nct,) in session.query(TrialLocation.nct_id).distinct()]
+    locations = []
+    for nct_id in nct_ids:
+        for _ in range(rnd.randint(1, 4)):
+            lat = rnd.uniform(55, 80) * rnd.choice((1, -1))
+            lon = rnd.choice((rnd.uniform(-30, 30), rnd.uniform(165, 195)))
+            locations.append({"nct_id": nct_id, "Facility": "Site", "City": "City", "Country": "Country",
+                              "Latitude": lat, "Longitude": lon - 360 if lon > 180 else lon})
+    bulk_replace_locations(locations, nct_ids=nct_ids)
+    return rnd
+
+
+def test_matches_brute_force_at_high_latitudes(polar_sites):
+    rnd = polar_sites
+    for _ in range(200):
+        lat = rnd.uniform(55, 80) * rnd.choice((1, -1))
+        lon = rnd.choice((rnd.uniform(-30, 30), rnd.uniform(-180, -165), rnd.uniform(165, 180)))
+        radius = rnd.uniform(50, 500)
+        expected = brute_force(lat, lon, radius)
+        found = [(t.nct_id, d) for t, _, d in nearby_trials(session, lat, lon, radius, limit=200)]
+        assert [n for n, _ in found] == [n for n, _ in expected], (lat, lon, radius)
+        assert [d for _, d in found] == pytest.approx([d for _, d in expected])
+
+
+def test_limit_keeps_nearest_trials(polar_sites):
+    # Peu de sites lus par essai demandé : le classement exact doit survivre à la troncature
+    rnd = polar_sites
+    for _ in range(100):
+        lat, lon = rnd.uniform(60, 80), rnd.uniform(-20, 20)
+        expected = brute_force(lat, lon, 500)[:3]
+        found = [(t.nct_id, d) for t, _, d in nearby_trials(session, lat, lon, 500, limit=3)]
+        assert [n for n, _ in found] == [n for n, _ in expected], (lat, lon)
+
+
+def test_site_482_km_away_at_lat_75(db):
+    nct_id = session.query(TrialLocation.nct_id).first()[0]
+    bulk_replace_locations([{"nct_id": nct_id, "Latitude": 77.0, "Longitude": 16.0}], nct_ids=[nct_id])
+    # Ancienne coupe (cosinus de la latitude demandée) : 511 km estimés au lieu de 482
+    assert haversine_km(75.0, 0.0, 77.0, 16.0) < 500
+    assert nct_id in [t.nct_id for t, _, _ in nearby_trials(session, 75.0, 0.0, 500)]
+
+
+def test_bounding_boxes_split_on_antimeridian():
+    boxes = bounding_boxes(70.0, 179.0, 300)
+    assert len(boxes) == 2
+    assert boxes[0][3] == 180.0 and boxes[1][2] == -180.0
+
+
+def test_pages_until_ranking_is_safe(db):
+    # 10 sites par essai autour de lui, ex aequo compris : la première page (4 sites par essai demandé)
+    # ne couvre que les deux essais les plus proches, les suivantes doivent être lues sans doublon
+    nct_ids = sorted(nct for (nct,) in session.query(TrialLocation.nct_id).distinct())
+    locations = [{"nct_id": nct_id, "Facility": "Site", "City": "City", "Country": "Country",
+                  "Latitude": 48.0 + i * 0.01 + (j % 2) * 0.001, "Longitude": 2.0}
+                 for i, nct_id in enumerate(nct_ids) for j in range(10)]
+    bulk_replace_locations(locations, nct_ids=nct_ids)
+    for limit in (1, 3, 7, 20):
+        expected = brute_force(48.0, 2.0, 100)[:limit]
+        found = [(t.nct_id, d) for t, _, d in nearby_trials(session, 48.0, 2.0, 100, limit=limit)]
+        assert [n for n, _ in found] == [n for n, _ in expected] == nct_ids[:limit]
+        assert [d for _, d in found] == pytest.approx([d for _, d in expected])
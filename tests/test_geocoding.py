@@ -0,0 +1,72 @@
+# tests/test_geocoding.py
+"""Étape de géocodage avec LocalGeocoder : une adresse n'est géocodée qu'une fois, introuvables comprises."""
+from models import GeocodeCache, TrialLocation
+from services.database import bulk_replace_locations, session
+from services.geocoding import LocalGeocoder, geocode_locations, geocode_stored_locations
+
+TABLE = {"Lyon|France": [45.76, 4.84], "Boston|United States": [42.36, -71.06]}
+
+
+def locations():
+    return [
+        {"nct_id": "NCT00000001", "Facility": "Hôpital A", "City": "Lyon", "Country": "France"},
+        {"nct_id": "NCT00000002", "Facility": "Hôpital A", "City": " Lyon ", "Country": "France"},
+        {"nct_id": "NCT00000003", "Facility": "MGH", "City": "Boston", "Country": "United States"},
+        {"nct_id": "NCT00000004", "Facility": "Nowhere", "City": "Atlantis", "Country": "Ocean"},
+        {"nct_id": "NCT00000005", "Facility": "N/A", "City": "N/A", "Country": "N/A"},
+        {"nct_id": "NCT00000006", "City": "Paris", "Country": "France", "Latitude": 48.85, "Longitude": 2.35},
+    ]
+
+
+def test_each_address_geocoded_once(db):
+    geocoder = LocalGeocoder(TABLE)
+    batch = locations()
+    report = geocode_locations(batch, geocoder, rate_limit=0)
+    # Adresses distinctes géocodables : Lyon (deux fois la même), Boston, Atlantis
+    assert geocoder.calls == 3
+    assert (report.addresses, report.resolved, report.not_found, report.cache_hits) == (3, 2, 1, 0)
+    assert batch[0]["Latitude"] == batch[1]["Latitude"] == 45.76
+    assert "Latitude" not in batch[3] and batch[5]["Latitude"] == 48.85
+    assert session.query(GeocodeCache).count() == 3
+
+    again = geocode_locations(locations(), geocoder, rate_limit=0)
+    assert geocoder.calls == 3
+    assert again.cache_hits == 3 and again.updated_locations == 3
+
+
+def test_not_found_is_cached(db):
+    geocoder = LocalGeocoder(TABLE)
+    geocode_locations([locations()[3]], geocoder, rate_limit=0)
+    cached = session.query(GeocodeCache).one()
+    assert (cached.city, cached.latitude, cached.longitude) == ("Atlantis", None, None)
+    report = geocode_locations([locations()[3]], geocoder, rate_limit=0)
+    assert geocoder.calls == 1
+    assert report.cache_hits == 1 and report.not_found == 0
+
+
+def test_failures_are_retried(db):
+    class FlakyGeocoder(LocalGeocoder):
+        def geocode(self, address):
+            if self.calls == 0:
+                self.calls += 1
+                raise TimeoutError("service indisponible")
+            return super().geocode(address)
+
+    geocoder = FlakyGeocoder(TABLE)
+    report = geocode_locations([locations()[0]], geocoder, rate_limit=0)
+    assert report.failed == 1 and session.query(GeocodeCache).count() == 0
+    report = geocode_locations([locations()[0]], geocoder, rate_limit=0)
+    assert report.resolved == 1 and session.query(GeocodeCache).count() == 1
+
+
+def test_stored_locations(db):
+    nct_ids = [loc["nct_id"] for loc in locations()]
+    bulk_replace_locations(locations(), nct_ids=nct_ids)
+    geocoder = LocalGeocoder(TABLE)
+    report = geocode_stored_locations(geocoder, batch_size=2, rate_limit=0)
+    assert geocoder.calls == 3 and report.updated_locations == 3
+    lyon = session.query(TrialLocation).filter_by(nct_id="NCT00000002").one()
+    assert (lyon.latitude, lyon.longitude) == (45.76, 4.84)
+    # Deuxième run : Atlantis reste sans coordonnées mais n'est plus demandé
+    report = geocode_stored_locations(geocoder, rate_limit=0)
+    assert geocoder.calls == 3 and report.cache_hits == 1 and report.updated_locations == 0
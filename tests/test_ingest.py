@@ -0,0 +1,65 @@
+# tests/test_ingest.py
+"""Pipeline d'ingestion : répertoire local (fichier illisible compris) et pages de l'API du serveur local."""
+import gzip
+import json
+import pytest
+from models import ClinicalTrial, TrialDetails
+from services.clinical_trials import ClinicalTrialsClient
+from services.database import session
+from services.ingest import DirectorySource, ExprSource, IngestPipeline
+from services.preprocessor import study_nct_id
+
+
+def stored_ids():
+    ids = {nct for (nct,) in session.query(ClinicalTrial.nct_id)}
+    session.remove()
+    return ids
+
+
+def assert_drained(pipeline):
+    assert pipeline.fetched.empty() and pipeline.parsed.empty()
+
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_directory_source(empty_db, studies, tmp_path, parse_workers):
+    # Une étude par fichier, une liste, une réponse FullStudies compressée, un fichier illisible
+    batch = studies(25)
+    dumps = tmp_path / "dumps"
+    (dumps / "nested").mkdir(parents=True)
+    for study in batch[:10]:
+        (dumps / f"{study_nct_id(study)}.json").write_text(json.dumps(study))
+    (dumps / "nested" / "list.json").write_text(json.dumps(batch[10:18]))
+    (dumps / "page.json.gz").write_bytes(gzip.compress(json.dumps(
+        {"FullStudiesResponse": {"FullStudies": batch[18:]}}).encode("utf-8")))
+    (dumps / "broken.json").write_text('{"Study": ')
+    (dumps / "notes.txt").write_text("ignoré")
+
+    # Lots d'un fichier et files d'un élément : l'écrivain fait attendre les étapes précédentes
+    pipeline = IngestPipeline(DirectorySource(str(dumps), batch_bytes=1), fetch_workers=3,
+                              parse_workers=parse_workers, queue_size=1)
+    report = pipeline.run().as_dict()
+
+    assert stored_ids() == {study_nct_id(s) for s in batch}
+    assert session.query(TrialDetails).count() == 25
+    assert report["fetch"]["files"] == 13 and report["fetch"]["batches"] == 13
+    assert "studies" not in report["fetch"]
+    assert report["parse"]["studies"] == 25 and report["parse"]["errors"] == 1
+    assert report["write"]["studies"] == 25 and report["write"]["errors"] == 0
+    assert_drained(pipeline)
+
+
+def test_expr_source(empty_db, studies, stub):
+    # Première page en erreur (sans reprise) : comptée et perdue, les suivantes sont écrites
+    batch = studies(23)
+    state, base_url = stub(batch, fail_first=1)
+    client = ClinicalTrialsClient(base_url=base_url, rate_limit=0, retries=0)
+    pipeline = IngestPipeline(ExprSource(client, "", page_size=5), fetch_workers=1, parse_workers=0, queue_size=1)
+    report = pipeline.run().as_dict()
+
+    expected = {study_nct_id(s) for s in batch} - set(state.match("")[:5])
+    assert stored_ids() == expected
+    assert report["fetch"]["studies"] == 18 and report["fetch"]["errors"] == 1
+    assert report["write"]["studies"] == 18
+    # Pages 1 (en erreur) à 5 (incomplète, qui arrête la source)
+    assert state.requests == 5
+    assert_drained(pipeline)
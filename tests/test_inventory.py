@@ -0,0 +1,59 @@
+# tests/test_inventory.py
+"""/api/inventory : pagination par curseur et streaming NDJSON / JSON."""
+import json
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import func
+from models import TrialCondition
+from services.database import session
+
+
+@pytest.fixture
+def condition(db):
+    """Condition la plus fréquente de la base de test."""
+    name = session.query(TrialCondition.condition).group_by(TrialCondition.condition) \
+                  .order_by(func.count().desc(), TrialCondition.condition).limit(1).scalar()
+    expected = sorted(n for (n,) in session.query(TrialCondition.nct_id).filter_by(condition=name))
+    session.remove()
+    return name, expected
+
+
+def compact(row):
+    return json.dumps(row, separators=(",", ":"), sort_keys=True)
+
+
+def test_cursor_pages_are_disjoint_and_complete(client, condition):
+    name, expected = condition
+    seen, cursor, pages = [], "", 0
+    while True:
+        body = client.get(f"/api/inventory?condition={name}&limit=2&cursor={cursor}").get_json()
+        pages += 1
+        seen += [t["NCTId"] for t in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected and pages >= 2
+    # Dernière page pleine : la suivante est vide, sans curseur
+    last = client.get(f"/api/inventory?condition={name}&limit=50&cursor={expected[-1]}").get_json()
+    assert last["data"] == [] and last["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", ["bogus", "NCT", "NCT1' OR 1=1"])
+def test_invalid_cursor(client, cursor):
+    response = client.get(f"/api/inventory?condition=Asthma&cursor={cursor}")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_stream_rows_match_pages(app, client, condition, fast):
+    if not fast:
+        app.json = DefaultJSONProvider(app)
+    name, expected = condition
+    page = client.get(f"/api/inventory?condition={name}&limit=50").get_json()["data"]
+    assert [t["NCTId"] for t in page] == expected
+
+    lines = client.get(f"/api/inventory?condition={name}&stream=ndjson").get_data(as_text=True).splitlines()
+    assert lines == [compact(row) for row in page]
+    streamed = client.get(f"/api/inventory?condition={name}&stream=json").get_data(as_text=True)
+    assert streamed == '{"status":"success","data":[' + ",".join(lines) + "]}"
+    assert json.loads(streamed)["data"] == page
@@ -0,0 +1,51 @@
+# tests/test_metrics.py
+"""Métriques /metrics : mesures agrégées au rendu, chronométrage SQL désactivable."""
+import re
+from benchmarks.synthetic import nct_id
+from config import settings
+
+ROUTE = '/api/trial/<string:nct_id>'
+
+
+def sample(body, name, labels=""):
+    match = re.search(rf"^{re.escape(name + labels)} (\S+)$", body, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_requests_and_queries_rendered(client):
+    for i in range(3):
+        client.get(f"/api/trial/{nct_id(i)}")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert sample(body, "http_requests_total", f'{{route="{ROUTE}",method="GET",status="200"}}') == 3
+    assert sample(body, "http_request_duration_seconds_count", f'{{route="{ROUTE}"}}') == 3
+    assert sample(body, "http_request_db_queries_count", f'{{route="{ROUTE}"}}') == 3
+    assert sample(body, "db_queries_total") > 0
+
+
+def test_sql_timing_disabled(db, monkeypatch):
+    import app as api
+    monkeypatch.setattr(settings, "METRICS_SQL_TIMING", False)
+    client = api.create_app().test_client()
+    client.get(f"/api/trial/{nct_id(1)}")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert sample(body, "http_requests_total", f'{{route="{ROUTE}",method="GET",status="200"}}') == 1
+    assert "http_request_db_seconds_count" not in body
+    assert sample(body, "db_queries_total") is None
+
+
+def test_app_created_twice(db):
+    import logging
+    import app as api
+    from services.metrics import ErrorLogHandler
+    first, application = api.create_app(), api.create_app()
+    # Compteurs et événements de l'engine partagés, gestionnaire d'erreurs ajouté une seule fois
+    assert first.extensions["metrics"] is application.extensions["metrics"]
+    assert sum(isinstance(h, ErrorLogHandler) for h in logging.getLogger().handlers) == 1
+
+    application.add_url_rule("/boom", "boom", lambda: logging.getLogger("tests").error("boom") or "ok")
+    client = application.test_client()
+    client.get(f"/api/trial/{nct_id(1)}")
+    client.get("/boom")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert sample(body, "http_request_errors_total", '{route="/boom"}') == 1
+    assert sample(body, "http_request_db_queries_sum", f'{{route="{ROUTE}"}}') > 0
@@ -0,0 +1,68 @@
+# tests/test_query_cache.py
+"""Cache des résultats de /api/search : invalidation par la génération des essais, base verrouillée."""
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from config import settings
+from models import TargetedSearch
+from services import database
+from services.database import bulk_upsert_details, session
+from benchmarks.synthetic import nct_id
+
+NCT = nct_id(7)
+
+
+def search(client, terms):
+    response = client.get(f"/api/search?mode=fulltext&q={terms}").get_json()
+    assert response["status"] == "success"
+    return [t["NCTId"] for t in response["data"]]
+
+
+def test_details_write_invalidates_fulltext_results(app, client):
+    cache = app.extensions["query_cache"]
+    assert search(client, "zzyzxword") == []
+    assert search(client, "zzyzxword") == []
+    assert cache.stats(session)["hits"] == 1
+
+    # Seuls les détails changent : eligibility_text est indexé en plein texte
+    bulk_upsert_details([{"NCTId": NCT, "EligibilityCriteria": "Inclusion Criteria: zzyzxword volunteers."}])
+    assert search(client, "zzyzxword") == [NCT]
+
+
+@pytest.fixture
+def short_busy_timeout(monkeypatch):
+    # Avant la création de l'engine (fixture db) : les pragmas sont appliqués à la connexion
+    monkeypatch.setattr(settings, "SQLITE_BUSY_TIMEOUT_MS", 50)
+
+
+@contextmanager
+def write_locked():
+    """Verrou d'écriture de la base tenu par une autre connexion (comme une ingestion en cours)."""
+    conn = sqlite3.connect(database.engine.url.database, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    finally:
+        conn.execute("ROLLBACK")
+        conn.close()
+
+
+def test_locked_database_still_answers(short_busy_timeout, app, client, caplog):
+    cache = app.extensions["query_cache"]
+    with write_locked():
+        assert search(client, "zzyzxword") == []
+    assert cache.stats(session)["stores"] == 0
+    assert "Résultat non enregistré" in caplog.text
+
+    assert search(client, "zzyzxword") == []
+    assert cache.stats(session)["stores"] == 1
+    # Hit dont last_used doit être rafraîchi, base verrouillée : le résultat en cache est servi
+    session.execute(update(TargetedSearch).values(last_used=datetime.utcnow() - timedelta(hours=1)))
+    session.commit()
+    session.remove()
+    with write_locked():
+        assert search(client, "zzyzxword") == []
+    assert cache.stats(session)["hits"] == 1
+    assert "last_used non mis à jour" in caplog.text
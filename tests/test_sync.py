@@ -0,0 +1,107 @@
+# tests/test_sync.py
+"""Synchronisation incrémentale contre le serveur local : run delta, empreintes inchangées, reprise après panne."""
+import random
+from datetime import date, timedelta
+import pytest
+import requests
+from models import ClinicalTrial, SyncCheckpoint, TrialSync
+from services.clinical_trials import ClinicalTrialsClient
+from services.database import session
+from services.sync import content_hash, delta_expr, sync_query
+from benchmarks.synthetic import STATUSES, generate_full_study
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def server(stub):
+    """60 études mises à jour entre 30 et 1100 jours avant aujourd'hui, et un client sans reprise."""
+    rnd = random.Random(0)
+    studies = [generate_full_study(i, rnd, last_update=TODAY - timedelta(days=rnd.randrange(30, 1100)))
+               for i in range(60)]
+    state, base_url = stub(studies)
+    return state, ClinicalTrialsClient(base_url=base_url, rate_limit=0, retries=0)
+
+
+def modify(state, count, seed=1):
+    """Change le statut de `count` études du serveur et les date d'aujourd'hui ; renvoie leurs NCT IDs."""
+    rnd = random.Random(seed)
+    changed = []
+    for nct_id in rnd.sample(sorted(state.studies), count):
+        study = state.studies[nct_id]
+        module = study["Study"]["ProtocolSection"]["StatusModule"]
+        module["OverallStatus"] = rnd.choice([s for s in STATUSES if s != module["OverallStatus"]])
+        module["LastUpdatePostDateStruct"]["LastUpdatePostDate"] = TODAY.strftime("%B %d, %Y")
+        changed.append(study)
+    state.upsert(changed)
+    return sorted(s["Study"]["ProtocolSection"]["IdentificationModule"]["NCTId"] for s in changed)
+
+
+def divergences(state):
+    hashes = dict(session.query(TrialSync.nct_id, TrialSync.content_hash))
+    statuses = dict(session.query(ClinicalTrial.nct_id, ClinicalTrial.status))
+    return [nct_id for nct_id, study in state.studies.items()
+            if hashes.get(nct_id) != content_hash(study)
+            or statuses.get(nct_id) != study["Study"]["ProtocolSection"]["StatusModule"]["OverallStatus"]]
+
+
+def sync(client):
+    return sync_query("", client=client, page_size=10, overlap=2)
+
+
+def test_delta_run_bounded_by_last_update(empty_db, server):
+    state, client = server
+    initial = sync(client)
+    # Pages de 10 dont 2 études relues (recouvrement) : chacune n'est écrite qu'une fois
+    assert initial.since is None and initial.changed == 60 and initial.fetched == 60 + 2 * (initial.pages - 1)
+    high_water = session.query(SyncCheckpoint.high_water).scalar()
+    assert high_water == initial.high_water < TODAY
+
+    modified = modify(state, 7)
+    delta = sync(client)
+    # Seules les études mises à jour depuis le high-water mark (inclus) sont relues
+    assert delta.since == high_water
+    assert delta.changed == 7
+    assert delta.fetched < 60 and delta.fetched - delta.changed == delta.unchanged
+    assert delta.high_water == TODAY
+    assert sorted(nct for (nct,) in session.query(TrialSync.nct_id).filter(
+        TrialSync.last_update_posted == TODAY)) == modified
+    assert divergences(state) == []
+
+
+def test_unchanged_studies_are_not_rewritten(empty_db, server):
+    state, client = server
+    sync(client)
+    modify(state, 3)
+    sync(client)
+    written = dict(session.query(ClinicalTrial.nct_id, ClinicalTrial.updated_at))
+    synced = dict(session.query(TrialSync.nct_id, TrialSync.synced_at))
+
+    # Run suivant : les études du jour sont relues (plage inclusive) mais leur empreinte n'a pas changé
+    again = sync(client)
+    assert again.fetched == 3 and again.changed == 0 and again.unchanged == 3
+    assert dict(session.query(ClinicalTrial.nct_id, ClinicalTrial.updated_at)) == written
+    assert dict(session.query(TrialSync.nct_id, TrialSync.synced_at)) == synced
+
+
+def test_resume_after_failure(empty_db, server):
+    state, client = server
+    sync(client)
+    modify(state, 40, seed=2)
+    # Le serveur tombe après deux pages
+    state.fail_after = state.requests + 2
+    with pytest.raises(requests.RequestException):
+        sync(client)
+    checkpoint = session.query(SyncCheckpoint).one()
+    # Pages 1-10 et 9-18 écrites
+    assert checkpoint.status == "running" and checkpoint.next_rank == 19
+    assert divergences(state)
+    matching = len(state.match(delta_expr("", checkpoint.run_since)))
+
+    state.fail_after = None
+    resumed = sync(client)
+    assert resumed.resumed and resumed.since == checkpoint.run_since
+    # Reprise au rang 19 moins le recouvrement (17), pas depuis le début
+    assert resumed.fetched - 2 * (resumed.pages - 1) == matching - 16
+    assert divergences(state) == []
+    assert session.query(SyncCheckpoint.status).scalar() == "done"
@@ -0,0 +1,5 @@
+# wsgi.py
+"""Application pour gunicorn : `gunicorn wsgi:app` (create_app n'est pas appelé à l'import de app.py)."""
+from app import create_app
+
+app = create_app()